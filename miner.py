@@ -4,10 +4,28 @@ import sys
 import subprocess
 import shutil
 import time
-import requests
+
+STARTUP_T0 = time.perf_counter()  # before the remaining imports, for startup timing
+
+import argparse
+import math
+import signal
+import random
 import json
+import re
+import csv
+import hashlib
 import socket
 import threading
+import struct
+import mmap
+import zlib
+import asyncio
+import statistics
+import atexit
+import contextlib
+from collections import defaultdict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
 from colorama import init, Fore, Back, Style
 
@@ -19,9 +37,252 @@ CPUMINER_REPO = "https://github.com/JayDDee/cpuminer-opt.git"
 MINER_DIR = "cpuminer-opt"
 CONFIG_FILE = "miner_config.json"
 BENCHMARK_FILE = "benchmark_results.txt"
+BENCHMARK_HISTORY_FILE = "benchmark_history.jsonl"
+BENCHMARK_CSV_FILE = "benchmark_history.csv"
 STATS_FILE = "mining_stats.json"
+STATS_DIR = "stats_history"
+POOL_CACHE_FILE = "pool_cache.json"
 UPDATE_INTERVAL = 300  # 5 minutes for stats update
 
+# Fleet reporting (enabled with fleet_collector in the config)
+FLEET_PORT = 3400
+FLEET_HOST = "0.0.0.0"  # the collector receives reports from every device on the network
+FLEET_REPORT_INTERVAL = 30  # seconds between reports from a device
+FLEET_ACK_TIMEOUT = 2  # seconds to wait for the collector's ack
+FLEET_BACKOFF_MAX = 300  # longest interval while the collector is unreachable
+FLEET_STALE_AFTER = 180  # seconds without a report before a worker is offline
+FLEET_OUTLIER_RATIO = 0.7  # below this fraction of the model median is an outlier
+FLEET_MIN_GROUP = 3  # devices of one CPU model needed to judge outliers
+FLEET_SESSION_HISTORY = 16  # finished session ids remembered per worker to drop late reports
+FLEET_SUMMARY_INTERVAL = 10  # seconds between collector summaries
+FLEET_STATUS_FILE = "fleet_status.json"
+FLEET_PROFILES_FILE = "fleet_profiles.json"  # optional operator profiles per CPU model
+
+# Headless daemon
+PID_FILE = "miner.pid"
+DAEMON_STATUS_FILE = "miner_status.json"
+LOG_FILE = "miner.log"
+LOG_MAX_BYTES = 1024 * 1024  # per log file before rotating
+LOG_BACKUPS = 3  # rotated log files kept
+DAEMON_STATUS_INTERVAL = 10  # seconds between status file updates
+ANSI_PATTERN = re.compile(r"\x1b(?:\[[0-9;?]*[A-Za-z]|[78])")
+# Read only when the miners are (re)launched, so a reload defers them
+RESTART_CONFIG_KEYS = ("wallet_address", "worker_name", "layout", "supervisor", "telemetry", "use_proxy",
+                       "proxy_port", "api_port", "api_interval", "metrics_port", "metrics_host", "active_build",
+                       "governor")
+
+# Fast start
+REQUIRED_PACKAGES = [
+    "git", "autoconf", "automake", "libtool", "pkg-config",
+    "make", "clang", "curl", "libcurl", "openssl",
+    "libjansson", "libgmp", "zlib", "patch"
+]
+DPKG_STATUS_FILE = os.path.join(os.environ.get("PREFIX", "/usr"), "var", "lib", "dpkg", "status")
+DEPS_CACHE_FILE = "deps_cache.json"
+STARTUP_LOG_FILE = "startup_times.jsonl"
+STARTUP_HISTORY = 10  # earlier runs the startup time is compared with
+STARTUP_REGRESSION = 1.5  # flag startups this much slower than the median
+TRACE_FILE = "lifecycle_trace.json"  # Chrome trace events, see Tracer
+TRACE_MAX_BYTES = 1024 * 1024  # rotated to .1 beyond this
+PROFILE_FILE = "controller.prof"  # cProfile output of the controller
+PROFILE_TOP = 15  # functions listed after a profiled run
+
+# Stats history: (seconds per record, records kept) from finest to coarsest
+STATS_RESOLUTIONS = [(10, 8640), (60, 10080), (3600, 8760)]  # 1 day, 1 week, 1 year
+STATS_SAMPLE_INTERVAL = 10  # seconds between raw samples
+STATS_WINDOWS = [("10m", 600), ("1h", 3600), ("24h", 86400), ("7d", 604800)]
+STATS_MAGIC = b"TMST"
+STATS_VERSION = 2
+STATS_HEADER = struct.Struct("<4sHHI")  # magic, version, slot size, capacity
+# seq, timestamp, hashrate, accepted, rejected, temperature, samples, then EFFICIENCY_FIELDS
+STATS_RECORD = struct.Struct("<QddIIfIffff")
+STATS_SLOT_SIZE = STATS_RECORD.size + 4  # record plus CRC32
+STATS_LEGACY_RECORDS = {1: struct.Struct("<QddIIfI")}  # older layouts migrated on open
+
+# CPU accounting
+PROC_ROOT = "/proc"
+CPU_ROOT = "/sys/devices/system/cpu"
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+EFFICIENCY_FIELDS = ("hashes_per_cpu_second", "controller_share", "contention", "frequency_mhz")
+
+# Effective hashrate and earnings
+SHARE_WORK = 2 ** 32  # expected hashes per share at difficulty 1
+ESTIMATOR_WINDOWS = [("10m", 600), ("1h", 3600), ("24h", 86400)]
+ESTIMATOR_CONFIDENCE = 0.95
+ESTIMATOR_MIN_SHARES = 10  # accepted shares before an estimate is used for earnings
+NETWORK_DIFFICULTY = 1.5e14  # override with network_difficulty in the config
+BLOCK_REWARD = 3.125  # BTC subsidy; add average fees with block_reward in the config
+
+# Terminal dashboard
+DASHBOARD_INTERVAL = 1.0  # seconds between redraws
+DASHBOARD_HEIGHT = 11  # panel lines kept above the scrolling log
+LOG_RATE_LIMIT = 20  # miner log lines per second before suppression
+
+# Crash supervisor
+RESTART_BACKOFF = {"network": 1, "killed": 5, "crash": 5, "binary": 1}  # first delay in seconds
+RESTART_BACKOFF_MAX = 300  # seconds
+RESTART_JITTER = 0.25  # +/- fraction so a fleet does not restart in lockstep
+RESTART_STABLE_TIME = 600  # seconds of clean running that reset the backoff
+CRASH_TAIL_LINES = 20  # last output lines kept per instance for classification
+CIRCUIT_BREAKER_FAILURES = 3  # consecutive network failures before a pool is skipped
+CIRCUIT_BREAKER_COOLDOWN = 900  # seconds a tripped pool stays skipped
+PROXY_WATCH_INTERVAL = 5  # seconds between proxy upstream health checks
+CRASH_PATTERNS = [
+    ("binary", ("illegal instruction", "sigill")),
+    ("config", ("unrecognized option", "invalid option", "unknown algo", "usage:", "invalid url",
+                "option requires an argument")),
+    ("network", ("connection failed", "connection refused", "connection reset", "connection interrupted",
+                 "could not resolve", "couldn't resolve", "network is unreachable", "timed out",
+                 "stratum authentication failed", "stratum connection")),
+]
+
+# Prometheus metrics endpoint (enabled with metrics_port in the config)
+METRICS_HOST = "127.0.0.1"  # set metrics_host to "0.0.0.0" to let a remote scraper in
+SHARE_LATENCY_BUCKETS = [0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]  # seconds
+FIRST_SHARE_BUCKETS = [10, 30, 60, 120, 300, 600, 1800, 3600, 7200]  # seconds
+
+# Benchmark suite
+BENCHMARK_TIME_LIMIT = 30  # seconds per benchmark run
+BENCHMARK_REPEATS = 3  # runs per matrix cell
+BENCHMARK_NOISE_PCT = 3.0  # minimum change to count as a regression
+
+# Auto-tuning
+DEFAULT_CPU_PRIORITY = 3  # Slightly elevated priority
+TUNE_PRIORITIES = [2, 3, 5]  # cpuminer --cpu-priority values to try
+TUNE_MIN_TIME = 10  # seconds per candidate in the first halving round
+
+# Hashrate unit multipliers to H/s
+HASHRATE_UNITS = {"": 1, "k": 1e3, "K": 1e3, "M": 1e6, "G": 1e9, "T": 1e12, "P": 1e15}
+HASHRATE_PATTERN = re.compile(r"([0-9]+(?:\.[0-9]+)?)\s*([kKMGTP]?)(?:[Hh]/s|hash/s)")  # cpuminer-opt prints kh/s
+
+# Miner output parser: (event kind, lowercase keywords, pattern), first match wins.
+# The keyword check is a cheap substring test that skips the regex on most lines.
+THREAD_PATTERN = re.compile(r"(?:CPU|Thread|thr)\s*#?\s*(\d+)", re.I)
+DIFF_PATTERN = re.compile(r"diff(?:iculty)?\s*[:=]?\s*([0-9]+(?:\.[0-9]+)?(?:e[+-]?[0-9]+)?)", re.I)
+LATENCY_PATTERN = re.compile(r"([0-9]+(?:\.[0-9]+)?)\s*ms\b")
+# Per-share results start the message: "accepted: 3/3 ..." (cpuminer) or "12 Accepted 12 S0 R0 B0"
+# (cpuminer-opt), so counter summaries like "Submitted 6, Accepted 6, Rejected 0" are not shares
+SHARE_PATTERN = re.compile(r"^\s*(?:\[[^\]]*\]\s*)?(?:\d+\s+)?(accepted|rejected)\b\s*(?::|\d)", re.I)
+OUTPUT_PATTERNS = [
+    ("share", ("accepted", "rejected"), SHARE_PATTERN),
+    ("block", ("yay!!!", "block solved", "block found"), None),
+    ("difficulty", ("difficulty set", "stratum diff"),
+     re.compile(r"(?:difficulty set to|stratum diff)\s*([0-9]+(?:\.[0-9]+)?(?:e[+-]?[0-9]+)?)", re.I)),
+    ("submit", ("submitted",), re.compile(r"submitted", re.I)),
+    ("job", ("new job", "new block", "new work"), None),
+    ("reconnect", ("stratum connection", "reconnect", "connection failed", "connection interrupted",
+                   "retry after"), None),
+    ("temperature", ("temp",), re.compile(r"temp\w*[^0-9]{0,8}([0-9]+(?:\.[0-9]+)?)\s*(?:°|deg)?\s*C", re.I)),
+    ("hashrate", ("h/s", "hash/s"), HASHRATE_PATTERN),
+]
+MinerEvent = namedtuple("MinerEvent", "kind value thread diff latency stale")
+MinerEvent.__new__.__defaults__ = (None, None, None, None, False)
+STALE_KEYWORDS = ("stale", "job not found", "expired")
+
+# Pool probing
+PROBE_SAMPLES = 3  # TCP connects per pool/port
+PROBE_TIMEOUT = 5  # seconds per connect attempt
+PROBE_DEADLINE = 6  # overall budget for pool selection in seconds
+PROBE_WORKERS = 16  # max concurrent endpoint probes
+POOL_CACHE_TTL = 6 * 3600  # seconds before a cached probe is ignored
+POOL_CACHE_MAX = 64  # entries kept before least recently used are evicted
+POOL_CACHE_SAMPLES = 10  # latency samples kept per entry
+
+# Thermal and battery governor
+THERMAL_ROOT = "/sys/class/thermal"
+POWER_SUPPLY_ROOT = "/sys/class/power_supply"
+THERMAL_ZONE_KEYWORDS = ("cpu", "tsens", "soc", "mtktscpu", "x86_pkg", "coretemp")
+THERMAL_LOG_FILE = "thermal_log.jsonl"
+GOVERNOR_TARGET_TEMP = 70  # °C held by adjusting threads
+GOVERNOR_INTERVAL = 5  # seconds between samples
+GOVERNOR_SMOOTHING = 0.3  # EWMA weight of a new temperature sample
+GOVERNOR_DEADBAND = 1.5  # °C around the target that does not integrate
+GOVERNOR_KP = 0.15  # threads per °C of error
+GOVERNOR_KI = 0.002  # threads per °C·s of accumulated error
+GOVERNOR_HOLD = 60  # seconds between thread changes, each one restarts the miner
+GOVERNOR_EMERGENCY = 10  # °C over target that skips the hold time
+GOVERNOR_SETTLE = 30  # seconds after a change before samples are logged
+GOVERNOR_LOG_INTERVAL = 300  # seconds per logged operating point
+GOVERNOR_MIN_BATTERY = 20  # % below which mining pauses even when charging
+GOVERNOR_BATTERY_HYSTERESIS = 5  # % above the minimum before resuming
+
+# Pool health scoring and live switching
+POOL_HEALTH_WINDOW = 3600  # seconds of shares considered
+POOL_HEALTH_SAMPLES = 10  # handshake latencies kept per pool
+POOL_HEALTH_INTERVAL = 60  # seconds between active pool probes and evaluations
+POOL_ALT_PROBE_INTERVAL = 300  # seconds between probes of alternative pools
+POOL_SWITCH_MARGIN = 0.02  # alternative must yield this fraction more
+POOL_SWITCH_CONFIRMATIONS = 3  # consecutive evaluations it must stay ahead
+POOL_MIN_DWELL = 900  # seconds on a pool before switching away again
+POOL_JOB_INTERVAL = 600  # average seconds between clean jobs (block interval)
+POOL_REJECT_PRIOR = 0.01  # assumed reject rate for pools without share history
+POOL_PRIOR_WEIGHT = 20  # shares the prior is worth
+
+# Local stratum proxy
+PROXY_HOST = "127.0.0.1"
+PROXY_PORT = 3350
+PROXY_PREFIX_BYTES = 1  # extranonce2 bytes used to split work between local miners
+PROXY_BATCH_WINDOW = 0.005  # seconds to coalesce submits into one upstream write
+PROXY_JOB_HISTORY = 16  # recent jobs kept to verify shares against
+FAKE_POOL_PORT = 3351
+
+# Record and replay
+CAPTURE_VERSION = 1
+REPLAY_PREFIX = "replay:"  # binary name prefix that runs a capture as a fake miner
+REPLAY_POOL = {"name": "replay", "url": f"stratum+tcp://{PROXY_HOST}:1", "fee": 0.0}
+REPLAY_YIELD_LINES = 100  # lines between event loop yields at full speed
+REPLAY_WORKLOADS = [("normal", 20), ("busy", 500), ("flood", 5000)]  # miner lines per second
+REPLAY_BENCH_DURATION = 5  # seconds of synthetic output per workload
+CONTROLLER_BENCH_FILE = "controller_bench.jsonl"
+
+# Built-in sha256d engine, used when cpuminer cannot be built or as engine: "builtin"
+ENGINE_BINARY = "builtin"  # stands in for a cpuminer path
+ENGINE_BATCH = 1 << 17  # nonces per worker task
+ENGINE_REPORT_INTERVAL = 10  # seconds between hashrate lines
+ENGINE_RETRY_DELAY = 10  # seconds between pool connection attempts
+DIFF1_TARGET = 0xFFFF << 208  # share target at difficulty 1
+NONCE = struct.Struct("<I")
+SPOT_CHECK_WINDOW = 20  # recent proxy share checks considered
+SPOT_CHECK_MAX_INVALID = 5  # failed checks in the window that condemn a build
+
+# cpuminer API telemetry
+API_PORT = 4048  # first instance, further instances count up
+API_INTERVAL = 5  # seconds between API polls
+
+# Build cache
+BUILD_CACHE_DIR = "build_cache"
+BUILD_CACHE_MAX = 5  # cached binaries kept side by side
+BUILD_STAMP = ".termux_build_flags"  # flags used by the last configure
+BUILD_CFLAGS = "-O3 -Wno-error=asm-operand-widths"
+BUILD_CXXFLAGS = "-O3"
+PGO_PROFILE_DIR = os.path.join(BUILD_CACHE_DIR, "pgo-profile")
+PGO_TRAIN_TIME = 60  # seconds of --benchmark used as the PGO training workload
+
+# Build variants; {native} is -mcpu=native on ARM, -march=native elsewhere
+BUILD_PROFILES = {
+    "generic": {"cflags": "", "ldflags": ""},
+    "native": {"cflags": "{native}", "ldflags": ""},
+    "lto": {"cflags": "{native} -flto", "ldflags": "-flto"},
+    "pgo": {"cflags": "{native} -flto", "ldflags": "-flto", "pgo": True}
+}
+MINER_BINARY_NAMES = ["cpuminer", "minerd", "cpuminer-avx2", "cpuminer-opt"]
+
+# Patch to fix the ARM assembly warnings
+ARM_PATCH = """
+diff --git a/sind-utils/sind-int.h b/sind-utils/sind-int.h
+index abc123..def456 100644
+--- a/sind-utils/sind-int.h
++++ b/sind-utils/sind-int.h
+@@ -25,7 +25,7 @@
+ #define rev32(a, b) \\
+ do { \\
+    uint32_t tmp = b; \\
+-    asm("rev32 %0, %1\\n\\t": "=r"(b) : "r"(a)); \\
++    asm("rev32 %0, %1\\n\\t": "=w"(b) : "w"(a)); \\
+    a = tmp; \\
+ } while(0)
+ """
+
 # Pool configuration (auto-select best pool)
 POOLS = [
     {
@@ -47,124 +308,2576 @@ POOLS = [
     }
 ]
 
+def pool_host(url):
+    """Strip the stratum scheme and port from a pool URL"""
+    return url.replace("stratum+tcp://", "").split(":")[0]
+
+
+def pool_address(url):
+    """Split a pool URL into host and port"""
+    host_port = url.replace("stratum+tcp://", "")
+    host, _, port = host_port.partition(":")
+    return host, int(port) if port else 3333
+
+
+def cpu_mask(cpus):
+    """Hex affinity mask for a list of CPU numbers"""
+    mask = 0
+    for cpu in cpus:
+        mask |= 1 << cpu
+    return hex(mask)
+
+
+def format_hashrate(hashrate):
+    """Human readable hashrate from H/s"""
+    hashrate = hashrate or 0
+    for unit in ("P", "T", "G", "M", "k"):
+        if hashrate >= HASHRATE_UNITS[unit]:
+            return f"{hashrate / HASHRATE_UNITS[unit]:.2f} {unit}H/s"
+    return f"{hashrate:.2f} H/s"
+
+
+def parse_line(line):
+    """Turn one miner output line into a MinerEvent, or None"""
+    lower = line.lower()
+    for kind, keywords, pattern in OUTPUT_PATTERNS:
+        for keyword in keywords:
+            if keyword in lower:
+                break
+        else:
+            continue
+        
+        match = None
+        if pattern is not None:
+            match = pattern.search(line)
+            if not match:
+                continue
+        
+        if kind == "share":
+            diff = DIFF_PATTERN.search(line)
+            latency = LATENCY_PATTERN.search(line)
+            # cpuminer reports a rejected share as "accepted: 2/3 ... (booooo)"
+            accepted = match.group(1).lower() == "accepted" and "boo" not in lower
+            return MinerEvent(
+                "share", accepted, None,
+                float(diff.group(1)) if diff else None,
+                float(latency.group(1)) if latency else None,
+                not accepted and is_stale_error(lower)
+            )
+        if kind == "submit":
+            diff = DIFF_PATTERN.search(line)
+            return MinerEvent("submit", None, None, float(diff.group(1)) if diff else None)
+        if kind == "hashrate":
+            thread = THREAD_PATTERN.search(line)
+            return MinerEvent(
+                "hashrate", float(match.group(1)) * HASHRATE_UNITS[match.group(2)],
+                int(thread.group(1)) if thread else None
+            )
+        if kind in ("temperature", "difficulty"):
+            return MinerEvent(kind, float(match.group(1)))
+        return MinerEvent(kind)
+    return None
+
+
+def benchmark_hashrate(lines):
+    """Final total hashrate of a benchmark run in H/s, or None"""
+    total = None
+    threads = {}
+    for line in lines:
+        event = parse_line(line)
+        if event is None or event.kind != "hashrate":
+            continue
+        if event.thread is not None:
+            threads[event.thread] = event.value
+        else:
+            total = event.value
+    if total is None and threads:
+        total = sum(threads.values())
+    return total
+
+
+def summarize_samples(samples):
+    """Median, stdev, min and max of repeated benchmark results"""
+    if not samples:
+        return {"runs": 0, "samples": [], "median": None, "stdev": None, "min": None, "max": None}
+    return {
+        "runs": len(samples),
+        "samples": samples,
+        "median": statistics.median(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "min": min(samples),
+        "max": max(samples)
+    }
+
+
+def relative_stdev(cell):
+    """Standard deviation of a benchmark cell as a percentage of its median"""
+    if not cell.get("median"):
+        return 0.0
+    return (cell.get("stdev") or 0) / cell["median"] * 100
+
+
+def miner_command(miner_binary):
+    """argv prefix that runs a miner binary, or the built-in engine"""
+    if miner_binary == ENGINE_BINARY:
+        return [sys.executable, os.path.abspath(__file__), "engine"]
+    if miner_binary.startswith(REPLAY_PREFIX):
+        speed, path = miner_binary[len(REPLAY_PREFIX):].split(":", 1)
+        return [sys.executable, os.path.abspath(__file__), "replay-miner", path, "--speed", speed]
+    return [miner_binary]
+
+
+def file_sha256(path):
+    """SHA-256 of a file, or None if it cannot be read"""
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                digest.update(chunk)
+    except (IOError, OSError):
+        return None
+    return digest.hexdigest()
+
+
+def classify_crash(returncode, tail):
+    """Classify a miner exit from its code and last output lines"""
+    if returncode == -4:  # SIGILL: build uses instructions this CPU lacks
+        return "binary"
+    text = "\n".join(tail).lower()
+    for kind, keywords in CRASH_PATTERNS:
+        if any(keyword in text for keyword in keywords):
+            return kind
+    if returncode == -9:  # SIGKILL, usually Android's low memory killer
+        return "killed"
+    return "crash"
+
+
+def restart_delay(kind, failures):
+    """Jittered exponential backoff for the n-th consecutive failure"""
+    delay = min(RESTART_BACKOFF.get(kind, RESTART_BACKOFF["crash"]) * 2 ** (failures - 1), RESTART_BACKOFF_MAX)
+    return delay * random.uniform(1 - RESTART_JITTER, 1 + RESTART_JITTER)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = math.ceil(pct / 100 * len(ordered))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+
+def rank_endpoint(pool, port, samples, failures):
+    """Summarize latency samples of one endpoint and score it"""
+    result = {
+        "name": pool["name"],
+        "url": pool["url"],
+        "port": port,
+        "fee": pool["fee"],
+        "samples": len(samples),
+        "raw_samples": list(samples),
+        "failures": failures,
+        "median": None,
+        "p90": None,
+        "jitter": None,
+        "score": 0
+    }
+    if not samples:
+        return result
+
+    median = statistics.median(samples)
+    p90 = percentile(samples, 90)
+    jitter = statistics.pstdev(samples) if len(samples) > 1 else 0.0
+    success = len(samples) / (len(samples) + failures)
+
+    # Lower latency, tail, jitter and fee = better; lossy endpoints are penalized
+    effective = max(median + (p90 - median) * 0.5 + jitter, 0.1)
+    result.update({
+        "median": median,
+        "p90": p90,
+        "jitter": jitter,
+        "score": (1000 / effective) * (1 - (pool["fee"] / 100)) * success
+    })
+    return result
+
+
+async def probe_stratum(url, username, timeout=PROBE_TIMEOUT):
+    """Time a stratum subscribe and authorize against a pool
+
+    Returns the subscribe round trip in ms, or None if the pool did not
+    complete the handshake.
+    """
+    host, port = pool_address(url)
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        
+        async def call(msg_id, method, params):
+            writer.write((json.dumps({"id": msg_id, "method": method, "params": params}) + "\n").encode())
+            await writer.drain()
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout)
+                if not line:
+                    raise ConnectionError("Pool closed the connection")
+                msg = json.loads(line)
+                # Skip notifications sent before the reply
+                if msg.get("id") == msg_id:
+                    return msg
+        
+        start_time = time.perf_counter()
+        await call(1, "mining.subscribe", ["termux-probe/1.0"])
+        latency = (time.perf_counter() - start_time) * 1000
+        reply = await call(2, "mining.authorize", [username, "x"])
+        return latency if reply.get("result") and not reply.get("error") else None
+    except (OSError, ConnectionError, ValueError, asyncio.TimeoutError):
+        return None
+    finally:
+        if writer:
+            writer.close()
+
+
+def is_stale_error(error):
+    """Whether a stratum error or log line means the share was stale"""
+    if not error:
+        return False
+    if isinstance(error, (list, tuple)):
+        if error and error[0] == 21:  # stratum "job not found"
+            return True
+        error = " ".join(str(part) for part in error)
+    text = str(error).lower()
+    return any(keyword in text for keyword in STALE_KEYWORDS)
+
+
+class PoolHealth:
+    """Rolling share-level health of one pool"""
+
+    def __init__(self, window=POOL_HEALTH_WINDOW):
+        self.window = window
+        self.shares = deque()  # (time, accepted, stale, latency ms)
+        self.handshakes = deque(maxlen=POOL_HEALTH_SAMPLES)  # subscribe ms, None on failure
+
+    def record_share(self, accepted, stale=False, latency=None, now=None):
+        self.shares.append((now or time.time(), accepted, stale, latency))
+
+    def record_handshake(self, latency):
+        self.handshakes.append(latency)
+
+    def prune(self, now):
+        while self.shares and self.shares[0][0] < now - self.window:
+            self.shares.popleft()
+
+    def summary(self, now=None):
+        """Reject, stale and latency figures over the window"""
+        now = now or time.time()
+        self.prune(now)
+        total = len(self.shares)
+        rejected = sum(1 for share in self.shares if not share[1])
+        stale = sum(1 for share in self.shares if share[2])
+        submit = [share[3] for share in self.shares if share[3] is not None]
+        handshakes = [latency for latency in self.handshakes if latency is not None]
+        return {
+            "shares": total,
+            "reject_rate": rejected / total if total else None,
+            "stale_rate": stale / total if total else None,
+            "submit_ms": statistics.median(submit) if submit else None,
+            "handshake_ms": statistics.median(handshakes) if handshakes else None,
+            "reachable": not self.handshakes or self.handshakes[-1] is not None or bool(submit)
+        }
+
+    def effective_yield(self, fee, now=None):
+        """Expected fraction of hashing that ends up as paid shares"""
+        summary = self.summary(now)
+        if not summary["reachable"]:
+            return 0.0
+        # Smooth the reject rate towards a prior so a few shares don't decide
+        rejected = sum(1 for share in self.shares if not share[1])
+        reject = (rejected + POOL_REJECT_PRIOR * POOL_PRIOR_WEIGHT) / (summary["shares"] + POOL_PRIOR_WEIGHT)
+        latency = summary["submit_ms"] if summary["submit_ms"] is not None else summary["handshake_ms"]
+        # Work is lost while a new job travels down and a share travels up
+        lost = 2 * (latency or 0) / 1000 / POOL_JOB_INTERVAL
+        return (1 - fee / 100) * (1 - reject) * max(0.0, 1 - lost)
+
+
+def chi2_quantile(p, dof):
+    """Chi-square quantile by the Wilson-Hilferty approximation"""
+    z = statistics.NormalDist().inv_cdf(p)
+    h = 2 / (9 * dof)
+    return dof * max(0.0, 1 - h + z * math.sqrt(h)) ** 3
+
+
+def poisson_interval(count, confidence=ESTIMATOR_CONFIDENCE):
+    """Garwood confidence interval for the mean of a Poisson count"""
+    alpha = 1 - confidence
+    low = chi2_quantile(alpha / 2, 2 * count) / 2 if count else 0.0
+    high = chi2_quantile(1 - alpha / 2, 2 * count + 2) / 2
+    return low, high
+
+
+def btc_per_day(hashrate, network_difficulty=NETWORK_DIFFICULTY, block_reward=BLOCK_REWARD, pool_fee=0.0):
+    """Expected BTC per day for a hashrate under proportional payout"""
+    blocks = hashrate * 86400 / (network_difficulty * SHARE_WORK)
+    return blocks * block_reward * (1 - pool_fee / 100)
+
+
+class HashrateEstimator:
+    """Effective hashrate from accepted share difficulty over sliding windows
+
+    Shares at target difficulty D arrive as a Poisson process with rate
+    H / (D * 2^32), so the accepted work in a window estimates H and the
+    share count gives the confidence interval.
+    """
+
+    def __init__(self, window=ESTIMATOR_WINDOWS[-1][1]):
+        self.window = window
+        self.shares = deque()  # (time, accepted, stale, difficulty)
+        self.samples = deque()  # (time, reported H/s)
+        self.started = None
+        self.unknown_difficulty = 0
+
+    def start(self, now=None):
+        if self.started is None:
+            self.started = now or time.time()
+
+    def record_share(self, accepted, stale, difficulty, now=None):
+        if not difficulty:
+            self.unknown_difficulty += 1
+            return
+        self.shares.append((now or time.time(), accepted, stale, difficulty))
+
+    def record_hashrate(self, hashrate, now=None):
+        self.samples.append((now or time.time(), hashrate))
+
+    def prune(self, now):
+        cutoff = now - self.window
+        while self.shares and self.shares[0][0] < cutoff:
+            self.shares.popleft()
+        while self.samples and self.samples[0][0] < cutoff:
+            self.samples.popleft()
+
+    def estimate(self, window, now=None, confidence=ESTIMATOR_CONFIDENCE):
+        """Effective hashrate, its interval and the losses against the reported hashrate"""
+        now = now or time.time()
+        self.prune(now)
+        if self.started is None:
+            return None
+        elapsed = min(window, now - self.started)
+        if elapsed <= 0:
+            return None
+        cutoff = now - elapsed
+        count = 0
+        accepted = rejected = stale = 0.0
+        for timestamp, ok, is_stale, difficulty in self.shares:
+            if timestamp < cutoff:
+                continue
+            if ok:
+                count += 1
+                accepted += difficulty
+            elif is_stale:
+                stale += difficulty
+            else:
+                rejected += difficulty
+        samples = [hashrate for timestamp, hashrate in self.samples if timestamp >= cutoff]
+        reported = statistics.fmean(samples) if samples else None
+        
+        # Per-share work in H; the interval scales the count by the mean difficulty
+        scale = SHARE_WORK / elapsed
+        hashrate = accepted * scale
+        low, high = poisson_interval(count, confidence)
+        mean_difficulty = accepted / count if count else (self.shares[-1][3] if self.shares else 0)
+        result = {
+            "window": window,
+            "elapsed": elapsed,
+            "shares": count,
+            "hashrate": hashrate,
+            "low": low * mean_difficulty * scale,
+            "high": high * mean_difficulty * scale,
+            "reported": reported,
+            "reject_loss": None,
+            "stale_loss": None,
+            "unaccounted_loss": None,
+            "significant": False
+        }
+        if reported:
+            expected = reported / scale
+            result["reject_loss"] = rejected / expected
+            result["stale_loss"] = stale / expected
+            # Reconnect and restart gaps, and luck within the interval
+            result["unaccounted_loss"] = 1 - (accepted + rejected + stale) / expected
+            result["significant"] = count >= ESTIMATOR_MIN_SHARES and reported > result["high"]
+        return result
+
+    def best(self, now=None):
+        """Estimate from the longest window with enough shares, else None"""
+        for label, seconds in reversed(ESTIMATOR_WINDOWS):
+            result = self.estimate(seconds, now)
+            if result and result["shares"] >= ESTIMATOR_MIN_SHARES:
+                return dict(result, label=label)
+        return None
+
+
+def sha256d(data):
+    return hashlib.sha256(hashlib.sha256(data).digest()).digest()
+
+
+def difficulty_target(difficulty):
+    """Largest hash value that meets a stratum share difficulty"""
+    return int(DIFF1_TARGET / difficulty) if difficulty else DIFF1_TARGET
+
+
+def stratum_header(job, extranonce1, extranonce2, ntime=None):
+    """First 76 header bytes (everything but the nonce) for a mining.notify job"""
+    _, prevhash, coinb1, coinb2, branches, version, nbits, job_ntime = job[:8]
+    root = sha256d(bytes.fromhex(coinb1 + extranonce1 + extranonce2 + coinb2))
+    for branch in branches:
+        root = sha256d(root + bytes.fromhex(branch))
+    # Stratum sends the previous hash as byte-swapped 32-bit words
+    prev = bytes.fromhex(prevhash)
+    prev = b"".join(prev[i:i + 4][::-1] for i in range(0, 32, 4))
+    return (bytes.fromhex(version)[::-1] + prev + root +
+            bytes.fromhex(ntime or job_ntime)[::-1] + bytes.fromhex(nbits)[::-1])
+
+
+def share_meets_target(job, extranonce1, extranonce2, ntime, nonce, difficulty):
+    """Recompute a submitted share and check it against the share difficulty"""
+    header = stratum_header(job, extranonce1, extranonce2, ntime) + NONCE.pack(int(nonce, 16))
+    return int.from_bytes(sha256d(header), "little") <= difficulty_target(difficulty)
+
+
+def scan_nonces(header, start, count, target):
+    """Hash nonces [start, start + count) of a 76-byte header, return (nonces at or below target, count)"""
+    # The first 64 bytes are the same for every nonce: hash them once and copy the state
+    midstate = hashlib.sha256(header[:64])
+    tail = header[64:]
+    pack = NONCE.pack
+    sha256 = hashlib.sha256
+    # Hashes compare as little-endian numbers, so test the high zero bytes before converting
+    cut = 32 - (256 - target.bit_length()) // 8
+    zeros = bytes(32 - cut)
+    found = []
+    for nonce in range(start, start + count):
+        inner = midstate.copy()
+        inner.update(tail + pack(nonce))
+        digest = sha256(inner.digest()).digest()
+        if digest[cut:] == zeros and int.from_bytes(digest, "little") <= target:
+            found.append(nonce)
+    return found, count
+
+
+def engine_worker_init(cpus):
+    # The engine shuts the pool down itself; CTRL+C in the terminal must not kill workers mid-batch
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if cpus:
+        try:
+            os.sched_setaffinity(0, cpus)
+        except (AttributeError, OSError):
+            pass
+
+
+class HashEngine:
+    """Built-in sha256d miner: one process per core scanning nonce batches from a midstate"""
+
+    def __init__(self, threads=None, cpus=None):
+        self.threads = threads or len(cpus or []) or os.cpu_count() or 1
+        self.cpus = cpus
+        self.executor = None
+        self.job = None
+        self.job_ready = asyncio.Event()
+        self.hashes = [0] * self.threads  # per worker since the last report
+        self.reported = time.time()
+
+    def start(self):
+        # Only the opt-in engine needs these, keep them out of the controller's startup
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        # Spawned workers hold no copy of the parent's pipes, so they exit if the engine is killed
+        self.executor = ProcessPoolExecutor(self.threads, multiprocessing.get_context("spawn"),
+                                            engine_worker_init, (self.cpus,))
+
+    def close(self):
+        if self.executor:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+    def set_job(self, job):
+        """Switch all workers to new work from their next batch on"""
+        self.job = job
+        self.job_ready.set()
+
+    async def run(self, on_found):
+        """Keep every worker busy on consecutive nonce batches of the current job"""
+        loop = asyncio.get_running_loop()
+        pending = {}  # future -> (worker slot, job)
+        idle = list(range(self.threads))
+        while True:
+            while idle and self.job:
+                job = self.job
+                if job["next_nonce"] >= 1 << 32:
+                    self.set_job(job["roll"]())  # nonce space done, next extranonce2
+                    continue
+                start = job["next_nonce"]
+                count = min(ENGINE_BATCH, (1 << 32) - start)
+                job["next_nonce"] += count
+                future = loop.run_in_executor(self.executor, scan_nonces, job["header"], start, count, job["target"])
+                pending[future] = (idle.pop(), job)
+            if not pending:
+                self.job_ready.clear()
+                await self.job_ready.wait()
+                continue
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                slot, job = pending.pop(future)
+                idle.append(slot)
+                found, count = future.result()
+                self.hashes[slot] += count
+                for nonce in found:
+                    on_found(job, nonce)
+
+    def report(self):
+        """Print per-worker and total hashrates like cpuminer, return the total"""
+        now = time.time()
+        elapsed = max(now - self.reported, 1e-6)
+        rates = [count / elapsed for count in self.hashes]
+        for slot, rate in enumerate(rates):
+            print(f"CPU #{slot}: {format_hashrate(rate)}")
+        print(f"Total: {format_hashrate(sum(rates))}", flush=True)
+        self.hashes = [0] * self.threads
+        self.reported = now
+        return sum(rates)
+
+
+async def engine_benchmark(engine, time_limit):
+    """Hash a random header for time_limit seconds and print the hashrate"""
+    header = os.urandom(76)
+    engine.set_job({"header": header, "target": 0, "next_nonce": 0,
+                    "roll": lambda: {"header": os.urandom(76), "target": 0, "next_nonce": 0}})
+    task = asyncio.ensure_future(engine.run(lambda job, nonce: None))
+    deadline = time.time() + time_limit
+    try:
+        while time.time() < deadline:
+            await asyncio.sleep(min(ENGINE_REPORT_INTERVAL, max(0.0, deadline - time.time())))
+            engine.report()
+    finally:
+        task.cancel()
+
+
+async def engine_stratum(engine, url, username, password, retries):
+    """Mine on a stratum pool, printing cpuminer-style log lines; return the exit code"""
+    host, port = pool_address(url)
+    failures = 0
+    while True:
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), PROBE_TIMEOUT * 2)
+        except (OSError, asyncio.TimeoutError) as e:
+            failures += 1
+            if failures > retries:
+                print(f"Stratum connection failed: {str(e)}, giving up", flush=True)
+                return 1
+            print(f"Stratum connection failed: {str(e)}, retry after {ENGINE_RETRY_DELAY} seconds", flush=True)
+            await asyncio.sleep(ENGINE_RETRY_DELAY)
+            continue
+        failures = 0
+        try:
+            await engine_session(engine, reader, writer, username, password)
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError) as e:
+            print(f"Stratum connection interrupted: {str(e)}", flush=True)
+        finally:
+            writer.close()
+        engine.job = None
+
+
+async def engine_session(engine, reader, writer, username, password):
+    """One stratum session: subscribe, authorize, then hash jobs and submit shares"""
+    state = {"next_id": 1, "pending": {}, "difficulty": 1.0, "extranonce1": "", "size": 4,
+             "extranonce2": 0, "accepted": 0, "rejected": 0, "rate": 0.0}
+
+    def send(method, params):
+        msg_id = state["next_id"]
+        state["next_id"] += 1
+        writer.write((json.dumps({"id": msg_id, "method": method, "params": params}) + "\n").encode())
+        return msg_id
+
+    def make_job(params):
+        extranonce2 = f"{state['extranonce2']:0{state['size'] * 2}x}"
+        state["extranonce2"] = (state["extranonce2"] + 1) % (256 ** state["size"])
+        return {
+            "id": params[0], "ntime": params[7], "extranonce2": extranonce2,
+            "header": stratum_header(params, state["extranonce1"], extranonce2),
+            "target": difficulty_target(state["difficulty"]), "difficulty": state["difficulty"],
+            "next_nonce": 0, "roll": lambda: make_job(params)
+        }
+
+    def on_found(job, nonce):
+        msg_id = send("mining.submit", [username, job["id"], job["extranonce2"], job["ntime"], f"{nonce:08x}"])
+        state["pending"][msg_id] = (time.perf_counter(), job["difficulty"])
+
+    send("mining.subscribe", ["termux-miner-engine/1.0"])
+    send("mining.authorize", [username, password])
+    hashing = asyncio.ensure_future(engine.run(on_found))
+    reporting = asyncio.ensure_future(engine_report_loop(engine, state))
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                raise ConnectionError("pool closed the connection")
+            msg = json.loads(line)
+            method, params = msg.get("method"), msg.get("params") or []
+            if method == "mining.set_difficulty":
+                state["difficulty"] = float(params[0])
+                print(f"Stratum difficulty set to {state['difficulty']:g}", flush=True)
+            elif method == "mining.notify":
+                print(f"Stratum new job {params[0]}", flush=True)
+                engine.set_job(make_job(params))
+            elif msg.get("id") == 1:
+                if msg.get("error") or not msg.get("result"):
+                    raise ValueError(f"subscribe failed: {msg.get('error')}")
+                state["extranonce1"], state["size"] = msg["result"][1], msg["result"][2]
+            elif msg.get("id") == 2:
+                if msg.get("error") or not msg.get("result"):
+                    raise ValueError(f"authorization failed: {msg.get('error')}")
+            elif msg.get("id") in state["pending"]:
+                sent, difficulty = state["pending"].pop(msg["id"])
+                latency = (time.perf_counter() - sent) * 1000
+                ok = bool(msg.get("result")) and not msg.get("error")
+                state["accepted" if ok else "rejected"] += 1
+                total = state["accepted"] + state["rejected"]
+                line = (f"{'accepted' if ok else 'rejected'}: {state['accepted']}/{total} (diff {difficulty:g}), "
+                        f"{format_hashrate(state['rate'])}, {latency:.0f} ms {'yes!' if ok else 'booooo'}")
+                if not ok:
+                    line += f" ({msg.get('error')})"
+                print(line, flush=True)
+    finally:
+        hashing.cancel()
+        reporting.cancel()
+
+
+async def engine_report_loop(engine, state):
+    while True:
+        await asyncio.sleep(ENGINE_REPORT_INTERVAL)
+        state["rate"] = engine.report()
+
+
+def run_engine(args):
+    """The engine command: a cpuminer-compatible entry point for the built-in engine"""
+    if args.algo != "sha256d":
+        print(f"Unsupported algorithm {args.algo}, the built-in engine only does sha256d")
+        return 1
+    cpus = [cpu for cpu in range(64) if int(args.cpu_affinity, 16) >> cpu & 1] if args.cpu_affinity else None
+    engine = HashEngine(args.threads, cpus)
+    engine.start()
+    print(f"Built-in sha256d engine, {engine.threads} worker processes", flush=True)
+
+    async def session():
+        loop = asyncio.get_running_loop()
+        task = asyncio.ensure_future(engine_benchmark(engine, args.time_limit) if args.benchmark else
+                                     engine_stratum(engine, args.url, args.user, args.password, args.retries))
+        # The supervisor stops miners with SIGTERM: finish the batch in flight and exit cleanly
+        loop.add_signal_handler(signal.SIGTERM, task.cancel)
+        try:
+            return await task
+        except asyncio.CancelledError:
+            return 0
+
+    try:
+        return asyncio.run(session()) or 0
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        engine.close()
+
+
+class StratumProxy:
+    """Share one upstream stratum session between many local miners"""
+
+    def __init__(self, upstream_url, username, password="x",
+                 listen_host=PROXY_HOST, listen_port=PROXY_PORT):
+        self.upstream_url = upstream_url
+        self.upstream_host, self.upstream_port = pool_address(upstream_url)
+        self.username = username
+        self.password = password
+        self.listen_host = listen_host
+        self.listen_port = listen_port
+        self.loop = None
+        self.server = None
+        self.upstream_task = None
+        self.upstream_writer = None
+        self.upstream_ready = None
+        self.extranonce1 = None
+        self.extranonce2_size = 0
+        self.difficulty = None
+        self.share_difficulty = None  # current target from mining.set_difficulty
+        self.last_notify = None
+        self.jobs = {}  # job id -> (notify params, share difficulty) for share checks
+        self.clients = {}  # prefix -> ProxyClient
+        self.pending = {}  # upstream id -> future or submit record
+        self.submit_queue = []
+        self.flush_handle = None
+        self.next_id = 1
+        self.running = False
+        self.stats = {"submitted": 0, "accepted": 0, "rejected": 0, "reconnects": 0, "checked": 0, "invalid": 0}
+        self.upstream_failures = 0  # consecutive failed sessions, reset by a handshake
+        self.submit_latencies = deque(maxlen=1000)  # ms
+        self.on_ack = None  # called with (latency ms, accepted, stale) for every share
+        self.on_check = None  # called with whether a local share met its target
+        self.on_log = None  # called with (text, color, important) instead of printing
+        self.recorder = None  # SessionRecorder capturing upstream traffic
+
+    @property
+    def url(self):
+        return f"stratum+tcp://{self.listen_host}:{self.listen_port}"
+
+    async def start(self):
+        """Start listening for local miners and connect upstream"""
+        self.loop = asyncio.get_running_loop()
+        self.running = True
+        self.upstream_ready = asyncio.Event()
+        self.server = await asyncio.start_server(self.handle_client, self.listen_host, self.listen_port)
+        self.listen_port = self.server.sockets[0].getsockname()[1]
+        self.upstream_task = asyncio.ensure_future(self.upstream_loop())
+
+    async def stop(self):
+        """Close the local server, clients and the upstream session"""
+        self.running = False
+        self.upstream_task.cancel()
+        self.server.close()
+        for client in list(self.clients.values()):
+            client.close()
+        if self.upstream_writer:
+            self.upstream_writer.close()
+        await self.server.wait_closed()
+
+    async def upstream_loop(self):
+        """Keep one upstream session alive, reconnecting with backoff"""
+        backoff = 1
+        while self.running:
+            try:
+                reader, writer = await asyncio.open_connection(self.upstream_host, self.upstream_port)
+                self.upstream_writer = writer
+                read_task = asyncio.ensure_future(self.read_upstream(reader))
+                try:
+                    await self.handshake()
+                    backoff = 1
+                    self.upstream_failures = 0
+                    await read_task
+                finally:
+                    read_task.cancel()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.report(f"Proxy upstream error: {str(e)}", Fore.RED)
+
+            self.upstream_ready.clear()
+            self.upstream_writer = None
+            self.fail_pending("Upstream disconnected")
+            if not self.running:
+                break
+            self.stats["reconnects"] += 1
+            self.upstream_failures += 1
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+    async def handshake(self):
+        """Subscribe and authorize the upstream session"""
+        result = await self.call("mining.subscribe", ["termux-proxy/1.0"])
+        extranonce1, extranonce2_size = result[1], result[2]
+        if extranonce2_size <= PROXY_PREFIX_BYTES:
+            raise ValueError(f"Pool extranonce2 size {extranonce2_size} too small to split")
+
+        if self.extranonce1 is not None and extranonce1 != self.extranonce1:
+            # Local miners hold the old extranonce, make them reconnect
+            for client in list(self.clients.values()):
+                client.close()
+        self.extranonce1 = extranonce1
+        self.extranonce2_size = extranonce2_size
+
+        if not await self.call("mining.authorize", [self.username, self.password]):
+            raise ValueError("Upstream authorization failed")
+        self.upstream_ready.set()
+        self.report(f"Proxy connected to {self.upstream_host}:{self.upstream_port}", Fore.GREEN)
+
+    def report(self, text, color):
+        """Status line through the controller's log, so the dashboard stays intact"""
+        if self.on_log:
+            self.on_log(text, color, important=True)
+        else:
+            print(color + text)
+
+    def call(self, method, params):
+        """Send a request upstream and return a future for its result"""
+        future = self.loop.create_future()
+        self.send_upstream(method, params, future)
+        return asyncio.wait_for(future, PROBE_TIMEOUT * 2)
+
+    def send_upstream(self, method, params, record):
+        msg_id = self.next_id
+        self.next_id += 1
+        self.pending[msg_id] = record
+        line = json.dumps({"id": msg_id, "method": method, "params": params}) + "\n"
+        if self.recorder:
+            self.recorder.record("p<", line)
+        self.upstream_writer.write(line.encode())
+        return msg_id
+
+    def fail_pending(self, reason):
+        for record in self.pending.values():
+            if isinstance(record, asyncio.Future):
+                if not record.done():
+                    record.set_exception(ConnectionError(reason))
+            else:
+                record["client"].respond(record["id"], False, [20, reason, None])
+        self.pending.clear()
+        for record in self.submit_queue:
+            record["client"].respond(record["id"], False, [20, reason, None])
+        self.submit_queue = []
+
+    async def read_upstream(self, reader):
+        while self.running:
+            line = await reader.readline()
+            if not line:
+                break
+            if self.recorder:
+                self.recorder.record("p>", line.decode(errors="replace"))
+            try:
+                msg = json.loads(line)
+            except ValueError:
+                continue
+
+            if msg.get("method"):
+                self.handle_upstream_method(msg)
+                continue
+
+            record = self.pending.pop(msg.get("id"), None)
+            if record is None:
+                continue
+            if isinstance(record, asyncio.Future):
+                if record.done():
+                    continue
+                if msg.get("error"):
+                    record.set_exception(ValueError(str(msg["error"])))
+                else:
+                    record.set_result(msg.get("result"))
+            else:
+                self.finish_submit(record, msg)
+
+    def handle_upstream_method(self, msg):
+        method, params = msg["method"], msg.get("params", [])
+        if method == "mining.notify":
+            self.last_notify = msg
+            self.jobs[params[0]] = (params, self.share_difficulty)
+            while len(self.jobs) > PROXY_JOB_HISTORY:
+                del self.jobs[next(iter(self.jobs))]
+        elif method == "mining.set_difficulty":
+            self.difficulty = msg
+            try:
+                self.share_difficulty = float(params[0])
+            except (IndexError, TypeError, ValueError):
+                pass
+        elif method == "client.reconnect":
+            if self.upstream_writer:
+                self.upstream_writer.close()
+            return
+        elif method == "mining.set_extranonce":
+            self.extranonce1, self.extranonce2_size = params[0], params[1]
+            for client in list(self.clients.values()):
+                client.close()
+            return
+        for client in list(self.clients.values()):
+            if client.authorized:
+                client.send(msg)
+
+    def submit(self, client, msg_id, params):
+        """Queue a local share for a batched upstream write"""
+        if not self.upstream_ready.is_set():
+            client.respond(msg_id, False, [20, "Upstream unavailable", None])
+            return
+        _, job_id, extranonce2, ntime, nonce = params[:5]
+        upstream_params = [self.username, job_id, client.prefix_hex + extranonce2, ntime, nonce] + params[5:]
+        if job_id in self.jobs and len(params) == 5:
+            self.check_share(job_id, client.prefix_hex + extranonce2, ntime, nonce)
+        self.submit_queue.append({
+            "client": client,
+            "id": msg_id,
+            "params": upstream_params,
+            "sent": None
+        })
+        if self.flush_handle is None:
+            self.flush_handle = self.loop.call_later(PROXY_BATCH_WINDOW, self.flush_submits)
+
+    def check_share(self, job_id, extranonce2, ntime, nonce):
+        """Recompute a local miner's share; a bad hash points at a miscompiled build"""
+        job, difficulty = self.jobs[job_id]
+        # A share may race a difficulty change, so the easier of the two counts
+        difficulty = min((d for d in (difficulty, self.share_difficulty) if d), default=1.0)
+        try:
+            valid = share_meets_target(job, self.extranonce1, extranonce2, ntime, nonce, difficulty)
+        except (ValueError, TypeError):
+            valid = False
+        self.stats["checked"] += 1
+        if not valid:
+            self.stats["invalid"] += 1
+        if self.on_check:
+            self.on_check(valid)
+
+    def flush_submits(self):
+        """Write every queued submit upstream in one go"""
+        self.flush_handle = None
+        queue, self.submit_queue = self.submit_queue, []
+        if not queue or self.upstream_writer is None:
+            for record in queue:
+                record["client"].respond(record["id"], False, [20, "Upstream unavailable", None])
+            return
+
+        lines = []
+        now = time.perf_counter()
+        for record in queue:
+            msg_id = self.next_id
+            self.next_id += 1
+            record["sent"] = now
+            self.pending[msg_id] = record
+            lines.append(json.dumps({"id": msg_id, "method": "mining.submit", "params": record["params"]}))
+            if self.recorder:
+                self.recorder.record("p<", lines[-1])
+        self.upstream_writer.write(("\n".join(lines) + "\n").encode())
+        self.stats["submitted"] += len(queue)
+
+    def finish_submit(self, record, msg):
+        latency = (time.perf_counter() - record["sent"]) * 1000
+        self.submit_latencies.append(latency)
+        accepted = bool(msg.get("result") and not msg.get("error"))
+        if accepted:
+            self.stats["accepted"] += 1
+        else:
+            self.stats["rejected"] += 1
+        if self.on_ack:
+            self.on_ack(latency, accepted, not accepted and is_stale_error(msg.get("error")))
+        record["client"].respond(record["id"], msg.get("result"), msg.get("error"))
+
+    def allocate_prefix(self):
+        for prefix in range(256 ** PROXY_PREFIX_BYTES):
+            if prefix not in self.clients:
+                return prefix
+        return None
+
+    async def handle_client(self, reader, writer):
+        """Serve one local miner connection"""
+        prefix = self.allocate_prefix()
+        if prefix is None:
+            writer.close()
+            return
+        client = ProxyClient(self, prefix, writer)
+        self.clients[prefix] = client
+        try:
+            while self.running:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    msg = json.loads(line)
+                except ValueError:
+                    continue
+                await self.handle_client_message(client, msg)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            self.clients.pop(prefix, None)
+            client.close()
+
+    async def handle_client_message(self, client, msg):
+        method, msg_id, params = msg.get("method"), msg.get("id"), msg.get("params", [])
+        if method == "mining.subscribe":
+            try:
+                await asyncio.wait_for(self.upstream_ready.wait(), PROBE_TIMEOUT * 2)
+            except asyncio.TimeoutError:
+                client.respond(msg_id, None, [20, "Upstream unavailable", None])
+                return
+            client.respond(msg_id, [
+                [["mining.set_difficulty", client.prefix_hex], ["mining.notify", client.prefix_hex]],
+                self.extranonce1 + client.prefix_hex,
+                self.extranonce2_size - PROXY_PREFIX_BYTES
+            ], None)
+        elif method == "mining.authorize":
+            client.authorized = True
+            client.respond(msg_id, True, None)
+            if self.difficulty:
+                client.send(self.difficulty)
+            if self.last_notify:
+                client.send(self.last_notify)
+        elif method == "mining.submit":
+            self.submit(client, msg_id, params)
+        elif method == "mining.extranonce.subscribe":
+            client.respond(msg_id, True, None)
+        else:
+            client.respond(msg_id, None, [20, f"Unsupported method {method}", None])
+
+
+class ProxyClient:
+    """A local miner connected to the stratum proxy"""
+
+    def __init__(self, proxy, prefix, writer):
+        self.proxy = proxy
+        self.prefix = prefix
+        self.prefix_hex = f"{prefix:0{PROXY_PREFIX_BYTES * 2}x}"
+        self.writer = writer
+        self.authorized = False
+
+    def send(self, msg):
+        if self.writer.is_closing():
+            return
+        self.writer.write((json.dumps(msg) + "\n").encode())
+
+    def respond(self, msg_id, result, error):
+        self.send({"id": msg_id, "result": result, "error": error})
+
+    def close(self):
+        if not self.writer.is_closing():
+            self.writer.close()
+
+
+class FakeStratumServer:
+    """Minimal stand-in stratum pool for offline development"""
+
+    def __init__(self, host=PROXY_HOST, port=FAKE_POOL_PORT, extranonce2_size=4,
+                 difficulty=1, job_interval=30, latency=0, reject_rate=0.0, stale_rate=0.0):
+        self.host = host
+        self.port = port
+        self.extranonce2_size = extranonce2_size
+        self.difficulty = difficulty
+        self.job_interval = job_interval
+        # Fault injection for testing pool health scoring
+        self.latency = latency  # ms added before every reply
+        self.reject_rate = reject_rate
+        self.stale_rate = stale_rate
+        self.server = None
+        self.job_task = None
+        self.writers = set()
+        self.sessions = 0
+        self.job_id = 0
+        self.submits = []
+        self.notify = None
+
+    async def start(self):
+        self.new_job()
+        self.server = await asyncio.start_server(self.handle_client, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.job_task = asyncio.ensure_future(self.job_loop())
+
+    async def stop(self):
+        self.job_task.cancel()
+        self.server.close()
+        for writer in list(self.writers):
+            writer.close()
+        await self.server.wait_closed()
+
+    async def serve_forever(self):
+        await self.start()
+        print(Fore.GREEN + f"Fake stratum pool listening on {self.host}:{self.port}")
+        await self.server.serve_forever()
+
+    def new_job(self):
+        self.job_id += 1
+        self.notify = {
+            "id": None,
+            "method": "mining.notify",
+            "params": [
+                f"{self.job_id:x}",
+                os.urandom(32).hex(),
+                "01000000010000000000000000000000000000000000000000000000000000000000000000ffffffff20",
+                "ffffffff0100f2052a010000001976a914000000000000000000000000000000000000000088ac00000000",
+                [],
+                "20000000",
+                "1d00ffff",
+                f"{int(time.time()):08x}",
+                True
+            ]
+        }
+
+    async def job_loop(self):
+        while True:
+            await asyncio.sleep(self.job_interval)
+            self.new_job()
+            self.broadcast(self.notify)
+
+    def broadcast(self, msg):
+        line = (json.dumps(msg) + "\n").encode()
+        for writer in list(self.writers):
+            if not writer.is_closing():
+                writer.write(line)
+
+    async def handle_client(self, reader, writer):
+        self.sessions += 1
+        extranonce1 = f"{self.sessions:08x}"
+        self.writers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                msg = json.loads(line)
+                method, msg_id = msg.get("method"), msg.get("id")
+                error = None
+                if method == "mining.subscribe":
+                    result = [[["mining.notify", extranonce1]], extranonce1, self.extranonce2_size]
+                elif method == "mining.authorize":
+                    result = True
+                elif method == "mining.submit":
+                    self.submits.append(msg["params"])
+                    error = self.submit_error(msg["params"])
+                    result = error is None
+                else:
+                    result = None
+                reply = [{"id": msg_id, "result": result, "error": error}]
+                if method == "mining.authorize":
+                    reply.append({"id": None, "method": "mining.set_difficulty", "params": [self.difficulty]})
+                    reply.append(self.notify)
+                if self.latency:
+                    # Delay without blocking the next request, like a slow link
+                    asyncio.get_running_loop().call_later(self.latency / 1000, self.send, writer, reply)
+                else:
+                    self.send(writer, reply)
+        except (ConnectionError, ValueError, asyncio.CancelledError):
+            pass
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+    def submit_error(self, params):
+        """Stratum error for a submit, or None to accept it"""
+        if len(params) > 1 and params[1] != self.notify["params"][0]:
+            return [21, "Job not found (stale)", None]
+        roll = random.random()
+        if roll < self.stale_rate:
+            return [21, "Job not found (stale)", None]
+        if roll < self.stale_rate + self.reject_rate:
+            return [23, "Low difficulty share", None]
+        return None
+
+    def send(self, writer, msgs):
+        if not writer.is_closing():
+            writer.write("".join(json.dumps(msg) + "\n" for msg in msgs).encode())
+
+
+def run_fake_pool(port=FAKE_POOL_PORT, latency=0, reject_rate=0.0):
+    """Run the stand-in stratum pool until interrupted"""
+    try:
+        asyncio.run(FakeStratumServer(port=port, latency=latency, reject_rate=reject_rate).serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+class MinerApiClient:
+    """Query cpuminer's text API over a reused localhost connection"""
+
+    def __init__(self, host=PROXY_HOST, port=API_PORT, timeout=2):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.reader = None
+        self.writer = None
+        self.keep_alive = False  # learned from the first complete reply
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout
+        )
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def request(self, command):
+        """Send one API command and return the raw response text"""
+        for attempt in range(2):
+            if self.writer is None:
+                await self.connect()
+            try:
+                self.writer.write(command.encode())
+                await self.writer.drain()
+                return await self.read_response()
+            except (OSError, ConnectionError, asyncio.TimeoutError):
+                # cpuminer closes the connection after each reply, reconnect once
+                self.close()
+                if attempt:
+                    raise
+        return ""
+
+    async def read_response(self):
+        chunks = []
+        while True:
+            complete = chunks and chunks[-1].rstrip(b"\0\r\n").endswith(b"|")
+            if complete and self.keep_alive:
+                break
+            try:
+                # After a full reply only wait briefly to see if the server closes
+                chunk = await asyncio.wait_for(self.reader.read(4096), 0.05 if complete else self.timeout)
+            except asyncio.TimeoutError:
+                if complete:
+                    # Connection stayed open after a full reply
+                    self.keep_alive = True
+                    break
+                raise
+            if not chunk:
+                # Server closed the connection; the next request reconnects
+                self.close()
+                if not chunks:
+                    raise ConnectionError("API closed the connection")
+                break
+            chunks.append(chunk)
+        return b"".join(chunks).decode(errors="replace").strip("\0\r\n")
+
+    async def summary(self):
+        records = parse_api_response(await self.request("summary"))
+        return records[0] if records else {}
+
+    async def threads(self):
+        return parse_api_response(await self.request("threads"))
+
+
+def parse_api_response(text):
+    """Split 'KEY=value;KEY=value|...' API replies into dicts"""
+    records = []
+    for record in text.split("|"):
+        fields = {}
+        for field in record.split(";"):
+            key, sep, value = field.partition("=")
+            if sep:
+                fields[key.strip()] = value.strip()
+        if fields:
+            records.append(fields)
+    return records
+
+
+def api_hashrate(fields):
+    """Hashrate in H/s from an API record"""
+    for key, scale in (("HS", 1), ("H/s", 1), ("KHS", 1e3), ("kH/s", 1e3), ("MHS", 1e6)):
+        if key in fields:
+            try:
+                return float(fields[key]) * scale
+            except ValueError:
+                return None
+    return None
+
+
+class FakeMinerApi:
+    """Stand-in for cpuminer's API socket for offline development"""
+
+    def __init__(self, host=PROXY_HOST, port=0, threads=2, hashrate=1000.0, keep_alive=False):
+        self.host = host
+        self.port = port
+        self.thread_count = threads
+        self.hashrate = hashrate  # H/s per thread
+        self.keep_alive = keep_alive  # real cpuminer closes after every reply
+        self.accepted = 0
+        self.rejected = 0
+        self.temperature = 55.0
+        self.requests = 0
+        self.connections = 0
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle_client, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    def reply(self, command):
+        if command == "summary":
+            total = self.hashrate * self.thread_count
+            return (f"NAME=cpuminer-opt;VER=fake;API=1.0;ALGO=sha256d;CPUS={self.thread_count};"
+                    f"URL=stratum+tcp://127.0.0.1;HS={total:.2f};KHS={total / 1000:.5f};"
+                    f"ACC={self.accepted};REJ={self.rejected};SOL=0;DIFF=0.001;"
+                    f"TEMP={self.temperature:.1f};UPTIME=1;TS={int(time.time())}|")
+        if command == "threads":
+            return "".join(f"CPU={i};H/s={self.hashrate:.2f}|" for i in range(self.thread_count))
+        return ""
+
+    async def handle_client(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                data = await reader.read(1024)
+                if not data:
+                    break
+                self.requests += 1
+                writer.write(self.reply(data.decode().strip("\0\r\n|")).encode())
+                await writer.drain()
+                if not self.keep_alive:
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+
+class StatsRing:
+    """Fixed-size ring of binary stats records in a memory-mapped file
+
+    Every record carries a sequence number and a CRC32, so a record torn by
+    a crash is simply skipped on read and the file never needs repairing.
+    """
+
+    def __init__(self, path, capacity):
+        self.path = path
+        self.capacity = capacity
+        size = STATS_HEADER.size + capacity * STATS_SLOT_SIZE
+        header = STATS_HEADER.pack(STATS_MAGIC, STATS_VERSION, STATS_SLOT_SIZE, capacity)
+        
+        valid = False
+        legacy = []
+        if os.path.exists(path) and os.path.getsize(path) == size:
+            with open(path, "rb") as f:
+                valid = f.read(STATS_HEADER.size) == header
+        if not valid:
+            legacy = self.read_legacy(path, capacity)
+            # New file or different layout: start a fresh ring atomically
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(header)
+                f.truncate(size)
+            os.replace(tmp_path, path)
+        
+        self.file = open(path, "r+b")
+        self.map = mmap.mmap(self.file.fileno(), size)
+        records = self.records()
+        self.next_seq = records[-1][0] + 1 if records else 1
+        if legacy:
+            # Carry the old history over, new fields unknown
+            padding = (float("nan"),) * len(EFFICIENCY_FIELDS)
+            for record in legacy[-capacity:]:
+                self.append(record[1:] + padding)
+            self.flush()
+
+    @staticmethod
+    def read_legacy(path, capacity):
+        """Records of a ring written with an older STATS_VERSION, oldest first"""
+        if not os.path.exists(path):
+            return []
+        with open(path, "rb") as f:
+            data = f.read()
+        try:
+            magic, version, slot_size, count = STATS_HEADER.unpack_from(data)
+        except struct.error:
+            return []
+        layout = STATS_LEGACY_RECORDS.get(version)
+        if magic != STATS_MAGIC or layout is None or slot_size != layout.size + 4 or count != capacity \
+                or len(data) != STATS_HEADER.size + count * slot_size:
+            return []
+        records = []
+        for index in range(count):
+            slot = STATS_HEADER.size + index * slot_size
+            body = data[slot:slot + layout.size]
+            crc, = struct.unpack_from("<I", data, slot + layout.size)
+            if body[:8] != b"\0" * 8 and zlib.crc32(body) == crc:
+                records.append(layout.unpack(body))
+        records.sort()
+        return records
+
+    def append(self, record):
+        """Write one record tuple (without sequence number) into the next slot"""
+        body = STATS_RECORD.pack(self.next_seq, *record)
+        slot = STATS_HEADER.size + (self.next_seq % self.capacity) * STATS_SLOT_SIZE
+        self.map[slot:slot + STATS_SLOT_SIZE] = body + struct.pack("<I", zlib.crc32(body))
+        self.next_seq += 1
+
+    def records(self):
+        """All valid records as tuples, oldest first"""
+        records = []
+        for index in range(self.capacity):
+            slot = STATS_HEADER.size + index * STATS_SLOT_SIZE
+            body = self.map[slot:slot + STATS_RECORD.size]
+            crc, = struct.unpack_from("<I", self.map, slot + STATS_RECORD.size)
+            if body[:8] == b"\0" * 8 or zlib.crc32(body) != crc:
+                continue
+            records.append(STATS_RECORD.unpack(body))
+        records.sort()
+        return records
+
+    def flush(self):
+        self.map.flush()
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+class StatsStore:
+    """Multi-resolution mining history with rolling window queries"""
+
+    def __init__(self, directory=STATS_DIR):
+        os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.rings = [
+            (resolution, StatsRing(os.path.join(directory, f"stats_{resolution}s.bin"), capacity))
+            for resolution, capacity in STATS_RESOLUTIONS
+        ]
+        self.buckets = [None] * len(self.rings)  # pending aggregate per coarser resolution
+
+    def add(self, timestamp, hashrate, accepted, rejected, temperature=None, efficiency=None):
+        """Record a raw sample and roll it up into the coarser resolutions"""
+        efficiency = efficiency or {}
+        sample = (timestamp, hashrate, accepted, rejected,
+                  float("nan") if temperature is None else temperature, 1) + tuple(
+            float("nan") if efficiency.get(key) is None else efficiency[key] for key in EFFICIENCY_FIELDS)
+        with self.lock:
+            self.rings[0][1].append(sample)
+            for level in range(1, len(self.rings)):
+                sample = self.roll_up(level, sample)
+                if sample is None:
+                    break
+
+    def roll_up(self, level, sample):
+        """Fold a sample into a level's bucket; return the bucket once it closes"""
+        resolution, ring = self.rings[level]
+        bucket_start = sample[0] - sample[0] % resolution
+        bucket = self.buckets[level]
+        closed = None
+        if bucket is not None and bucket["start"] != bucket_start:
+            closed = (bucket["start"] + resolution, bucket["hashrate"] / bucket["samples"],
+                      bucket["accepted"], bucket["rejected"], bucket["temperature"], bucket["samples"]) + tuple(
+                total / weight if weight else float("nan") for total, weight in bucket["efficiency"])
+            ring.append(closed)
+            bucket = None
+        if bucket is None:
+            bucket = {"start": bucket_start, "hashrate": 0.0, "samples": 0, "temperature": float("nan"),
+                      "efficiency": [[0.0, 0] for _ in EFFICIENCY_FIELDS]}
+            self.buckets[level] = bucket
+        
+        bucket["hashrate"] += sample[1] * sample[5]
+        bucket["samples"] += sample[5]
+        for field, value in zip(bucket["efficiency"], sample[6:]):
+            if not math.isnan(value):
+                field[0] += value * sample[5]
+                field[1] += sample[5]
+        bucket["accepted"] = sample[2]
+        bucket["rejected"] = sample[3]
+        if not math.isnan(sample[4]):
+            bucket["temperature"] = sample[4] if math.isnan(bucket["temperature"]) \
+                else max(bucket["temperature"], sample[4])
+        return closed
+
+    def window(self, seconds, now=None):
+        """Records covering the last seconds, from the finest resolution that spans them"""
+        now = now or time.time()
+        with self.lock:
+            for resolution, ring in self.rings:
+                if resolution * ring.capacity >= seconds or ring is self.rings[-1][1]:
+                    return [r for r in ring.records() if r[1] >= now - seconds]
+        return []
+
+    def query(self, seconds, now=None):
+        """Rolling averages, percentiles and share rate over a window"""
+        records = self.window(seconds, now)
+        if not records:
+            return None
+        
+        hashrates = [r[2] for r in records]
+        weights = [r[6] for r in records]
+        temperatures = [r[5] for r in records if not math.isnan(r[5])]
+        
+        # Share counters are cumulative but reset when the controller restarts
+        accepted = rejected = 0
+        for previous, current in zip(records, records[1:]):
+            accepted += current[3] - previous[3] if current[3] >= previous[3] else current[3]
+            rejected += current[4] - previous[4] if current[4] >= previous[4] else current[4]
+        span = max(records[-1][1] - records[0][1], 1)
+        
+        # CPU accounting fields are NaN where unknown, averaged over the samples that have them
+        efficiency = {}
+        for index, key in enumerate(EFFICIENCY_FIELDS, 7):
+            known = [(r[index], r[6]) for r in records if not math.isnan(r[index])]
+            efficiency[key] = sum(v * w for v, w in known) / sum(w for _, w in known) if known else None
+        
+        return dict({
+            "records": len(records),
+            "span": span,
+            "hashrate_avg": sum(h * w for h, w in zip(hashrates, weights)) / sum(weights),
+            "hashrate_p50": percentile(hashrates, 50),
+            "hashrate_p90": percentile(hashrates, 90),
+            "hashrate_min": min(hashrates),
+            "hashrate_max": max(hashrates),
+            "accepted": accepted,
+            "rejected": rejected,
+            "shares_per_hour": accepted / span * 3600,
+            "temperature_max": max(temperatures) if temperatures else None
+        }, **efficiency)
+
+    def flush(self):
+        with self.lock:
+            for _, ring in self.rings:
+                ring.flush()
+
+    def close(self):
+        with self.lock:
+            for _, ring in self.rings:
+                ring.close()
+
+
+def read_sysfs(path):
+    """Contents of a sysfs attribute, or None if unreadable"""
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+    except (IOError, OSError):
+        return None
+
+
+def read_cpu_temperature(root=THERMAL_ROOT):
+    """Hottest CPU thermal zone in °C, or None where Android hides them"""
+    temperatures = []
+    try:
+        zones = [name for name in os.listdir(root) if name.startswith("thermal_zone")]
+    except OSError:
+        return None
+    for zone in zones:
+        zone_type = (read_sysfs(os.path.join(root, zone, "type")) or "").lower()
+        if not any(keyword in zone_type for keyword in THERMAL_ZONE_KEYWORDS):
+            continue
+        try:
+            value = float(read_sysfs(os.path.join(root, zone, "temp")))
+        except (TypeError, ValueError):
+            continue
+        # Most kernels report millidegrees, some plain degrees
+        value = value / 1000 if value > 1000 else value
+        if 0 < value < 150:
+            temperatures.append(value)
+    return max(temperatures) if temperatures else None
+
+
+def read_battery(root=POWER_SUPPLY_ROOT):
+    """Battery status, capacity (%) and current (mA), or None without a battery"""
+    try:
+        supplies = sorted(os.listdir(root))
+    except OSError:
+        return None
+    for supply in supplies:
+        path = os.path.join(root, supply)
+        if (read_sysfs(os.path.join(path, "type")) or "").lower() != "battery":
+            continue
+        battery = {"status": (read_sysfs(os.path.join(path, "status")) or "Unknown").lower(),
+                   "capacity": None, "current": None}
+        for key, name, scale in (("capacity", "capacity", 1), ("current", "current_now", 1000)):
+            try:
+                battery[key] = float(read_sysfs(os.path.join(path, name))) / scale
+            except (TypeError, ValueError):
+                pass
+        battery["charging"] = battery["status"] in ("charging", "full")
+        return battery
+    return None
+
+
+def read_proc_stat(pid, root=PROC_ROOT):
+    """(ppid, CPU seconds) of a process from /proc/<pid>/stat, or None once it is gone"""
+    try:
+        with open(os.path.join(root, str(pid), "stat"), "r") as f:
+            data = f.read()
+        # The command name may contain spaces and parentheses, fields resume after the last ")"
+        fields = data[data.rindex(")") + 2:].split()
+        # ppid is field 4, utime and stime are fields 14 and 15
+        return int(fields[1]), (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    except (IOError, OSError, ValueError, IndexError):
+        return None
+
+
+def process_tree(pids, root=PROC_ROOT):
+    """CPU seconds of the given processes and all their descendants by pid"""
+    stats = {}
+    try:
+        names = os.listdir(root)
+    except OSError:
+        names = []
+    for name in names:
+        if name.isdigit():
+            stat = read_proc_stat(name, root)
+            if stat:
+                stats[int(name)] = stat
+    children = defaultdict(list)
+    for pid, (ppid, _) in stats.items():
+        children[ppid].append(pid)
+    
+    tree = {}
+    pending = [pid for pid in pids if pid in stats]
+    while pending:
+        pid = pending.pop()
+        if pid not in tree:
+            tree[pid] = stats[pid][1]
+            pending += children[pid]
+    return tree
+
+
+def read_system_cpu(root=PROC_ROOT):
+    """(busy, total) CPU seconds over all cores from /proc/stat, or None where it is restricted"""
+    try:
+        with open(os.path.join(root, "stat"), "r") as f:
+            values = [int(value) for value in f.readline().split()[1:]]
+    except (IOError, OSError, ValueError):
+        return None
+    if len(values) < 4:
+        return None
+    # user nice system idle iowait irq softirq steal; guest time is already part of user
+    total = sum(values[:8])
+    idle = values[3] + (values[4] if len(values) > 4 else 0)
+    return (total - idle) / CLOCK_TICKS, total / CLOCK_TICKS
+
+
+def read_cpu_frequency(cpus=None, root=CPU_ROOT):
+    """Average current clock of the given CPUs (all when None) in MHz, or None"""
+    if cpus is None:
+        try:
+            cpus = [int(name[3:]) for name in os.listdir(root) if name[:3] == "cpu" and name[3:].isdigit()]
+        except OSError:
+            return None
+    frequencies = []
+    for cpu in cpus:
+        try:
+            frequencies.append(float(read_sysfs(os.path.join(root, f"cpu{cpu}", "cpufreq", "scaling_cur_freq"))))
+        except (TypeError, ValueError):
+            continue
+    return sum(frequencies) / len(frequencies) / 1000 if frequencies else None
+
+
+class CpuAccounting:
+    """CPU time spent by the miners, the controller and everything else between samples
+
+    Miner CPU includes all descendants, so the built-in engine's worker
+    processes count. Android 8+ hides /proc/stat from apps, so contention
+    is None there while the per-process figures still work.
+    """
+
+    def __init__(self, root=PROC_ROOT):
+        self.root = root
+        self.last = None  # (wall time, miner CPU by pid, controller CPU, system busy/total)
+
+    def sample(self, pids, hashrate, cpus=None, now=None):
+        """Accounting since the previous call, None on the first one"""
+        now = now or time.time()
+        miner = process_tree(pids, self.root)
+        times = os.times()
+        controller = times.user + times.system
+        system = read_system_cpu(self.root)
+        last, self.last = self.last, (now, miner, controller, system)
+        if last is None or now <= last[0]:
+            return None
+        
+        elapsed = now - last[0]
+        # Only processes seen both times can be diffed; a restart in between invalidates efficiency
+        miner_cpu = sum(cpu - last[1][pid] for pid, cpu in miner.items() if pid in last[1])
+        controller_cpu = controller - last[2]
+        ours = miner_cpu + controller_cpu
+        result = {
+            "miner_cpu": miner_cpu / elapsed * 100,  # % of one core
+            "controller_cpu": controller_cpu / elapsed * 100,
+            "hashes_per_cpu_second": hashrate * elapsed / miner_cpu
+            if miner_cpu > 0 and hashrate and set(miner) == set(last[1]) else None,
+            "controller_share": controller_cpu / ours * 100 if ours > 0 else None,
+            "contention": None,
+            "frequency_mhz": read_cpu_frequency(cpus)
+        }
+        if system and last[3] and system[1] > last[3][1]:
+            busy = system[0] - last[3][0]
+            # Busy time not spent by us, steal included, as % of all cores
+            result["contention"] = max(0.0, busy - ours) / (system[1] - last[3][1]) * 100
+        return result
+
+
+class ThermalGovernor:
+    """PI controller that turns temperature into an active thread count
+
+    The continuous level is only applied as a whole thread change after
+    GOVERNOR_HOLD seconds, so small oscillations never restart the miner.
+    """
+
+    def __init__(self, max_threads, target, min_threads=1, start_threads=None):
+        self.max_threads = max_threads
+        self.min_threads = min(min_threads, max_threads)
+        self.target = target
+        self.temperature = None
+        self.integral = 0.0
+        self.last_update = None
+        self.threads = max_threads
+        if start_threads:
+            self.threads = max(self.min_threads, min(max_threads, start_threads))
+            self.integral = (max_threads - self.threads) / GOVERNOR_KI
+        self.level = float(self.threads)
+
+    def update(self, temperature, now):
+        """Feed one temperature sample, return the thread count to run"""
+        dt = now - self.last_update if self.last_update is not None else 0
+        self.last_update = now
+        if self.temperature is None:
+            self.temperature = temperature
+        else:
+            self.temperature += GOVERNOR_SMOOTHING * (temperature - self.temperature)
+        
+        error = self.temperature - self.target
+        if abs(error) > GOVERNOR_DEADBAND:
+            self.integral += error * dt
+        level = self.max_threads - GOVERNOR_KP * error - GOVERNOR_KI * self.integral
+        
+        # Anti-windup: never integrate past the range that can be applied
+        clamped = max(self.min_threads, min(self.max_threads, level))
+        if clamped != level:
+            self.integral = (self.max_threads - clamped - GOVERNOR_KP * error) / GOVERNOR_KI
+        self.level = clamped
+        return int(round(clamped))
+
+    def emergency(self):
+        return self.temperature is not None and self.temperature >= self.target + GOVERNOR_EMERGENCY
+
+
+def throttle_layout(layout, threads, topology):
+    """Limit a layout to a thread budget, shedding the fastest (hottest) cores first"""
+    rank = {}
+    for index, cluster in enumerate(topology):
+        for cpu in cluster["cpus"]:
+            rank[cpu] = index  # 0 is the fastest cluster
+    all_cpus = sorted(rank)
+    
+    slots = []
+    for slot in layout:
+        cpus = list(slot["cpus"] or all_cpus)
+        count = min(slot["threads"] or len(cpus), len(cpus))
+        # One pinned core per thread, slowest first so the fastest sit at the end
+        slots.append(sorted(cpus, key=lambda cpu: -rank.get(cpu, 0))[:count])
+    
+    excess = sum(len(cpus) for cpus in slots) - threads
+    while excess > 0:
+        fastest = min((cpus for cpus in slots if cpus), key=lambda cpus: rank.get(cpus[-1], 0))
+        fastest.pop()
+        excess -= 1
+    return [{"cpus": sorted(cpus), "threads": len(cpus)} for cpus in slots if cpus]
+
+
+class Tracer:
+    """Lifecycle spans in the Chrome trace event format, one event per line
+
+    The file is a JSON array without its closing bracket, which
+    chrome://tracing and Perfetto accept, so later runs simply append.
+    """
+
+    def __init__(self, path=TRACE_FILE):
+        self.path = path
+        self.enabled = True
+        self.events = []
+        self.process_name = None  # device label, written once per process
+        self.named = set()
+        # Spans are timed with perf_counter and placed on the wall clock
+        self.clock_offset = time.time() - time.perf_counter()
+
+    def complete(self, name, start, end=None, **args):
+        """Record a span between two perf_counter readings"""
+        end = time.perf_counter() if end is None else end
+        self.events.append({
+            "name": name, "cat": "lifecycle", "ph": "X",
+            "ts": round((start + self.clock_offset) * 1e6), "dur": round((end - start) * 1e6),
+            "pid": os.getpid(), "tid": 0, "args": args
+        })
+
+    @contextlib.contextmanager
+    def span(self, name, **args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.complete(name, start, **args)
+
+    def flush(self):
+        """Append buffered events to the trace file"""
+        events, self.events = self.events, []
+        if not events or not self.enabled:
+            return
+        pid = os.getpid()
+        if self.process_name and pid not in self.named:
+            self.named.add(pid)
+            events.insert(0, {"name": "process_name", "ph": "M", "pid": pid, "tid": 0,
+                              "args": {"name": self.process_name}})
+        try:
+            if os.path.exists(self.path) and os.path.getsize(self.path) > TRACE_MAX_BYTES:
+                os.replace(self.path, self.path + ".1")
+            new = not os.path.exists(self.path)
+            with open(self.path, "a") as f:
+                if new:
+                    f.write("[\n")
+                f.write("".join(json.dumps(event, separators=(",", ":")) + ",\n" for event in events))
+        except (IOError, OSError):
+            pass
+
+
+class SessionRecorder:
+    """Timestamped miner output and stratum traffic, gzip-compressed, one record per line"""
+
+    def __init__(self, path):
+        import gzip  # capture and replay are opt-in, keep them out of startup
+        self.path = path
+        self.file = gzip.open(path, "wt", compresslevel=6)
+        self.started = time.perf_counter()
+        self.records = 0
+        self.file.write(f"# termux-miner capture {CAPTURE_VERSION} {datetime.now().isoformat()}\n")
+
+    def record(self, source, text, offset=None):
+        """Add one record; source is m<instance> for miner output, p> and p< for pool traffic"""
+        if offset is None:
+            offset = time.perf_counter() - self.started
+        self.file.write(f"{offset * 1000:.1f}\t{source}\t{text.rstrip()}\n")
+        self.records += 1
+
+    def close(self):
+        self.file.close()
+
+
+def read_capture(path):
+    """Yield (offset seconds, source, text) for every record of a capture"""
+    import gzip
+    with gzip.open(path, "rt") as f:
+        for line in f:
+            if line.startswith("#"):
+                continue
+            offset, source, text = line.rstrip("\n").split("\t", 2)
+            yield float(offset) / 1000, source, text
+
+
+def synthetic_capture(path, lines_per_second, duration, threads=8):
+    """Write a capture of cpuminer-like output at a fixed line rate"""
+    recorder = SessionRecorder(path)
+    total = int(lines_per_second * duration)
+    accepted = rejected = 0
+    for index in range(total):
+        offset = index / lines_per_second
+        if index % 1000 == 0:
+            text = "Stratum difficulty set to 0.01"
+        elif index % 200 == 0:
+            text = f"Stratum new job {index // 200:x}"
+        elif index % 50 == 0:
+            if index % 1500 == 0:
+                rejected += 1
+                text = f"rejected: {accepted}/{accepted + rejected} (diff 0.012), 1.50 MH/s, 80 ms booooo"
+            else:
+                accepted += 1
+                text = f"accepted: {accepted}/{accepted + rejected} (diff 0.014), 1.50 MH/s, 75 ms yes!"
+        elif index % 5 == 0:
+            text = "Checking work, no solution yet"
+        else:
+            text = f"CPU #{index % threads}: {180 + index % 40}.{index % 10} kH/s"
+        recorder.record("m0", f"[{datetime.now():%Y-%m-%d %H:%M:%S}] {text}", offset)
+    recorder.close()
+    return total
+
+
+def replay_binary(path, speed=1.0):
+    """Binary name that makes the supervisor run a capture as a fake miner process"""
+    return f"{REPLAY_PREFIX}{speed:g}:{path}"
+
+
+def run_replay_miner(args):
+    """The replay-miner command: print a capture's miner output with its original timing"""
+    started = time.perf_counter()
+    for offset, source, text in read_capture(args.capture):
+        if not source.startswith("m"):
+            continue
+        if args.speed:
+            delay = offset / args.speed - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+        sys.stdout.write(text + "\n")
+        sys.stdout.flush()
+    return 0
+
+
+class Dashboard:
+    """In-place ANSI status panel above a scrolling, rate-limited log
+
+    Log lines are buffered and written together with the panel once per
+    frame, so a chatty miner costs one terminal write per frame instead of
+    one per line.
+    """
+
+    def __init__(self, stream=None, interval=DASHBOARD_INTERVAL, log_rate=LOG_RATE_LIMIT):
+        self.stream = stream or sys.stdout
+        self.interval = interval
+        self.log_budget = max(1, int(log_rate * interval))
+        self.interactive = self.stream.isatty()
+        self.active = False
+        self.height = DASHBOARD_HEIGHT
+        self.panel = None
+        self.pending = []
+        self.logged = 0
+        self.suppressed = 0
+        self.last_line = None
+        self.repeats = 0
+
+    def start(self):
+        self.active = True
+        if self.interactive:
+            rows = shutil.get_terminal_size().lines
+            # Clear once, then keep the panel out of the scrolling region
+            self.stream.write(f"\033[2J\033[{self.height + 1};{rows}r\033[{rows};1H")
+            self.stream.flush()
+
+    def stop(self):
+        self.flush_repeats()
+        self.write_logs()
+        if self.interactive:
+            self.stream.write("\033[r\n")
+        self.stream.flush()
+        self.active = False
+        self.panel = None
+
+    def log(self, text, color="", important=False):
+        """Queue a log line; repeats are coalesced and floods rate-limited"""
+        if text == self.last_line:
+            self.repeats += 1
+            return
+        self.flush_repeats()
+        self.last_line = text
+        if not important and self.logged >= self.log_budget:
+            self.suppressed += 1
+            return
+        self.logged += 1
+        self.pending.append(color + text + Style.RESET_ALL)
+
+    def flush_repeats(self):
+        if self.repeats:
+            self.pending.append(Style.DIM + f"  (last line repeated {self.repeats} more times)" + Style.RESET_ALL)
+            self.repeats = 0
+
+    def write_logs(self):
+        if self.suppressed:
+            self.pending.append(Style.DIM + f"  ({self.suppressed} lines suppressed)" + Style.RESET_ALL)
+            self.suppressed = 0
+        if self.pending:
+            self.stream.write("\n".join(self.pending) + "\n")
+            self.pending = []
+        self.logged = 0
+
+    def render(self, lines):
+        """Write buffered logs and redraw the panel if it changed"""
+        self.write_logs()
+        lines = (lines + [""] * self.height)[:self.height]
+        if self.interactive and lines != self.panel:
+            self.panel = lines
+            # Save cursor, draw from home with clear-to-end-of-line, restore
+            self.stream.write("\0337\033[H" + "".join(line + Style.RESET_ALL + "\033[K\n" for line in lines) + "\0338")
+        self.stream.flush()
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style"""
+
+    def __init__(self, buckets):
+        self.buckets = sorted(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.total = 0
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        with self.lock:
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[index] += 1
+                    break
+            self.total += 1
+            self.sum += value
+
+    def render(self, name, help_text, labels=None):
+        """Prometheus text lines, with labels added to every series"""
+        label_text = "".join(f'{key}="{escape_label(value)}",' for key, value in (labels or {}).items())
+        series = f"{{{label_text[:-1]}}}" if label_text else ""
+        lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        with self.lock:
+            cumulative = 0
+            for bound, count in zip(self.buckets, self.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{label_text}le="{bound:g}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{label_text}le="+Inf"}} {self.total}')
+            lines.append(f"{name}_sum{series} {self.sum}")
+            lines.append(f"{name}_count{series} {self.total}")
+        return lines
+
+
+def escape_label(value):
+    """Escape a Prometheus label value"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_metric(name, metric_type, help_text, samples):
+    """Prometheus text lines for a counter or gauge; samples are (labels, value)"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+    for labels, value in samples:
+        if value is None:
+            continue
+        label_text = ",".join(f'{key}="{escape_label(val)}"' for key, val in labels.items())
+        value = int(value) if float(value).is_integer() else float(value)
+        lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+    return lines
+
+
 class TermuxMiner:
     def __init__(self):
         self.wallet_address = ""
         self.current_pool = None
         self.miner_process = None
-        self.hashrate = 0
+        self.instances = []
+        self.hashrate = 0  # H/s
+        self.rates = {"hashrate": 0, "threads": {}}  # single instance per-thread rates
+        self.share_log = deque(maxlen=1000)  # (time, accepted, diff, latency ms)
+        self.last_submit_diff = None
+        self.jobs = 0
+        self.reconnects = 0
+        self.temperature = None
+        self.parser_stats = {"lines": 0, "cpu": 0.0}
+        self.stats_store = None
+        self.hour_window = None  # last 1 h StatsStore.query, refreshed by monitor_stats
+        self.restarts = 0
+        self.mining_started = None  # when the current miner processes were launched
+        self.first_share_seen = False
+        self.share_latency = Histogram(SHARE_LATENCY_BUCKETS)
+        self.first_share_time = Histogram(FIRST_SHARE_BUCKETS)
+        self.metrics_server = None
+        self.loop = None  # event loop of the running mining session
+        self.loop_lock = threading.Lock()
+        self.loop_calls = []  # calls from background threads waiting for a session loop
+        self.dashboard = None
+        self.controller_cpu_sample = None
+        self.accounting = CpuAccounting()
+        self.efficiency = None  # latest CpuAccounting sample
+        self.last_crash = None
+        self.pool_circuits = {}  # pool name -> consecutive failures and open_until
+        self.pool_health = {}  # pool name -> PoolHealth
+        self.pool_switched_at = 0
+        self.switch_votes = None  # (pool name, consecutive evaluations ahead)
+        self.restart_pending = None  # reason for an intentional restart
+        self.governor = None
+        self.battery = None
+        self.paused = False
+        self.idle_temperature = None
+        self.estimator = HashrateEstimator()
+        self.session_binary = None
+        self.recorder = None  # SessionRecorder while capturing
+        self.share_checks = deque(maxlen=SPOT_CHECK_WINDOW)  # proxy verification results
+        self.share_difficulty = None  # target announced in the miner's log
+        self.estimated_earnings = 0
         self.shares = {"accepted": 0, "rejected": 0}
         self.running = False
         self.benchmark_mode = False
         self.worker_name = socket.gethostname() or "termux_worker"
-        self.check_network()
+        self.pool_ranking = []
+        self.pool_cache_lock = threading.Lock()
+        self.config = {}
+        self.proxy = None
+        self.startup = {"imports": (time.perf_counter() - STARTUP_T0) * 1000}  # phase -> ms
+        self.tracer = Tracer()
+        self.tracer.complete("imports", STARTUP_T0)
+        atexit.register(self.tracer.flush)
+        self.generation_started = None  # perf_counter when the current miner processes were spawned
+        self.generation_hash = False
+        self.generation_share = False
+        self.restart_began = None  # (perf_counter, span args) of the restart in progress
+        self.startup_reported = False
+        self.launch_time = None
+        self.daemon = False
+        self.status_file = None
+        self.session_profile_key = None
+        self.session_profiles = {}  # binary -> launch profile for the running session
+        self.cli_overrides = set()  # config keys set on the command line for this run only
+        self.fleet_profile_version = None
 
     def check_network(self):
         """Check internet connectivity"""
-        try:
-            requests.get("https://google.com", timeout=5)
-            return True
-        except:
-            print(Fore.RED + "No internet connection. Please check your network.")
-            sys.exit(1)
+        # Imported here: requests alone takes longer to import than the rest of startup
+        import requests
+        with self.tracer.span("network_check"):
+            try:
+                requests.get("https://google.com", timeout=5)
+                return True
+            except Exception:
+                return False
 
-    def install_dependencies(self):
+    def install_dependencies(self, use_cache=True):
         """Install all required dependencies (2025 Termux compatible)"""
-        # Updated working Termux packages (no "-dev")
-        required = [
-            "git", "autoconf", "automake", "libtool", "pkg-config",
-            "make", "clang", "curl", "libcurl", "openssl",
-            "libjansson", "libgmp", "zlib", "patch"  # Added patch utility
-        ]
+        start_time = time.perf_counter()
+        status_mtime = self.package_db_mtime()
+        if use_cache and status_mtime is not None and self.load_deps_cache() == {
+                "mtime": status_mtime, "packages": REQUIRED_PACKAGES}:
+            # Package database unchanged since the last successful check
+            self.record_phase("dependencies", start_time, cached=True)
+            return
 
         print(Fore.YELLOW + "Checking and installing dependencies...")
+        missing = self.missing_packages(REQUIRED_PACKAGES)
+        if missing is None:
+            print(Fore.RED + "dpkg-query not available, skipping dependency check")
+            return
+        
+        if missing:
+            # One pkg run resolves and downloads everything together
+            print(Fore.YELLOW + f"Installing {' '.join(missing)}...")
+            try:
+                subprocess.run(["pkg", "install", "-y"] + missing, check=True)
+            except (subprocess.CalledProcessError, OSError) as e:
+                print(Fore.RED + f"Failed to install {' '.join(missing)}: {str(e)}")
+                sys.exit(1)
+            missing = self.missing_packages(REQUIRED_PACKAGES)
+            if missing:
+                print(Fore.RED + f"Still missing after install: {' '.join(missing)}")
+                sys.exit(1)
+            print(Fore.GREEN + "Successfully installed all dependencies")
+        else:
+            print(Fore.GREEN + "All dependencies are already installed")
+        
+        self.save_deps_cache({"mtime": self.package_db_mtime(), "packages": REQUIRED_PACKAGES})
+        self.record_phase("dependencies", start_time, cached=False, installed=missing)
+
+    def missing_packages(self, packages):
+        """Packages not installed, from a single dpkg-query; None if dpkg is unavailable"""
+        try:
+            result = subprocess.run(["dpkg-query", "-W", "-f=${Package}\\t${Status}\\n"] + packages,
+                                    stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True)
+        except OSError:
+            return None
+        installed = set()
+        for line in result.stdout.splitlines():
+            name, _, status = line.partition("\t")
+            if status.split()[-1:] == ["installed"]:
+                installed.add(name)
+        return [pkg for pkg in packages if pkg not in installed]
+
+    def package_db_mtime(self):
+        try:
+            return os.stat(DPKG_STATUS_FILE).st_mtime
+        except OSError:
+            return None
+
+    def load_deps_cache(self):
+        try:
+            with open(DEPS_CACHE_FILE, "r") as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return None
+
+    def save_deps_cache(self, cache):
+        tmp_file = DEPS_CACHE_FILE + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(cache, f)
+        os.replace(tmp_file, DEPS_CACHE_FILE)
+
+    def timed(self, phase, func, *args):
+        """Run one startup step and record its duration"""
+        start_time = time.perf_counter()
+        result = func(*args)
+        self.record_phase(phase, start_time)
+        return result
+
+    def record_phase(self, phase, start_time, **args):
+        """Startup phase duration for the first-hash report, plus its trace span"""
+        end_time = time.perf_counter()
+        self.startup.setdefault(phase, (end_time - start_time) * 1000)
+        self.tracer.complete(phase, start_time, end_time, **args)
+
+    def report_startup(self):
+        """Log startup phase times and compare them with earlier runs"""
+        self.startup_reported = True
+        total = sum(self.startup.values())
+        history = []
+        try:
+            with open(STARTUP_LOG_FILE, "r") as f:
+                for line in f:
+                    try:
+                        history.append(json.loads(line)["total"])
+                    except (ValueError, KeyError):
+                        continue
+        except (IOError, OSError):
+            pass
+        history = history[-STARTUP_HISTORY:]
+        
+        phases = ", ".join(f"{phase} {ms:.0f} ms" for phase, ms in self.startup.items())
+        line = f"Startup {total / 1000:.2f}s to first hash ({phases})"
+        color = Fore.CYAN
+        if history:
+            baseline = statistics.median(history)
+            line += f"; median of last {len(history)} runs {baseline / 1000:.2f}s"
+            if total > baseline * STARTUP_REGRESSION:
+                color = Fore.RED
+                line += " - slower than usual"
+        self.log(line, color, important=True)
+        
+        with open(STARTUP_LOG_FILE, "a") as f:
+            f.write(json.dumps({"timestamp": datetime.now().isoformat(), "total": round(total, 1),
+                                "phases": {phase: round(ms, 1) for phase, ms in self.startup.items()}}) + "\n")
+        self.tracer.flush()
+
+    def toolchain_version(self):
+        """First line of the C compiler's --version output"""
+        compiler = os.environ.get("CC", "clang" if shutil.which("clang") else "cc").split()[-1]
+        try:
+            result = subprocess.run([compiler, "--version"], stdout=subprocess.PIPE,
+                                    stderr=subprocess.STDOUT, universal_newlines=True)
+            return result.stdout.splitlines()[0].strip() if result.stdout else compiler
+        except OSError:
+            return compiler
 
-        for pkg in required:
+    def upstream_commit(self, remote=False):
+        """Commit of the local checkout, or of the upstream HEAD"""
+        try:
+            if not remote and os.path.isdir(os.path.join(MINER_DIR, ".git")):
+                result = subprocess.run(["git", "rev-parse", "HEAD"], cwd=MINER_DIR, check=True,
+                                        stdout=subprocess.PIPE, universal_newlines=True)
+            else:
+                result = subprocess.run(["git", "ls-remote", CPUMINER_REPO, "HEAD"], check=True,
+                                        stdout=subprocess.PIPE, universal_newlines=True, timeout=30)
+            return result.stdout.split()[0]
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError, IndexError):
+            return None
+
+    def build_cache_key(self, commit, cflags=BUILD_CFLAGS, cxxflags=BUILD_CXXFLAGS, ldflags=""):
+        """Key a build by upstream commit, flags, patch set and toolchain"""
+        material = {
+            "commit": commit,
+            "cflags": cflags,
+            "cxxflags": cxxflags,
+            "patch": hashlib.sha256(ARM_PATCH.encode()).hexdigest(),
+            "toolchain": self.toolchain_version()
+        }
+        if ldflags:
+            material["ldflags"] = ldflags
+        material = json.dumps(material, sort_keys=True)
+        return hashlib.sha256(material.encode()).hexdigest()[:16]
+
+    def list_cached_builds(self):
+        """Metadata of every cached binary, most recently used first"""
+        builds = []
+        if not os.path.isdir(BUILD_CACHE_DIR):
+            return builds
+        for key in os.listdir(BUILD_CACHE_DIR):
+            meta_file = os.path.join(BUILD_CACHE_DIR, key, "meta.json")
             try:
-                subprocess.run(["dpkg", "-s", pkg], check=True,
-                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                print(Fore.GREEN + f"{pkg} is already installed")
-            except subprocess.CalledProcessError:
-                print(Fore.YELLOW + f"Installing {pkg}...")
-                try:
-                    subprocess.run(["pkg", "install", "-y", pkg], check=True)
-                    print(Fore.GREEN + f"Successfully installed {pkg}")
-                except subprocess.CalledProcessError as e:
-                    print(Fore.RED + f"Failed to install {pkg}: {str(e)}")
-                    sys.exit(1)
+                with open(meta_file, "r") as f:
+                    meta = json.load(f)
+            except (IOError, ValueError):
+                continue
+            if os.path.exists(os.path.join(BUILD_CACHE_DIR, key, meta["binary"])):
+                builds.append(meta)
+        builds.sort(key=lambda meta: meta.get("last_used", 0), reverse=True)
+        return builds
+
+    def cached_binary(self, key):
+        """Path of a cached binary, or None"""
+        for meta in self.list_cached_builds():
+            if meta["key"] == key:
+                return os.path.join(BUILD_CACHE_DIR, key, meta["binary"])
+        return None
+
+    def activate_build(self, key):
+        """Switch the miner to a cached binary"""
+        path = self.cached_binary(key)
+        if not path:
+            print(Fore.RED + f"No cached build {key}")
+            return False
+        
+        meta_file = os.path.join(BUILD_CACHE_DIR, key, "meta.json")
+        with open(meta_file, "r") as f:
+            meta = json.load(f)
+        meta["last_used"] = time.time()
+        with open(meta_file, "w") as f:
+            json.dump(meta, f, indent=2)
+        
+        self.set_config_value("active_build", key)
+        print(Fore.GREEN + f"Active build {key} (commit {meta['commit'][:10]}, CFLAGS {meta['cflags']})")
+        return True
+
+    def store_build(self, key, commit, cflags, cxxflags, label="generic", ldflags=""):
+        """Copy the freshly built binary into the cache and evict old builds"""
+        built = self.built_binary_path()
+        if not built:
+            raise FileNotFoundError("No miner binary produced by the build")
+        
+        build_dir = os.path.join(BUILD_CACHE_DIR, key)
+        os.makedirs(build_dir, exist_ok=True)
+        shutil.copy2(built, os.path.join(build_dir, os.path.basename(built)))
+        with open(os.path.join(build_dir, "meta.json"), "w") as f:
+            json.dump({
+                "key": key,
+                "label": label,
+                "binary": os.path.basename(built),
+                "commit": commit,
+                "cflags": cflags,
+                "cxxflags": cxxflags,
+                "ldflags": ldflags,
+                "toolchain": self.toolchain_version(),
+                "built": datetime.now().isoformat(),
+                "last_used": time.time()
+            }, f, indent=2)
+        
+        for meta in self.list_cached_builds()[BUILD_CACHE_MAX:]:
+            if meta["key"] != self.config.get("active_build"):
+                shutil.rmtree(os.path.join(BUILD_CACHE_DIR, meta["key"]), ignore_errors=True)
+
+    def build_env(self):
+        """Build environment, with ccache in front of the compiler when available"""
+        env = os.environ.copy()
+        if self.config.get("ccache", True) and shutil.which("ccache"):
+            compiler = env.get("CC", "clang" if shutil.which("clang") else "cc")
+            if not compiler.startswith("ccache"):
+                env["CC"] = f"ccache {compiler}"
+                env["CXX"] = f"ccache {env.get('CXX', 'clang++' if shutil.which('clang++') else 'c++')}"
+        return env
+
+    def run_build(self, cflags=BUILD_CFLAGS, cxxflags=BUILD_CXXFLAGS, fresh=False, ldflags=""):
+        """Configure (only when needed) and make in MINER_DIR"""
+        env = self.build_env()
+        stamp_file = os.path.join(MINER_DIR, BUILD_STAMP)
+        stamp = json.dumps({"cflags": cflags, "cxxflags": cxxflags, "ldflags": ldflags, "cc": env.get("CC")})
+        configured = False
+        reconfigure = False
+        if not fresh and os.path.exists(os.path.join(MINER_DIR, "config.status")):
+            try:
+                with open(stamp_file, "r") as f:
+                    configured = f.read() == stamp
+            except IOError:
+                configured = False
+            reconfigure = not configured
+        
+        configure = ["./configure", f"CFLAGS={cflags}", f"CXXFLAGS={cxxflags}"]
+        if ldflags:
+            configure.append(f"LDFLAGS={ldflags}")
+        configure += ["--with-curl", "--with-crypto"]
+        
+        build_steps = []
+        if fresh:
+            build_steps.append(["./build.sh"])
+        if reconfigure:
+            # Objects built with other flags must not be reused
+            build_steps.append(["make", "clean"])
+        if not configured:
+            build_steps += [["./autogen.sh"], configure]
+        build_steps.append(["make", "-j", str(os.cpu_count() or 2)])
+        
+        for step in build_steps:
+            print(Fore.BLUE + "Running: " + " ".join(step))
+            subprocess.run(step, check=True, cwd=MINER_DIR, env=env)
+            if step[0] == "./configure":
+                with open(stamp_file, "w") as f:
+                    f.write(stamp)
+
+    def apply_patch(self):
+        """Apply the ARM assembly patch unless it is already applied"""
+        already = subprocess.run(["patch", "-p1", "-R", "--dry-run", "-s", "-f"], input=ARM_PATCH.encode(),
+                                 cwd=MINER_DIR, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if already.returncode == 0:
+            return
+        try:
+            subprocess.run(["patch", "-p1", "-N", "-t"], input=ARM_PATCH.encode(), check=True, cwd=MINER_DIR)
+            print(Fore.GREEN + "Applied patch to fix ARM assembly warnings")
+        except subprocess.CalledProcessError:
+            print(Fore.YELLOW + "Warning: Could not apply patch, continuing with build")
 
-    def clone_and_build(self):
-        """Clone and build cpuminer-opt with optimizations"""
+    def fetch_source(self):
+        """Clone cpuminer-opt, or fast-forward an existing checkout"""
+        if os.path.isdir(os.path.join(MINER_DIR, ".git")):
+            print(Fore.CYAN + "Fetching cpuminer-opt updates...")
+            subprocess.run(["git", "fetch", "--depth", "1", "origin"], check=True, cwd=MINER_DIR)
+            # Reset only rewrites files that changed, so make stays incremental
+            subprocess.run(["git", "reset", "--hard", "FETCH_HEAD"], check=True, cwd=MINER_DIR)
+            return False
+        
         if os.path.exists(MINER_DIR):
             print(Fore.YELLOW + "Removing existing miner directory...")
             shutil.rmtree(MINER_DIR)
-        
         print(Fore.CYAN + "Cloning cpuminer-opt repository...")
         subprocess.run(["git", "clone", "--depth", "1", CPUMINER_REPO, MINER_DIR], check=True)
+        return True
+
+    def build_miner(self, cflags=BUILD_CFLAGS, cxxflags=BUILD_CXXFLAGS, label="generic", ldflags="",
+                    training=None):
+        """Return a cached build key for the latest source, building only on a cache miss
+
+        With training=(cflags, cxxflags, ldflags), an instrumented build is made
+        first and trained on the offline benchmark (profile-guided optimization).
+        """
+        commit = self.upstream_commit(remote=True)
+        if commit:
+            key = self.build_cache_key(commit, cflags, cxxflags, ldflags)
+            if self.cached_binary(key):
+                print(Fore.GREEN + "Build cache hit, skipping clone and compile")
+                return key
         
-        os.chdir(MINER_DIR)
+        fresh = self.fetch_source()
+        commit = self.upstream_commit()
+        key = self.build_cache_key(commit, cflags, cxxflags, ldflags)
+        if self.cached_binary(key):
+            print(Fore.GREEN + "Build cache hit, skipping compile")
+            return key
         
-        # Apply patch to fix the warnings
-        patch_code = """
-diff --git a/sind-utils/sind-int.h b/sind-utils/sind-int.h
-index abc123..def456 100644
---- a/sind-utils/sind-int.h
-+++ b/sind-utils/sind-int.h
-@@ -25,7 +25,7 @@
- #define rev32(a, b) \\
- do { \\
-    uint32_t tmp = b; \\
--    asm("rev32 %0, %1\\n\\t": "=r"(b) : "r"(a)); \\
-+    asm("rev32 %0, %1\\n\\t": "=w"(b) : "w"(a)); \\
-    a = tmp; \\
- } while(0)
- """
-        try:
-            subprocess.run(["patch", "-p1"], input=patch_code.encode(), check=True)
-            print(Fore.GREEN + "Applied patch to fix ARM assembly warnings")
-        except subprocess.CalledProcessError:
-            print(Fore.YELLOW + "Warning: Could not apply patch, continuing with build")
+        self.apply_patch()
+        if training:
+            # Only a real rebuild replaces the profile, a cache hit may still need it later
+            shutil.rmtree(PGO_PROFILE_DIR, ignore_errors=True)
+            os.makedirs(PGO_PROFILE_DIR)
+            print(Fore.CYAN + "Building instrumented cpuminer for profile training...")
+            self.run_build(training[0], training[1], fresh, training[2])
+            fresh = False
+            self.train_profile()
         
         print(Fore.CYAN + "Building cpuminer with optimizations...")
-        build_steps = [
-            ["./build.sh"],
-            ["./autogen.sh"],
-            ["./configure", "CFLAGS=-O3 -Wno-error=asm-operand-widths", 
-                          "CXXFLAGS=-O3", "--with-curl", "--with-crypto"],
-            ["make", "-j", str(os.cpu_count() or 2)]
-        ]
+        self.run_build(cflags, cxxflags, fresh, ldflags)
+        self.store_build(key, commit, cflags, cxxflags, label, ldflags)
+        return key
+
+    def train_profile(self):
+        """Run the offline benchmark on an instrumented build and merge the profile"""
+        print(Fore.CYAN + f"Training profile with a {PGO_TRAIN_TIME}s benchmark...")
+        hashrate = self.run_benchmark_cell(self.built_binary_path(), time_limit=PGO_TRAIN_TIME)
+        print(Fore.YELLOW + f"Instrumented build: {format_hashrate(hashrate)}")
         
-        for step in build_steps:
-            print(Fore.BLUE + "Running: " + " ".join(step))
+        raw = [name for name in os.listdir(PGO_PROFILE_DIR) if name.endswith(".profraw")]
+        if raw:
+            # clang writes raw profiles that must be merged; gcc .gcda files are used as is
+            profdata = shutil.which("llvm-profdata")
+            if not profdata:
+                raise FileNotFoundError("llvm-profdata is needed to merge clang profiles")
+            subprocess.run([profdata, "merge", "-output=" + os.path.join(PGO_PROFILE_DIR, "default.profdata")]
+                           + [os.path.join(PGO_PROFILE_DIR, name) for name in raw], check=True)
+
+    def variant_flags(self, label):
+        """CFLAGS, CXXFLAGS and LDFLAGS of one build profile"""
+        profile = BUILD_PROFILES[label]
+        native = "-mcpu=native" if "aarch64" in os.uname().machine else "-march=native"
+        extra = profile["cflags"].replace("{native}", native)
+        cflags = f"{BUILD_CFLAGS} {extra}".strip()
+        cxxflags = f"{BUILD_CXXFLAGS} {extra}".strip()
+        ldflags = profile["ldflags"]
+        if profile.get("pgo"):
+            pgo_dir = os.path.abspath(PGO_PROFILE_DIR)
+            cflags += f" -fprofile-use={pgo_dir}"
+            cxxflags += f" -fprofile-use={pgo_dir}"
+        return cflags, cxxflags, ldflags
+
+    def build_variant(self, label):
+        """Build (or reuse from cache) one build profile, return its cache key"""
+        cflags, cxxflags, ldflags = self.variant_flags(label)
+        training = None
+        if BUILD_PROFILES[label].get("pgo"):
+            pgo_dir = os.path.abspath(PGO_PROFILE_DIR)
+            generate = f" -fprofile-generate={pgo_dir}"
+            training = (
+                cflags.replace(f" -fprofile-use={pgo_dir}", "") + generate,
+                cxxflags.replace(f" -fprofile-use={pgo_dir}", "") + generate,
+                (ldflags + generate).strip()
+            )
+        return self.build_miner(cflags, cxxflags, label, ldflags, training)
+
+    def build_variants(self, labels=None):
+        """Build every build profile, then benchmark them and pick the fastest"""
+        labels = labels or list(BUILD_PROFILES)
+        for label in labels:
+            print(Fore.MAGENTA + f"=== Building {label} variant ===")
             try:
-                subprocess.run(step, check=True)
-            except subprocess.CalledProcessError as e:
-                print(Fore.RED + f"Build failed at step {' '.join(step)}: {str(e)}")
+                self.build_variant(label)
+            except (subprocess.CalledProcessError, OSError) as e:
+                print(Fore.RED + f"{label} build failed: {str(e)}")
+        return self.measure_build_variants()
+
+    def measure_build_variants(self):
+        """Benchmark cached variants of the newest commit and activate the fastest"""
+        builds = [meta for meta in self.list_cached_builds() if meta["label"] in BUILD_PROFILES]
+        if not builds:
+            print(Fore.RED + "No build variants cached. Build them first.")
+            return None
+        commit = max(builds, key=lambda meta: meta["built"])["commit"]
+        variants = {}
+        for meta in builds:
+            if meta["commit"] == commit and meta["label"] not in variants:
+                variants[meta["label"]] = meta
+        
+        cpu_total = os.cpu_count() or 1
+        run = self.run_benchmark_suite(
+            threads=[cpu_total], affinities=[None], asm_variants=[self.default_asm()],
+            binaries={label: os.path.join(BUILD_CACHE_DIR, meta["key"], meta["binary"])
+                      for label, meta in variants.items()}
+        )
+        if not run:
+            return None
+        
+        medians = {cell["binary"]: cell["median"] for cell in run["cells"] if cell["median"]}
+        if not medians:
+            print(Fore.RED + "No variant produced a benchmark result.")
+            return None
+        baseline = medians.get("generic") or min(medians.values())
+        results = {
+            label: {
+                "key": variants[label]["key"],
+                "median": median,
+                "gain": (median - baseline) / baseline * 100
+            }
+            for label, median in medians.items()
+        }
+        fastest = max(results, key=lambda label: results[label]["median"])
+        for label, result in sorted(results.items(), key=lambda item: -item[1]["median"]):
+            print(Fore.GREEN + f"{label}: {format_hashrate(result['median'])} ({result['gain']:+.1f}% vs baseline)")
+        
+        variant_results = self.config.get("build_variants", {})
+        variant_results[self.cpu_model()] = {
+            "commit": commit,
+            "run_id": run["run_id"],
+            "measured": datetime.now().isoformat(),
+            "fastest": fastest,
+            "results": results
+        }
+        self.set_config_value("build_variants", variant_results)
+        self.activate_build(results[fastest]["key"])
+        return results
+
+    def select_fastest_variant(self):
+        """Activate the variant known to be fastest on this device, if cached"""
+        known = self.config.get("build_variants", {}).get(self.cpu_model())
+        if not known:
+            return
+        key = known["results"][known["fastest"]]["key"]
+        if key != self.config.get("active_build") and self.cached_binary(key):
+            print(Fore.CYAN + f"Selecting fastest known build variant: {known['fastest']}")
+            self.activate_build(key)
+
+    def clone_and_build(self):
+        """Clone and build cpuminer-opt with optimizations"""
+        try:
+            key = self.build_miner()
+        except (subprocess.CalledProcessError, OSError) as e:
+            print(Fore.RED + f"Build failed: {str(e)}")
+            builds = self.list_cached_builds()
+            if not builds:
                 sys.exit(1)
+            key = builds[0]["key"]
+            print(Fore.YELLOW + "Falling back to the most recent cached build")
         
-        os.chdir("..")
+        self.activate_build(key)
         print(Fore.GREEN + "Build completed successfully!")
 
+    def built_binary_path(self):
+        """Path of the binary in the build directory, or None"""
+        for name in MINER_BINARY_NAMES:
+            path = os.path.join(MINER_DIR, name)
+            if os.path.exists(path):
+                return path
+        return None
+
     def get_miner_binary_path(self):
         """Get the path to the miner binary, checking multiple possible locations"""
-        possible_paths = [
-            os.path.join(MINER_DIR, "cpuminer"),
-            os.path.join(MINER_DIR, "minerd"),
-            os.path.join(MINER_DIR, "cpuminer-avx2"),
-            os.path.join(MINER_DIR, "cpuminer-opt")
-        ]
-        
-        for path in possible_paths:
-            if os.path.exists(path):
+        active = self.config.get("active_build")
+        if active:
+            path = self.cached_binary(active)
+            if path:
                 return path
-        return possible_paths[0]  # Return default path even if not found
+        
+        return self.built_binary_path() or os.path.join(MINER_DIR, MINER_BINARY_NAMES[0])
 
-    def load_config(self):
-        """Load or create configuration"""
+    def load_config(self, interactive=True):
+        """Load or create configuration; without prompts return whether a valid wallet is set"""
         if os.path.exists(CONFIG_FILE):
             try:
                 with open(CONFIG_FILE, "r") as f:
                     config = json.load(f)
+                self.config = config
+                self.tracer.enabled = config.get("trace", True)
                 self.wallet_address = config.get("wallet_address", "")
                 self.worker_name = config.get("worker_name", self.worker_name)
                 
@@ -172,11 +2885,14 @@ index abc123..def456 100644
                     raise ValueError("Invalid wallet address in config")
                     
                 print(Fore.YELLOW + f"Using saved wallet address: {self.wallet_address}")
-                return
+                return True
             except Exception as e:
                 print(Fore.RED + f"Error loading config: {str(e)}")
         
+        if not interactive:
+            return False
         self.setup_config()
+        return True
 
     def setup_config(self):
         """Interactive configuration setup"""
@@ -197,18 +2913,43 @@ index abc123..def456 100644
         if worker:
             self.worker_name = worker
         
-        # Save config
-        config = {
+        # Save config, keeping any other settings already stored
+        self.config.update({
             "wallet_address": self.wallet_address,
             "worker_name": self.worker_name,
             "created": datetime.now().isoformat()
-        }
-        
-        with open(CONFIG_FILE, "w") as f:
-            json.dump(config, f, indent=2)
+        })
+        self.save_config()
         
         print(Fore.GREEN + "Configuration saved!")
 
+    def save_config(self):
+        """Atomically write the current configuration"""
+        tmp_file = CONFIG_FILE + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(self.config, f, indent=2)
+        os.replace(tmp_file, CONFIG_FILE)
+
+    def set_config_value(self, key, value):
+        """Persist one setting without touching the rest of the saved config"""
+        config = {}
+        if os.path.exists(CONFIG_FILE):
+            try:
+                with open(CONFIG_FILE, "r") as f:
+                    config = json.load(f)
+            except (IOError, ValueError):
+                config = {}
+        for target in (config, self.config):
+            if value is None:
+                target.pop(key, None)
+            else:
+                target[key] = value
+        
+        tmp_file = CONFIG_FILE + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(config, f, indent=2)
+        os.replace(tmp_file, CONFIG_FILE)
+
     def validate_wallet(self, address):
         """Basic wallet address validation"""
         if not address:
@@ -217,54 +2958,232 @@ index abc123..def456 100644
             return False
         return all(c in "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz" for c in address)
 
+    def probe_endpoint(self, host, port, deadline):
+        """Take several TCP connect samples of one pool endpoint"""
+        samples = []
+        failures = 0
+        for _ in range(PROBE_SAMPLES):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            start_time = time.perf_counter()
+            try:
+                sock = socket.create_connection(
+                    (host, port), timeout=min(PROBE_TIMEOUT, remaining)
+                )
+                sock.close()
+                samples.append((time.perf_counter() - start_time) * 1000)  # ms
+            except (socket.error, OSError):
+                failures += 1
+        return {"samples": samples, "failures": failures}
+
+    def probe_pools(self, pools=None):
+        """Probe every pool/port concurrently within PROBE_DEADLINE"""
+        pools = POOLS if pools is None else pools
+        endpoints = [(pool, port) for pool in pools for port in pool["ports"]]
+        if not endpoints:
+            return []
+
+        deadline = time.monotonic() + PROBE_DEADLINE
+        executor = ThreadPoolExecutor(max_workers=min(PROBE_WORKERS, len(endpoints)))
+        futures = {
+            executor.submit(self.probe_endpoint, pool_host(pool["url"]), port, deadline): (pool, port)
+            for pool, port in endpoints
+        }
+        done, _ = wait(futures, timeout=PROBE_DEADLINE)
+        # Stragglers are bounded by the deadline, don't block on them
+        executor.shutdown(wait=False, cancel_futures=True)
+
+        results = []
+        for future, (pool, port) in futures.items():
+            if future not in done:
+                probe = {"samples": [], "failures": PROBE_SAMPLES}
+            else:
+                try:
+                    probe = future.result()
+                except Exception:
+                    probe = {"samples": [], "failures": PROBE_SAMPLES}
+            results.append(rank_endpoint(pool, port, probe["samples"], probe["failures"]))
+
+        results.sort(key=lambda r: r["score"], reverse=True)
+        return results
+
+    def network_identity(self):
+        """Identify the current network by default route, or local address"""
+        try:
+            with open("/proc/net/route", "r") as f:
+                for line in f.readlines()[1:]:
+                    fields = line.split()
+                    if len(fields) > 2 and fields[1] == "00000000":
+                        return f"{fields[0]}/{fields[2]}"
+        except (IOError, OSError):
+            pass
+
+        # Android often hides the routing table; the source address still
+        # changes between wifi and cellular. UDP connect sends no packets.
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            try:
+                sock.connect(("8.8.8.8", 53))
+                return sock.getsockname()[0].rsplit(".", 1)[0] + ".0"
+            finally:
+                sock.close()
+        except (socket.error, OSError):
+            return "offline"
+
+    def load_pool_cache(self):
+        """Load the pool latency cache, dropping expired entries"""
+        if not os.path.exists(POOL_CACHE_FILE):
+            return {}
+        try:
+            with open(POOL_CACHE_FILE, "r") as f:
+                cache = json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+        now = time.time()
+        return {
+            key: entry for key, entry in cache.items()
+            if now - entry.get("last_probe", 0) < POOL_CACHE_TTL
+        }
+
+    def save_pool_cache(self, cache):
+        """Atomically write the pool latency cache, evicting LRU entries"""
+        if len(cache) > POOL_CACHE_MAX:
+            keep = sorted(cache.items(), key=lambda item: item[1].get("last_used", 0), reverse=True)
+            cache = dict(keep[:POOL_CACHE_MAX])
+
+        tmp_file = POOL_CACHE_FILE + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(cache, f)
+        os.replace(tmp_file, POOL_CACHE_FILE)
+
+    def update_pool_cache(self, ranking, network):
+        """Merge fresh probe results into the on-disk cache"""
+        with self.pool_cache_lock:
+            cache = self.load_pool_cache()
+            now = time.time()
+            for result in ranking:
+                key = f"{pool_host(result['url'])}:{result['port']}@{network}"
+                entry = cache.get(key, {"samples": [], "failures": 0, "last_success": 0, "last_used": now})
+                if result["raw_samples"]:
+                    entry["samples"] = (entry["samples"] + result["raw_samples"])[-POOL_CACHE_SAMPLES:]
+                    entry["last_success"] = now
+                    entry["failures"] = 0
+                else:
+                    entry["failures"] += result["failures"]
+                entry.update({
+                    "name": result["name"],
+                    "url": result["url"],
+                    "port": result["port"],
+                    "fee": result["fee"],
+                    "last_probe": now
+                })
+                cache[key] = entry
+            self.save_pool_cache(cache)
+
+    def cached_pool_ranking(self, network):
+        """Rank pools from cached probes for this network, or None on a miss"""
+        with self.pool_cache_lock:
+            cache = self.load_pool_cache()
+            known = {(pool["url"], port): pool for pool in POOLS for port in pool["ports"]}
+            ranking = []
+            now = time.time()
+            for key, entry in cache.items():
+                if not key.endswith("@" + network):
+                    continue
+                pool = known.get((entry["url"], entry["port"]))
+                if pool is None:
+                    continue
+                entry["last_used"] = now
+                ranking.append(rank_endpoint(pool, entry["port"], entry["samples"], entry["failures"]))
+
+            if not any(result["score"] > 0 for result in ranking):
+                return None
+            self.save_pool_cache(cache)
+
+        ranking.sort(key=lambda r: r["score"], reverse=True)
+        return ranking
+
+    def refresh_pool_cache(self, network):
+        """Re-probe all pools and update the cache and ranking"""
+        try:
+            ranking = self.probe_pools()
+            self.update_pool_cache(ranking, network)
+        except Exception as e:
+            self.call_in_loop(self.log, f"Background pool refresh failed: {str(e)}", Fore.RED)
+            return
+        if any(result["score"] > 0 for result in ranking):
+            # The ranking is read on the event loop, hand it over instead of changing it here
+            self.call_in_loop(self.apply_pool_ranking, ranking)
+
+    def call_in_loop(self, callback, *args):
+        """Run callback on the mining session's event loop; queued until a session starts"""
+        with self.loop_lock:
+            loop = self.loop
+            if loop is None:
+                self.loop_calls.append((callback, args))
+                return
+        loop.call_soon_threadsafe(callback, *args)
+
+    def apply_pool_ranking(self, ranking):
+        """Keep only the best port of each pool, in rank order"""
+        pool_ranking = []
+        seen = set()
+        for result in ranking:
+            if result["score"] <= 0 or result["name"] in seen:
+                continue
+            seen.add(result["name"])
+            pool_ranking.append({
+                "name": result["name"],
+                "url": f"{result['url']}:{result['port']}",
+                "fee": result["fee"],
+                "latency": result["median"]
+            })
+        self.pool_ranking = pool_ranking
+
     def select_best_pool(self):
         """Test and select the best mining pool"""
-        print(Fore.CYAN + "Testing available pools...")
-        
-        best_pool = None
-        best_score = -1
-        
-        for pool in POOLS:
-            try:
-                # Test connection to each port
-                for port in pool["ports"]:
-                    test_url = f"{pool['url']}:{port}"
-                    print(Fore.YELLOW + f"Testing {pool['name']} on port {port}...")
-                    
-                    # Simple ping test
-                    start_time = time.time()
-                    try:
-                        sock = socket.create_connection(
-                            (pool['url'].replace("stratum+tcp://", "").split(":")[0], port), 
-                            timeout=5
-                        )
-                        sock.close()
-                        latency = (time.time() - start_time) * 1000  # ms
-                        
-                        # Calculate score (lower latency and fee = better)
-                        score = (1000 / latency) * (1 - (pool['fee'] / 100))
-                        pool['score'] = score
-                        
-                        print(Fore.GREEN + f"{pool['name']} latency: {latency:.2f}ms, score: {score:.2f}")
-                        
-                        if score > best_score:
-                            best_score = score
-                            best_pool = {
-                                "name": pool['name'],
-                                "url": test_url,
-                                "fee": pool['fee']
-                            }
-                        break
-                    except socket.error:
-                        continue
-            except Exception as e:
-                print(Fore.RED + f"Error testing {pool['name']}: {str(e)}")
+        network = self.network_identity()
+        ranking = self.cached_pool_ranking(network)
+
+        if ranking:
+            print(Fore.CYAN + f"Using cached pool latencies for network {network}")
+            refresh_thread = threading.Thread(target=self.refresh_pool_cache, args=(network,))
+            refresh_thread.daemon = True
+            refresh_thread.start()
+        else:
+            print(Fore.CYAN + "Testing available pools...")
+            ranking = self.probe_pools()
+            self.update_pool_cache(ranking, network)
+
+        for result in ranking:
+            if result["median"] is None:
+                print(Fore.RED + f"{result['name']}:{result['port']} unreachable")
                 continue
-        
-        if not best_pool:
-            print(Fore.RED + "Could not connect to any pools. Check your internet connection.")
+            print(Fore.GREEN + f"{result['name']}:{result['port']} median: {result['median']:.2f}ms, "
+                  f"p90: {result['p90']:.2f}ms, jitter: {result['jitter']:.2f}ms, "
+                  f"score: {result['score']:.2f}")
+
+        self.apply_pool_ranking(ranking)
+        if not self.pool_ranking:
+            # The pool probe doubles as the network check, only confirm on failure
+            if self.check_network():
+                print(Fore.RED + "Could not connect to any pools. They may be down, try again later.")
+            else:
+                print(Fore.RED + "No internet connection. Please check your network.")
             sys.exit(1)
-        
+
+        best_pool = self.pool_ranking[0]
+        pinned = [pool for pool in self.pool_ranking if pool["name"] == self.config.get("pool")]
+        if pinned:
+            best_pool = pinned[0]
+        elif self.config.get("pool"):
+            print(Fore.RED + f"Pool {self.config['pool']} is unreachable, using the fastest instead")
+        for pool in POOLS:
+            if pool["name"] == best_pool["name"]:
+                pool["score"] = ranking[0]["score"]
+
         self.current_pool = best_pool
         print(Fore.GREEN + f"Selected pool: {best_pool['name']} ({best_pool['url']}) with fee {best_pool['fee']}%")
 
@@ -273,17 +3192,11 @@ index abc123..def456 100644
         print(Fore.MAGENTA + "=== Starting Benchmark Mode ===")
         self.benchmark_mode = True
         
-        miner_binary = self.get_miner_binary_path()
-        if not os.path.exists(miner_binary):
-            print(Fore.RED + "Miner binary not found. Trying to build first...")
-            self.clone_and_build()
-            miner_binary = self.get_miner_binary_path()
-            if not os.path.exists(miner_binary):
-                print(Fore.RED + "Miner binary still not found after build.")
-                return
+        miner_binary = self.ensure_miner_binary()
+        if not miner_binary:
+            return
         
-        command = [
-            miner_binary,
+        command = miner_command(miner_binary) + [
             "--benchmark",
             "--algo=sha256d",
             "--time-limit=30"  # 30 second benchmark
@@ -299,45 +3212,1127 @@ index abc123..def456 100644
                 universal_newlines=True
             )
             
-            benchmark_results = []
-            while True:
-                output = process.stdout.readline()
-                if output == '' and process.poll() is not None:
-                    break
-                if output:
-                    print(output.strip())
-                    benchmark_results.append(output.strip())
+            benchmark_results = []
+            while True:
+                output = process.stdout.readline()
+                if output == '' and process.poll() is not None:
+                    break
+                if output:
+                    print(output.strip())
+                    benchmark_results.append(output.strip())
+            
+            # Save benchmark results
+            with open(BENCHMARK_FILE, "w") as f:
+                f.write("\n".join(benchmark_results))
+            
+            print(Fore.GREEN + f"Benchmark results saved to {BENCHMARK_FILE}")
+            
+        except Exception as e:
+            print(Fore.RED + f"Benchmark failed: {str(e)}")
+        
+        self.benchmark_mode = False
+
+    def ensure_miner_binary(self):
+        """Return the miner binary path, building it first if missing"""
+        if self.config.get("engine") == ENGINE_BINARY:
+            return ENGINE_BINARY
+        miner_binary = self.get_miner_binary_path()
+        if not os.path.exists(miner_binary):
+            print(Fore.RED + "Miner binary not found. Trying to build first...")
+            self.timed("build", self.clone_and_build)
+            miner_binary = self.get_miner_binary_path()
+            if not os.path.exists(miner_binary):
+                print(Fore.RED + "Miner binary still not found after build.")
+                print(Fore.YELLOW + "Using the built-in sha256d engine instead (much slower than cpuminer).")
+                return ENGINE_BINARY
+        return miner_binary
+
+    def default_asm(self):
+        """Platform-specific --asm value"""
+        return "armv8" if "aarch64" in os.uname().machine else "yes"
+
+    def asm_variants(self):
+        """--asm values to sweep on this CPU: its assembly path and plain C"""
+        return [self.default_asm(), "no"]
+
+    def run_benchmark_cell(self, miner_binary, threads=None, cpus=None, asm=None,
+                           time_limit=BENCHMARK_TIME_LIMIT, extra_args=None):
+        """Run one offline --benchmark invocation and return its hashrate in H/s"""
+        command = miner_command(miner_binary) + [
+            "--benchmark",
+            "--algo=sha256d",
+            f"--time-limit={time_limit}"
+        ]
+        if threads:
+            command.append(f"--threads={threads}")
+        if cpus:
+            command.append(f"--cpu-affinity={cpu_mask(cpus)}")
+        if asm:
+            command.append(f"--asm={asm}")
+        if extra_args:
+            command.extend(extra_args)
+        
+        try:
+            result = subprocess.run(
+                command,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                universal_newlines=True,
+                timeout=time_limit + 60
+            )
+        except (subprocess.TimeoutExpired, OSError) as e:
+            print(Fore.RED + f"Benchmark run failed: {str(e)}")
+            return None
+        return benchmark_hashrate(result.stdout.splitlines())
+
+    def run_benchmark_suite(self, threads=None, affinities=None, asm_variants=None,
+                            binaries=None, repeats=BENCHMARK_REPEATS,
+                            time_limit=BENCHMARK_TIME_LIMIT):
+        """Sweep a benchmark matrix, repeat each cell and append the run to history"""
+        if binaries is None:
+            miner_binary = self.ensure_miner_binary()
+            if not miner_binary:
+                return None
+            binaries = {"default": miner_binary}
+        
+        cpu_total = os.cpu_count() or 1
+        if threads is None:
+            threads = sorted({1, max(1, cpu_total // 2), cpu_total})
+        if affinities is None:
+            affinities = [None]
+            topology = self.read_cpu_topology()
+            if len(topology) > 1:
+                affinities += [cluster["cpus"] for cluster in topology]
+        if asm_variants is None:
+            asm_variants = self.asm_variants()
+        
+        matrix = [
+            (label, path, thread_count, cpus, asm)
+            for label, path in binaries.items()
+            for thread_count in threads
+            for cpus in affinities
+            for asm in asm_variants
+            if not cpus or thread_count <= len(cpus)
+        ]
+        print(Fore.MAGENTA + f"=== Benchmark suite: {len(matrix)} cells x {repeats} runs ===")
+        print(Fore.CYAN + f"Estimated time: {len(matrix) * repeats * time_limit / 60:.1f} minutes")
+        
+        self.benchmark_mode = True
+        cells = []
+        try:
+            for label, path, thread_count, cpus, asm in matrix:
+                samples = []
+                for _ in range(repeats):
+                    hashrate = self.run_benchmark_cell(path, thread_count, cpus, asm, time_limit)
+                    if hashrate:
+                        samples.append(hashrate)
+                cell = {
+                    "binary": label,
+                    "binary_sha256": file_sha256(path),
+                    "threads": thread_count,
+                    "affinity": cpu_mask(cpus) if cpus else None,
+                    "asm": asm
+                }
+                cell.update(summarize_samples(samples))
+                cells.append(cell)
+                if samples:
+                    print(Fore.GREEN + f"{label} threads={thread_count} affinity={cell['affinity']} asm={asm}: "
+                          f"median {format_hashrate(cell['median'])} (stdev {format_hashrate(cell['stdev'])})")
+                else:
+                    print(Fore.RED + f"{label} threads={thread_count} affinity={cell['affinity']} asm={asm}: no result")
+        finally:
+            self.benchmark_mode = False
+        
+        run_id = datetime.now().strftime("%Y%m%d-%H%M%S")
+        known = {old_run["run_id"] for old_run in self.load_benchmark_history()}
+        suffix = 1
+        while run_id in known:
+            suffix += 1
+            run_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{suffix}"
+        run = {
+            "run_id": run_id,
+            "created": datetime.now().isoformat(),
+            "host": socket.gethostname(),
+            "machine": os.uname().machine,
+            "repeats": repeats,
+            "time_limit": time_limit,
+            "cells": cells
+        }
+        self.save_benchmark_run(run)
+        print(Fore.GREEN + f"Benchmark run {run['run_id']} saved to {BENCHMARK_HISTORY_FILE}")
+        return run
+
+    def save_benchmark_run(self, run):
+        """Append a run to the JSON lines history and the CSV export"""
+        with open(BENCHMARK_HISTORY_FILE, "a") as f:
+            f.write(json.dumps(run) + "\n")
+        
+        new_csv = not os.path.exists(BENCHMARK_CSV_FILE)
+        with open(BENCHMARK_CSV_FILE, "a", newline="") as f:
+            writer = csv.writer(f)
+            if new_csv:
+                writer.writerow(["run_id", "binary", "binary_sha256", "threads", "affinity", "asm",
+                                 "runs", "median", "stdev", "min", "max"])
+            for cell in run["cells"]:
+                writer.writerow([run["run_id"], cell["binary"], cell["binary_sha256"], cell["threads"],
+                                 cell["affinity"], cell["asm"], cell["runs"], cell["median"],
+                                 cell["stdev"], cell["min"], cell["max"]])
+
+    def load_benchmark_history(self):
+        """Load all benchmark runs, oldest first"""
+        runs = []
+        if not os.path.exists(BENCHMARK_HISTORY_FILE):
+            return runs
+        with open(BENCHMARK_HISTORY_FILE, "r") as f:
+            for line in f:
+                try:
+                    runs.append(json.loads(line))
+                except ValueError:
+                    continue
+        return runs
+
+    def compare_benchmarks(self, run_a=None, run_b=None, threshold=BENCHMARK_NOISE_PCT):
+        """Compare two runs (default: last two) and flag regressions beyond noise"""
+        runs = {run["run_id"]: run for run in self.load_benchmark_history()}
+        ordered = list(runs.values())
+        if run_a is None and run_b is None:
+            if len(ordered) < 2:
+                print(Fore.RED + "Need at least two benchmark runs to compare.")
+                return None
+            base, new = ordered[-2], ordered[-1]
+        else:
+            base, new = runs.get(run_a), runs.get(run_b)
+            if not base or not new:
+                print(Fore.RED + f"Unknown benchmark run: {run_a if not base else run_b}")
+                return None
+        
+        # Comparing two single-build runs matches cells regardless of build label
+        single_build = (len({c["binary"] for c in base["cells"]}) == 1
+                        and len({c["binary"] for c in new["cells"]}) == 1)
+        
+        def cell_key(cell):
+            key = (cell["threads"], cell["affinity"], cell["asm"])
+            return key if single_build else (cell["binary"],) + key
+        
+        base_cells = {cell_key(cell): cell for cell in base["cells"]}
+        print(Fore.MAGENTA + f"=== {base['run_id']} -> {new['run_id']} (noise threshold {threshold}%) ===")
+        
+        comparison = []
+        for cell in new["cells"]:
+            old = base_cells.get(cell_key(cell))
+            if not old or not old["median"] or not cell["median"]:
+                continue
+            change = (cell["median"] - old["median"]) / old["median"] * 100
+            # Noisy cells need a bigger change before they count
+            noise = max(threshold, relative_stdev(old) + relative_stdev(cell))
+            status = "regression" if change < -noise else "improvement" if change > noise else "same"
+            comparison.append({"cell": cell_key(cell), "change": change, "noise": noise, "status": status})
+            
+            color = Fore.RED if status == "regression" else Fore.GREEN if status == "improvement" else Fore.CYAN
+            print(color + f"{cell['binary']} threads={cell['threads']} affinity={cell['affinity']} "
+                  f"asm={cell['asm']}: {format_hashrate(old['median'])} -> "
+                  f"{format_hashrate(cell['median'])} ({change:+.1f}%) {status}")
+        
+        regressions = [c for c in comparison if c["status"] == "regression"]
+        if regressions:
+            print(Fore.RED + f"{len(regressions)} regression(s) beyond noise")
+        else:
+            print(Fore.GREEN + "No regressions beyond noise")
+        return comparison
+
+    def cpu_model(self):
+        """Identify the CPU for per-device tuning profiles"""
+        model = None
+        parts = set()
+        try:
+            with open("/proc/cpuinfo", "r") as f:
+                for line in f:
+                    key, _, value = line.partition(":")
+                    key, value = key.strip(), value.strip()
+                    if key in ("Hardware", "model name") and not model:
+                        model = value
+                    elif key == "CPU part":
+                        parts.add(value)
+        except (IOError, OSError):
+            pass
+        if not model:
+            model = os.uname().machine
+        if parts:
+            model += " [" + ",".join(sorted(parts)) + "]"
+        return f"{model} x{os.cpu_count() or 1}"
+
+    def profile_key(self, miner_binary):
+        """Tuning profile key: CPU model plus binary hash"""
+        binary_id = ENGINE_BINARY if miner_binary == ENGINE_BINARY else file_sha256(miner_binary)
+        return f"{self.cpu_model()}|{binary_id}"
+
+    def tuning_candidates(self):
+        """Thread count / affinity / priority combinations worth trying"""
+        cpu_total = os.cpu_count() or 1
+        topology = self.read_cpu_topology()
+        placements = [(cpu_total, None), (max(1, cpu_total - 1), None), (max(1, cpu_total // 2), None)]
+        if len(topology) > 1:
+            # Big cores only, and everything but the littlest cluster
+            placements.append((len(topology[0]["cpus"]), topology[0]["cpus"]))
+            without_little = sorted(cpu for cluster in topology[:-1] for cpu in cluster["cpus"])
+            placements.append((len(without_little), without_little))
+        
+        candidates = []
+        for threads, cpus in placements:
+            for priority in TUNE_PRIORITIES:
+                candidate = {"threads": threads, "cpus": cpus, "priority": priority}
+                if candidate not in candidates:
+                    candidates.append(candidate)
+        return candidates
+
+    def auto_tune(self, miner_binary=None):
+        """Find the best launch profile by successive halving and save it"""
+        miner_binary = miner_binary or self.ensure_miner_binary()
+        if not miner_binary:
+            return None
+        
+        candidates = self.tuning_candidates()
+        time_limit = TUNE_MIN_TIME
+        print(Fore.MAGENTA + f"=== Auto-tuning {len(candidates)} launch profiles ===")
+        
+        self.benchmark_mode = True
+        try:
+            while True:
+                print(Fore.CYAN + f"Round: {len(candidates)} candidates, {time_limit}s each")
+                for candidate in candidates:
+                    hashrate = self.run_benchmark_cell(
+                        miner_binary, candidate["threads"], candidate["cpus"], self.default_asm(),
+                        time_limit, [f"--cpu-priority={candidate['priority']}"]
+                    )
+                    candidate["hashrate"] = hashrate or 0
+                    print(Fore.YELLOW + f"threads={candidate['threads']} cpus={candidate['cpus']} "
+                          f"priority={candidate['priority']}: {format_hashrate(candidate['hashrate'])}")
+                
+                candidates.sort(key=lambda c: c["hashrate"], reverse=True)
+                # Keep the better half and measure it longer
+                candidates = candidates[:max(1, len(candidates) // 2)]
+                if len(candidates) == 1:
+                    break
+                time_limit = min(time_limit * 2, BENCHMARK_TIME_LIMIT * 2)
+        finally:
+            self.benchmark_mode = False
+        
+        best = candidates[0]
+        if not best["hashrate"]:
+            print(Fore.RED + "Auto-tune failed: no benchmark produced a hashrate.")
+            return None
+        
+        profile = {
+            "threads": best["threads"],
+            "cpus": best["cpus"],
+            "priority": best["priority"],
+            "hashrate": best["hashrate"],
+            "tuned": datetime.now().isoformat()
+        }
+        self.config.setdefault("tuning_profiles", {})[self.profile_key(miner_binary)] = profile
+        self.save_config()
+        print(Fore.GREEN + f"Best profile: threads={profile['threads']} cpus={profile['cpus']} "
+              f"priority={profile['priority']} at {format_hashrate(profile['hashrate'])}")
+        return profile
+
+    def tuning_profile(self, miner_binary, tune=True):
+        """Saved profile for this device and binary, re-tuning if either changed and tune is set"""
+        profiles = self.config.get("tuning_profiles", {})
+        profile = profiles.get(self.profile_key(miner_binary))
+        if profile:
+            return profile
+        if tune and profiles and self.config.get("auto_tune", True):
+            print(Fore.YELLOW + "Miner binary or hardware changed since last tuning. Re-tuning...")
+            return self.auto_tune(miner_binary)
+        return None
+
+    def benchmark_menu(self):
+        """Choose between the quick benchmark, the full suite and comparisons"""
+        print(Fore.CYAN + """
+            [1] Quick benchmark (30 seconds)
+            [2] Full benchmark suite
+            [3] Compare last two suite runs
+            [4] Auto-tune launch profile
+            [5] Controller overhead (replayed miner output)
+            """)
+        choice = input(Fore.CYAN + "Select an option: ").strip()
+        if choice == "1":
+            self.run_benchmark()
+        elif choice == "2":
+            self.run_benchmark_suite()
+        elif choice == "3":
+            self.compare_benchmarks()
+        elif choice == "4":
+            self.auto_tune()
+        elif choice == "5":
+            self.run_controller_benchmark()
+        else:
+            print(Fore.RED + "Invalid choice.")
+
+    def start_mining(self):
+        """Start the mining process"""
+        self.timed("variant", self.select_fastest_variant)
+        miner_binary = self.timed("binary", self.ensure_miner_binary)
+        if not miner_binary:
+            return
+        
+        if not self.current_pool:
+            self.timed("pool", self.select_best_pool)
+        
+        # Re-tuning blocks for minutes, so it happens before the event loop starts:
+        # auto_tune runs miner trials synchronously and would stall the proxy,
+        # metrics and dashboard if session_layout called it from inside the loop
+        profile = self.tuning_profile(miner_binary) or {}
+        
+        print(Fore.GREEN + "Starting miner with optimized settings...")
+        self.running = True
+        profile_file = self.config.get("profile")
+        profiler = None
+        if profile_file:
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+        try:
+            asyncio.run(self.mining_session(miner_binary, profile))
+        finally:
+            if profiler:
+                profiler.disable()
+                self.save_profile(profiler, profile_file)
+
+    def save_profile(self, profiler, profile_file):
+        """Write the controller's cProfile data and list the costliest functions"""
+        import pstats
+        profiler.dump_stats(profile_file)
+        print(Fore.MAGENTA + Style.BRIGHT + f"=== Controller profile (top {PROFILE_TOP} by cumulative time) ===")
+        pstats.Stats(profiler, stream=sys.stdout).sort_stats("cumulative").print_stats(PROFILE_TOP)
+        print(Fore.GREEN + f"Full profile saved to {profile_file} (python3 -m pstats {profile_file})")
+
+    def session_layout(self, miner_binary):
+        """Instance layout and CPU priority for a binary"""
+        profile = self.session_profiles.get(miner_binary)
+        if profile is None:
+            # Binary switched mid-session: saved profiles only, never tune inside the event loop
+            profile = self.session_profiles[miner_binary] = self.tuning_profile(miner_binary, tune=False) or {}
+        priority = profile.get("priority", DEFAULT_CPU_PRIORITY)
+        if self.config.get("supervisor"):
+            layout = self.instance_layout()
+        else:
+            layout = [{"cpus": profile.get("cpus"), "threads": profile.get("threads")}]
+        if self.governor and self.governor.threads < self.governor.max_threads:
+            layout = throttle_layout(layout, self.governor.threads, self.read_cpu_topology())
+        return layout, priority
+
+    async def mining_session(self, miner_binary, profile=None):
+        """Supervise the miner processes and run all controller work on one event loop
+
+        profile is the launch profile already resolved for miner_binary, kept
+        for the whole session so restarts never look it up again.
+        """
+        self.session_profiles = {miner_binary: profile} if profile is not None else {}
+        # The built-in engine has no API, its output is the telemetry
+        use_api = self.config.get("telemetry") == "api" and miner_binary != ENGINE_BINARY
+        background = []
+        self.instances = []
+        with self.loop_lock:
+            self.loop = asyncio.get_running_loop()
+            calls, self.loop_calls = self.loop_calls, []
+        for callback, args in calls:
+            callback(*args)
+        # Uptime, shares and histograms are cumulative over restarts
+        self.mining_started = time.time()
+        self.pool_switched_at = self.mining_started
+        self.first_share_seen = False
+        self.estimator.start(self.mining_started)
+        self.tracer.process_name = f"{self.worker_name} ({self.cpu_model()})"
+        session_start = time.perf_counter()
+        failures = 0
+        try:
+            if self.config.get("metrics_port"):
+                await self.start_metrics_server()
+            if self.config.get("capture"):
+                self.recorder = SessionRecorder(self.config["capture"])
+                print(Fore.CYAN + f"Recording miner output and pool traffic to {self.config['capture']}")
+            print(Fore.CYAN + "Press CTRL+C to stop mining")
+            
+            self.dashboard = Dashboard(interval=self.config.get("dashboard_interval", DASHBOARD_INTERVAL))
+            self.dashboard.start()
+            background.append(asyncio.ensure_future(self.monitor_stats()))
+            background.append(asyncio.ensure_future(self.dashboard_loop()))
+            background.append(asyncio.ensure_future(self.pool_health_loop()))
+            self.governor = self.start_governor(self.session_layout(miner_binary)[0])
+            background.append(asyncio.ensure_future(self.governor_loop()))
+            if self.status_file:
+                background.append(asyncio.ensure_future(self.status_loop()))
+            if self.config.get("fleet_collector"):
+                background.append(asyncio.ensure_future(self.fleet_loop(miner_binary)))
+            self.handle_signals()
+            if use_api:
+                background.append(asyncio.ensure_future(self.poll_api_stats()))
+            
+            while self.running:
+                started = time.time()
+                self.session_binary = miner_binary
+                layout, priority = self.session_layout(miner_binary)
+                await self.run_instances(miner_binary, layout, priority, use_api)
+                if not self.running or self.benchmark_mode:
+                    break
+                if self.restart_pending:
+                    self.restart_began = (time.perf_counter(), {"kind": "intentional", "reason": self.restart_pending})
+                    if self.restart_pending == "share verification":
+                        miner_binary = self.distrust_build(miner_binary)
+                        use_api = use_api and miner_binary != ENGINE_BINARY
+                    self.restart_pending = None
+                    continue
+                
+                crashed = next((instance for instance in self.instances if instance.get("crashed")), None)
+                if crashed is None:
+                    self.log("Miner exited normally.", Fore.YELLOW, important=True)
+                    break
+                
+                # A long healthy run means the next crash starts a fresh backoff
+                if time.time() - started >= RESTART_STABLE_TIME:
+                    failures = 0
+                failures += 1
+                self.restarts += 1
+                
+                code = crashed["process"].returncode
+                kind = classify_crash(code, crashed["tail"])
+                self.last_crash = {"time": time.time(), "kind": kind, "returncode": code}
+                self.restart_began = (time.perf_counter(), {"kind": kind, "returncode": code, "restart": self.restarts})
+                self.log(f"Miner exited with code {code} ({kind})", Fore.RED, important=True)
+                
+                if kind == "config":
+                    self.log("Check the miner command and config, not restarting.", Fore.RED, important=True)
+                    break
+                if kind == "binary":
+                    miner_binary = self.fallback_binary(miner_binary)
+                    if not miner_binary:
+                        break
+                if kind == "network" and self.record_pool_failure():
+                    failures = 0
+                
+                delay = restart_delay(kind, failures)
+                self.log(f"Restarting in {delay:.1f}s (restart #{self.restarts})", Fore.YELLOW, important=True)
+                await asyncio.sleep(delay)
+        finally:
+            for task in background:
+                task.cancel()
+            await asyncio.gather(*background, return_exceptions=True)
+            await self.stop_instances()
+            if self.dashboard:
+                self.dashboard.stop()
+                self.dashboard = None
+            self.controller_cpu_sample = None
+            self.estimated_earnings = 0
+            await self.stop_proxy()
+            await self.stop_metrics_server()
+            if self.recorder:
+                self.recorder.close()
+                self.recorder = None
+            self.tracer.complete("session", session_start, restarts=self.restarts)
+            self.tracer.flush()
+            with self.loop_lock:
+                self.loop = None
+
+    async def run_instances(self, miner_binary, layout, priority, use_api):
+        """Run one generation of miner processes until they exit"""
+        pool_url = self.current_pool["url"]
+        if self.config.get("use_proxy"):
+            # The proxy survives restarts, so the pool session is kept hot
+            pool_url = await self.start_proxy()
+            watchdog = asyncio.ensure_future(self.watch_proxy_upstream())
+        else:
+            watchdog = None
+        
+        self.instances = []
+        self.generation_started = time.perf_counter()
+        self.generation_hash = self.generation_share = False
+        if self.restart_began:
+            # Recovery time: failure noticed until the replacement is being spawned
+            began, args = self.restart_began
+            self.tracer.complete("restart", began, self.generation_started, **args)
+            self.restart_began = None
+            self.tracer.flush()
+        try:
+            for slot in layout:
+                command = self.build_miner_command(miner_binary, pool_url, slot["threads"], slot["cpus"], priority)
+                api_port = None
+                if use_api:
+                    api_port = self.config.get("api_port", API_PORT) + len(self.instances)
+                    command.append(f"--api-bind={PROXY_HOST}:{api_port}")
+                self.log("Command: " + " ".join(command), Fore.YELLOW, important=True)
+                # With API telemetry the verbose output is not needed at all
+                if self.launch_time is None:
+                    self.launch_time = time.perf_counter()
+                spawn_start = time.perf_counter()
+                process = await asyncio.create_subprocess_exec(
+                    *command,
+                    stdout=subprocess.DEVNULL if use_api else subprocess.PIPE,
+                    stderr=subprocess.DEVNULL if use_api else subprocess.STDOUT
+                )
+                self.tracer.complete("spawn", spawn_start, instance=len(self.instances), cpus=slot["cpus"],
+                                     binary=os.path.basename(miner_binary))
+                self.instances.append({
+                    "process": process,
+                    "cpus": slot["cpus"],
+                    "hashrate": 0,
+                    "threads": {},
+                    "api": MinerApiClient(port=api_port) if use_api else None,
+                    "api_shares": {"accepted": 0, "rejected": 0},
+                    "tail": deque(maxlen=CRASH_TAIL_LINES),
+                    "index": len(self.instances)
+                })
+            self.miner_process = self.instances[0]["process"]
+            await asyncio.gather(*(self.read_instance_output(instance) for instance in self.instances))
+        finally:
+            if watchdog:
+                watchdog.cancel()
+            await self.stop_instances()
+
+    def fallback_binary(self, miner_binary):
+        """Drop a build that does not run on this CPU, return the binary to use instead"""
+        active = self.config.get("active_build")
+        if not active:
+            self.log("Miner binary does not run on this CPU, rebuild it from the build menu.",
+                     Fore.RED, important=True)
+            return None
+        self.log(f"Build {active} does not run on this CPU, falling back.", Fore.RED, important=True)
+        self.set_config_value("active_build", None)
+        fallback = self.get_miner_binary_path()
+        if fallback == miner_binary or not os.path.exists(fallback):
+            return None
+        return fallback
+
+    def distrust_build(self, miner_binary):
+        """Drop a build whose shares fail verification, return the binary to use instead"""
+        self.share_checks.clear()
+        active = self.config.get("active_build")
+        if active:
+            self.set_config_value("active_build", None)
+            fallback = self.get_miner_binary_path()
+            if fallback != miner_binary and os.path.exists(fallback):
+                self.log(f"Build {active} computes wrong hashes, falling back to {fallback}.",
+                         Fore.RED, important=True)
+                return fallback
+        self.log("The miner binary computes wrong hashes, switching to the built-in engine. "
+                 "Rebuild without aggressive flags or the asm patch.", Fore.RED, important=True)
+        return ENGINE_BINARY
+
+    def on_share_check(self, valid):
+        """Proxy verification of one local share; restart on a different binary if too many fail"""
+        self.share_checks.append(valid)
+        invalid = self.share_checks.count(False)
+        if (invalid >= SPOT_CHECK_MAX_INVALID and self.session_binary != ENGINE_BINARY
+                and not self.restart_pending):
+            self.log(f"{invalid} of the last {len(self.share_checks)} shares do not meet their target.",
+                     Fore.RED, important=True)
+            self.request_restart("share verification")
+
+    def record_pool_failure(self, count=1):
+        """Count pool failures; open its circuit and fail over when it trips, return True then"""
+        name = self.current_pool["name"]
+        circuit = self.pool_circuits.setdefault(name, {"failures": 0, "open_until": 0})
+        circuit["failures"] += count
+        if circuit["failures"] < CIRCUIT_BREAKER_FAILURES:
+            return False
+        circuit["failures"] = 0
+        circuit["open_until"] = time.time() + CIRCUIT_BREAKER_COOLDOWN
+        return self.failover_pool()
+
+    def failover_pool(self):
+        """Switch to the next ranked pool, return True if its circuit was closed"""
+        now = time.time()
+        candidates = [pool for pool in self.pool_ranking if pool["name"] != self.current_pool["name"]]
+        closed = [pool for pool in candidates if self.pool_circuits.get(pool["name"], {}).get("open_until", 0) <= now]
+        # With every pool tripped, retry the one whose cooldown ends first but keep backing off
+        ordered = closed or sorted(candidates, key=lambda pool: self.pool_circuits[pool["name"]]["open_until"])
+        if not ordered:
+            return False
+        previous = self.current_pool
+        self.current_pool = ordered[0]
+        self.pool_switched_at = now
+        self.reconnects += 1
+        self.log(f"Pool {previous['name']} keeps failing, switching to {self.current_pool['name']} "
+                 f"({self.current_pool['url']})", Fore.MAGENTA, important=True)
+        return bool(closed)
+
+    def pool_health_of(self, pool):
+        return self.pool_health.setdefault(pool["name"], PoolHealth())
+
+    def on_proxy_ack(self, latency, accepted, stale):
+        """Share result reported by the stratum proxy"""
+        # Proxy timing is exact, prefer it over latencies in miner output
+        self.share_latency.observe(latency / 1000)
+        self.pool_health_of(self.current_pool).record_share(accepted, stale, latency)
+
+    def pool_yields(self, now=None):
+        """Effective share yield of every ranked pool"""
+        return {pool["name"]: self.pool_health_of(pool).effective_yield(pool["fee"], now)
+                for pool in self.pool_ranking}
+
+    async def pool_health_loop(self):
+        """Keep scoring the active and alternative pools, switch when another clearly wins"""
+        username = f"{self.wallet_address}.{self.worker_name}"
+        last_alt_probe = 0
+        while self.running:
+            await asyncio.sleep(POOL_HEALTH_INTERVAL)
+            now = time.time()
+            pools = [self.current_pool]
+            if now - last_alt_probe >= POOL_ALT_PROBE_INTERVAL:
+                last_alt_probe = now
+                pools = self.pool_ranking or pools
+            latencies = await asyncio.gather(*(probe_stratum(pool["url"], username) for pool in pools))
+            for pool, latency in zip(pools, latencies):
+                self.pool_health_of(pool).record_handshake(latency)
+            
+            candidate = self.evaluate_pools(time.time())
+            if candidate:
+                await self.switch_pool(candidate)
+
+    def evaluate_pools(self, now):
+        """Return the pool to switch to once it has beaten the active one long enough"""
+        if (not self.config.get("pool_switching", True) or self.config.get("pool")
+                or now - self.pool_switched_at < POOL_MIN_DWELL):
+            self.switch_votes = None
+            return None
+        yields = self.pool_yields(now)
+        margin = self.config.get("pool_switch_margin", POOL_SWITCH_MARGIN)
+        active = self.pool_health_of(self.current_pool).effective_yield(self.current_pool["fee"], now)
+        open_circuits = {name for name, circuit in self.pool_circuits.items() if circuit["open_until"] > now}
+        best = max((pool for pool in self.pool_ranking
+                    if pool["name"] != self.current_pool["name"] and pool["name"] not in open_circuits),
+                   key=lambda pool: yields[pool["name"]], default=None)
+        if best is None or yields[best["name"]] <= active * (1 + margin):
+            self.switch_votes = None
+            return None
+        
+        # Hysteresis: the same pool has to stay ahead for several evaluations
+        if self.switch_votes and self.switch_votes[0] == best["name"]:
+            self.switch_votes = (best["name"], self.switch_votes[1] + 1)
+        else:
+            self.switch_votes = (best["name"], 1)
+        if self.switch_votes[1] < POOL_SWITCH_CONFIRMATIONS:
+            return None
+        self.log(f"Pool {best['name']} yields {yields[best['name']]:.4f} vs {active:.4f} on "
+                 f"{self.current_pool['name']}", Fore.MAGENTA, important=True)
+        return best
+
+    async def switch_pool(self, pool):
+        """Move mining to another pool"""
+        self.log(f"Switching pool: {self.current_pool['name']} -> {pool['name']} ({pool['url']})",
+                 Fore.MAGENTA, important=True)
+        self.current_pool = pool
+        self.pool_switched_at = time.time()
+        self.switch_votes = None
+        if self.proxy:
+            # Miners stay connected to the proxy, only its upstream changes
+            await self.start_proxy()
+            return
+        # Without the proxy the miners are restarted on the new pool
+        self.request_restart("pool switch")
+
+    def layout_threads(self, layout):
+        """Total threads a layout runs"""
+        return sum(slot["threads"] or len(slot["cpus"] or []) or os.cpu_count() or 1 for slot in layout)
+
+    def start_governor(self, layout):
+        """Create the thermal governor for a layout, starting at the known sustainable point"""
+        if not self.config.get("governor", True):
+            return None
+        target = self.config.get("target_temp", GOVERNOR_TARGET_TEMP)
+        max_threads = self.layout_threads(layout)
+        start_threads = self.sustainable_threads(target)
+        if start_threads:
+            self.log(f"Thermal governor: starting at {start_threads} threads, "
+                     f"sustainable at {target}°C on earlier runs", Fore.CYAN, important=True)
+        self.idle_temperature = read_cpu_temperature()
+        return ThermalGovernor(max_threads, target, start_threads=start_threads)
+
+    def sustainable_threads(self, target):
+        """Thread count with the best hashrate that stayed at or below target on this device"""
+        device = self.cpu_model()
+        best = None
+        try:
+            with open(THERMAL_LOG_FILE, "r") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if record.get("device") != device or record.get("temperature", target + 1) > target:
+                        continue
+                    if best is None or record["hashrate"] > best["hashrate"]:
+                        best = record
+        except (IOError, OSError):
+            return None
+        return best["threads"] if best else None
+
+    def log_thermal_point(self, threads, samples, duration):
+        """Append the hashrate and temperature held at one thread count"""
+        # Short holds never reach a steady temperature
+        if not samples or duration < GOVERNOR_HOLD:
+            return
+        hashrate = statistics.mean(sample[0] for sample in samples)
+        temperature = statistics.mean(sample[1] for sample in samples)
+        idle = self.idle_temperature
+        record = {
+            "timestamp": datetime.now().isoformat(),
+            "device": self.cpu_model(),
+            "threads": threads,
+            "duration": round(duration),
+            "hashrate": hashrate,
+            "temperature": round(temperature, 1),
+            "idle_temperature": idle,
+            # Hashrate bought per degree above idle: the efficiency of this level
+            "hashrate_per_degree": hashrate / max(temperature - idle, 1) if idle is not None else None
+        }
+        with open(THERMAL_LOG_FILE, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def battery_pause_reason(self, battery):
+        """Why mining should pause for the battery, or None"""
+        if battery is None:
+            return None
+        min_battery = self.config.get("min_battery", GOVERNOR_MIN_BATTERY)
+        capacity = battery["capacity"]
+        plugged = battery["charging"] or battery["status"] == "not charging"
+        if self.config.get("pause_on_battery", True) and not plugged:
+            return "on battery"
+        if capacity is not None:
+            # Resume a few percent above the threshold so it does not flap
+            if capacity < min_battery or (self.paused and capacity < min_battery + GOVERNOR_BATTERY_HYSTERESIS):
+                return f"battery at {capacity:.0f}%"
+        return None
+
+    def pause_instances(self, paused):
+        """Freeze or resume every miner instance without restarting it"""
+        for instance in self.instances:
+            if instance["process"].returncode is None and instance.get("paused", False) != paused:
+                try:
+                    instance["process"].send_signal(signal.SIGSTOP if paused else signal.SIGCONT)
+                    instance["paused"] = paused
+                except ProcessLookupError:
+                    pass
+        if paused:
+            self.hashrate = 0
+        self.paused = paused
+
+    def request_restart(self, reason):
+        """Restart the miners on purpose; the supervisor does not count it as a crash"""
+        self.restart_pending = reason
+        for instance in self.instances:
+            if instance["process"].returncode is None:
+                try:
+                    instance["process"].terminate()
+                    if instance.get("paused"):
+                        instance["process"].send_signal(signal.SIGCONT)
+                except ProcessLookupError:
+                    pass
+
+    async def governor_loop(self):
+        """Hold the target temperature by adjusting threads, pause on battery"""
+        governor = self.governor
+        samples = []
+        level_started = last_change = time.time()
+        while self.running:
+            await asyncio.sleep(GOVERNOR_INTERVAL)
+            now = time.time()
+            self.battery = read_battery()
+            reason = self.battery_pause_reason(self.battery)
+            if reason:
+                if not self.paused:
+                    self.log(f"Mining paused: {reason}", Fore.YELLOW, important=True)
+                # Also catches instances started while paused
+                self.pause_instances(True)
+                continue
+            if self.paused:
+                self.log("Mining resumed", Fore.GREEN, important=True)
+                self.pause_instances(False)
+                level_started = now
             
-            # Save benchmark results
-            with open(BENCHMARK_FILE, "w") as f:
-                f.write("\n".join(benchmark_results))
+            temperature = read_cpu_temperature()
+            if temperature is not None:
+                self.temperature = temperature
+            if governor is None or self.temperature is None:
+                continue
+            threads = governor.update(self.temperature, now)
             
-            print(Fore.GREEN + f"Benchmark results saved to {BENCHMARK_FILE}")
+            # Skip the warm-up after a change so logged points are steady state
+            if now - last_change >= GOVERNOR_SETTLE and self.hashrate > 0:
+                samples.append((self.hashrate, self.temperature))
+            if now - level_started >= GOVERNOR_LOG_INTERVAL:
+                self.log_thermal_point(governor.threads, samples, now - level_started)
+                samples = []
+                level_started = now
             
-        except Exception as e:
-            print(Fore.RED + f"Benchmark failed: {str(e)}")
+            if threads == governor.threads:
+                continue
+            if now - last_change < GOVERNOR_HOLD and not (threads < governor.threads and governor.emergency()):
+                continue
+            self.log_thermal_point(governor.threads, samples, now - level_started)
+            self.log(f"Thermal governor: {governor.threads} -> {threads} threads at {governor.temperature:.1f}°C "
+                     f"(target {governor.target}°C)", Fore.YELLOW, important=True)
+            governor.threads = threads
+            samples = []
+            level_started = last_change = now
+            self.request_restart("governor")
+
+    def governor_line(self):
+        """Governor and battery state for the dashboard"""
+        parts = []
+        if self.governor:
+            parts.append(f"Governor: {self.governor.threads}/{self.governor.max_threads} threads, "
+                         f"target {self.governor.target}°C")
+        if self.battery:
+            capacity = f"{self.battery['capacity']:.0f}% " if self.battery["capacity"] is not None else ""
+            parts.append(f"Battery: {capacity}{self.battery['status']}")
+        if self.paused:
+            parts.append("PAUSED")
+        return "   ".join(parts)
+
+    def write_status(self, state):
+        """Write the daemon status file for scripts and service managers"""
+        if not self.status_file:
+            return
+        status = {
+            "pid": os.getpid(),
+            "state": state,
+            "updated": datetime.now().isoformat(),
+            "started": datetime.fromtimestamp(self.mining_started).isoformat() if self.mining_started else None,
+            "pool": self.current_pool["name"] if self.current_pool else None,
+            "hashrate": self.hashrate,
+            "shares": self.shares,
+            "restarts": self.restarts,
+            "temperature": self.temperature,
+            "paused": self.paused,
+            "threads": self.governor.threads if self.governor else None
+        }
+        tmp_file = self.status_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(status, f, indent=2)
+        os.replace(tmp_file, self.status_file)
+
+    async def status_loop(self):
+        while True:
+            self.write_status("paused" if self.paused else "mining")
+            await asyncio.sleep(DAEMON_STATUS_INTERVAL)
+
+    def print_status(self, status_file, as_json=False):
+        """Daemon status plus the saved statistics"""
+        status = None
+        try:
+            with open(status_file, "r") as f:
+                status = json.load(f)
+            if status.get("state") != "stopped" and not pid_alive(status.get("pid")):
+                status["state"] = "dead"
+        except (IOError, ValueError):
+            pass
+        if as_json:
+            stats = None
+            try:
+                with open(STATS_FILE, "r") as f:
+                    stats = json.load(f)
+            except (IOError, ValueError):
+                pass
+            print(json.dumps({"status": status, "stats": stats}, indent=2))
+            return 0
+        if status:
+            print(Fore.MAGENTA + Style.BRIGHT + "=== Daemon ===")
+            print(Fore.CYAN + f"State: {status['state']} (PID {status['pid']}, updated {status['updated'][:19]})")
+            print(Fore.GREEN + f"Hashrate: {format_hashrate(status['hashrate'] or 0)}  Pool: {status['pool']}")
+        self.show_stats()
+        return 0
+
+    def handle_signals(self):
+        """SIGTERM stops gracefully; a daemon reloads its config on SIGHUP"""
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGTERM, self.stop)
+        if self.daemon:
+            loop.add_signal_handler(signal.SIGHUP, self.reload_config)
+
+    def stop(self):
+        """Stop mining from inside the event loop"""
+        self.log("Stopping...", Fore.YELLOW, important=True)
+        self.running = False
+        self.pause_instances(False)
+        for instance in self.instances:
+            if instance["process"].returncode is None:
+                try:
+                    instance["process"].terminate()
+                except ProcessLookupError:
+                    pass
+
+    def reload_config(self):
+        """Re-read the config; apply what works live, never restart the miners for it"""
+        try:
+            with open(CONFIG_FILE, "r") as f:
+                config = json.load(f)
+        except (IOError, ValueError) as e:
+            self.log(f"Config reload failed, keeping the old one: {str(e)}", Fore.RED, important=True)
+            return
+        # Settings given on the command line for this run stay in force
+        for key in self.cli_overrides:
+            config[key] = self.config[key]
+        changed = sorted(key for key in set(config) | set(self.config) if config.get(key) != self.config.get(key))
+        self.config = config
+        if self.governor:
+            self.governor.target = config.get("target_temp", GOVERNOR_TARGET_TEMP)
+        if self.dashboard:
+            self.dashboard.interval = config.get("dashboard_interval", DASHBOARD_INTERVAL)
         
-        self.benchmark_mode = False
+        deferred = [key for key in changed if key in RESTART_CONFIG_KEYS]
+        self.log(f"Config reloaded, changed: {', '.join(changed) or 'nothing'}", Fore.GREEN, important=True)
+        if deferred:
+            self.log(f"Applied at the next miner restart: {', '.join(deferred)}", Fore.YELLOW, important=True)
 
-    def start_mining(self):
-        """Start the mining process"""
-        miner_binary = self.get_miner_binary_path()
+    def list_builds(self):
+        active = self.config.get("active_build")
+        for meta in self.list_cached_builds():
+            marker = "*" if meta["key"] == active else " "
+            print(f"{marker} {meta['key']} {meta['label']} commit {meta['commit'][:10]} built {meta['built'][:16]}")
+
+    def fleet_snapshot(self):
+        """Compact report for the fleet collector"""
+        return {
+            "w": self.worker_name,
+            "m": self.cpu_model(),
+            "h": round(self.hashrate, 1),
+            "a": self.shares["accepted"],
+            "r": self.shares["rejected"],
+            "T": self.temperature,
+            "p": self.current_pool["name"] if self.current_pool else None,
+            "pf": self.config.get("tuning_profiles", {}).get(self.session_profile_key),
+            "pv": self.fleet_profile_version
+        }
+
+    def apply_fleet_profile(self, profile, version):
+        """Adopt a tuning profile pushed by the fleet collector"""
+        if version == self.fleet_profile_version or not self.session_profile_key:
+            return
+        self.fleet_profile_version = version
+        profiles = dict(self.config.get("tuning_profiles", {}))
+        current = profiles.get(self.session_profile_key) or {}
+        if all(current.get(key) == profile.get(key) for key in ("threads", "cpus", "priority")):
+            return
+        profiles[self.session_profile_key] = dict(profile, tuned=datetime.now().isoformat(), source="fleet")
+        self.set_config_value("tuning_profiles", profiles)
+        if self.session_binary:
+            self.session_profiles[self.session_binary] = profiles[self.session_profile_key]
+        self.log(f"Fleet profile: threads={profile.get('threads')} cpus={profile.get('cpus')} "
+                 f"priority={profile.get('priority')}", Fore.MAGENTA, important=True)
+        self.request_restart("fleet profile")
+
+    async def fleet_loop(self, miner_binary):
+        """Report to the fleet collector set in the config"""
+        host, _, port = self.config["fleet_collector"].rpartition(":")
+        self.session_profile_key = self.profile_key(miner_binary)
+        reporter = FleetReporter((host, int(port or FLEET_PORT)), self.fleet_snapshot, self.apply_fleet_profile,
+                                 self.config.get("fleet_interval", FLEET_REPORT_INTERVAL))
+        await reporter.run()
+
+    async def watch_proxy_upstream(self):
+        """Fail over when the proxy cannot keep its upstream session up"""
+        while self.proxy:
+            await asyncio.sleep(PROXY_WATCH_INTERVAL)
+            if not self.proxy or self.proxy.upstream_failures < CIRCUIT_BREAKER_FAILURES:
+                continue
+            self.proxy.upstream_failures = 0
+            self.record_pool_failure(CIRCUIT_BREAKER_FAILURES)
+            if self.proxy.upstream_url != self.current_pool["url"]:
+                # Same local port, so the miners reconnect on their own
+                await self.start_proxy()
+
+    async def stop_instances(self):
+        """Terminate and reap every running miner instance"""
+        for instance in self.instances:
+            process = instance["process"]
+            if process.returncode is None:
+                try:
+                    process.terminate()
+                    await asyncio.wait_for(process.wait(), 10)
+                except ProcessLookupError:
+                    pass
+                except asyncio.TimeoutError:
+                    process.kill()
+                    await process.wait()
+            if instance["api"]:
+                instance["api"].close()
+
+    async def dashboard_loop(self):
+        """Redraw the dashboard at a bounded frame rate"""
+        while True:
+            self.dashboard.render(self.dashboard_lines())
+            await asyncio.sleep(self.dashboard.interval)
+
+    def dashboard_lines(self):
+        """Status panel content"""
+        now = time.time()
+        cpu_time = time.process_time()
+        last_wall, last_cpu = self.controller_cpu_sample or (now, cpu_time)
+        self.controller_cpu_sample = (now, cpu_time)
+        controller_cpu = (cpu_time - last_cpu) / (now - last_wall) * 100 if now > last_wall else 0.0
         
-        if not os.path.exists(miner_binary):
-            print(Fore.RED + "Miner binary not found. Trying to build first...")
-            self.clone_and_build()
-            miner_binary = self.get_miner_binary_path()
-            if not os.path.exists(miner_binary):
-                print(Fore.RED + "Miner binary still not found after build.")
-                return
+        uptime = now - (self.mining_started or now)
+        hours, remainder = divmod(uptime, 3600)
+        minutes, seconds = divmod(remainder, 60)
+        total_shares = self.shares["accepted"] + self.shares["rejected"]
+        rejection_rate = (self.shares["rejected"] / total_shares * 100) if total_shares > 0 else 0
+        temperature = f"   Temp: {self.temperature:.0f}°C" if self.temperature is not None else ""
+        restarts = f"   Restarts: {self.restarts}" if self.restarts else ""
+        if self.last_crash:
+            restarts += f" (last: {self.last_crash['kind']}, code {self.last_crash['returncode']})"
         
-        if not self.current_pool:
-            self.select_best_pool()
+        earnings_fiat = ""
+        if self.config.get("btc_price"):
+            earnings_fiat = f" ({self.estimated_earnings * self.config['btc_price']:.4f} " \
+                            f"{self.config.get('currency', 'USD')})"
         
-        command = [
-            miner_binary,
+        lines = [
+            Fore.MAGENTA + Style.BRIGHT + "=== Mining Statistics ===",
+            Fore.CYAN + f"Pool: {self.current_pool['name']} ({self.current_pool['url']})  Fee: {self.current_pool['fee']}%"
+                        f"{self.pool_health_line(now)}",
+            Fore.YELLOW + f"Uptime: {int(hours)}h {int(minutes)}m {int(seconds)}s{temperature}{restarts}",
+            Fore.GREEN + f"Hashrate: {format_hashrate(self.hashrate)}"
+        ]
+        window = self.hour_window
+        if window:
+            lines[-1] += f"   1h avg {format_hashrate(window['hashrate_avg'])}, p90 {format_hashrate(window['hashrate_p90'])}"
+        lines += [
+            Fore.BLUE + f"Shares: {self.shares['accepted']} accepted, {self.shares['rejected']} rejected "
+                        f"({rejection_rate:.2f}% rejected)",
+            Fore.GREEN + self.effective_line(now),
+            Fore.MAGENTA + f"Estimated earnings: {self.estimated_earnings:.8f} BTC/day" + earnings_fiat,
+            Fore.CYAN + f"Controller CPU: {controller_cpu:.1f}%   Parser: {self.parser_cost():.2f} ms/1000 lines",
+            Fore.CYAN + self.efficiency_line(),
+            Fore.YELLOW + self.governor_line(),
+            Fore.YELLOW + "[Live output] (Press CTRL+C to stop)"
+        ]
+        return lines
+
+    def pool_health_line(self, now):
+        """Short health summary of the active pool for the dashboard"""
+        summary = self.pool_health_of(self.current_pool).summary(now)
+        parts = []
+        if summary["shares"]:
+            parts.append(f"rej {summary['reject_rate'] * 100:.1f}% stale {summary['stale_rate'] * 100:.1f}%")
+        latency = summary["submit_ms"] if summary["submit_ms"] is not None else summary["handshake_ms"]
+        if latency is not None:
+            parts.append(f"{latency:.0f}ms")
+        return ("  [" + ", ".join(parts) + "]") if parts else ""
+
+    def log(self, text, color="", important=False):
+        """Send a line to the dashboard log, or print it when no dashboard runs"""
+        if self.dashboard and self.dashboard.active:
+            self.dashboard.log(text, color, important)
+        else:
+            print(color + text)
+
+    def build_miner_command(self, miner_binary, pool_url, threads=None, cpus=None,
+                            priority=DEFAULT_CPU_PRIORITY):
+        """Build the cpuminer command line for one instance"""
+        command = miner_command(miner_binary) + [
             "-a", "sha256d",
-            "-o", self.current_pool["url"],
+            "-o", pool_url,
             "-u", f"{self.wallet_address}.{self.worker_name}",
             "-p", "x",
             "--stats",
@@ -345,7 +4340,7 @@ index abc123..def456 100644
             "--timeout=30",
             "--temp-cutoff=95",  # Stop if CPU reaches 95°C
             "--temp-hysteresis=3",
-            "--cpu-priority=3",  # Slightly elevated priority
+            f"--cpu-priority={priority}",
             "--quiet"  # Less verbose output
         ]
         
@@ -355,116 +4350,616 @@ index abc123..def456 100644
         else:
             command.extend(["--asm=yes"])
         
-        print(Fore.GREEN + "Starting miner with optimized settings...")
-        print(Fore.YELLOW + "Command: " + " ".join(command))
-        print(Fore.CYAN + "Press CTRL+C to stop mining")
+        if threads:
+            command.append(f"--threads={threads}")
+        if cpus:
+            command.append(f"--cpu-affinity={cpu_mask(cpus)}")
+        return command
+
+    def read_cpu_topology(self):
+        """Group CPUs into clusters by max frequency (big.LITTLE aware)"""
+        clusters = {}
+        cpu_root = "/sys/devices/system/cpu"
+        try:
+            names = os.listdir(cpu_root)
+        except OSError:
+            names = []
         
-        self.running = True
-        self.miner_process = subprocess.Popen(
-            command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            universal_newlines=True
-        )
+        for name in names:
+            if not (name.startswith("cpu") and name[3:].isdigit()):
+                continue
+            cpu = int(name[3:])
+            try:
+                with open(os.path.join(cpu_root, name, "cpufreq", "cpuinfo_max_freq"), "r") as f:
+                    max_freq = int(f.read().strip())
+            except (IOError, OSError, ValueError):
+                max_freq = 0
+            clusters.setdefault(max_freq, []).append(cpu)
         
-        # Start stats monitoring thread
-        stats_thread = threading.Thread(target=self.monitor_stats)
-        stats_thread.daemon = True
-        stats_thread.start()
+        if not clusters:
+            clusters = {0: list(range(os.cpu_count() or 1))}
         
-        # Display output in real-time with colors
-        while self.running:
-            output = self.miner_process.stdout.readline()
-            if output == '' and self.miner_process.poll() is not None:
+        return [
+            {"cpus": sorted(cpus), "max_freq": max_freq}
+            for max_freq, cpus in sorted(clusters.items(), reverse=True)
+        ]
+
+    def instance_layout(self):
+        """Instances to launch: configured layout, or one per CPU cluster"""
+        layout = self.config.get("layout")
+        if layout:
+            return [
+                {"cpus": slot.get("cpus"), "threads": slot.get("threads") or len(slot.get("cpus") or []) or None}
+                for slot in layout
+            ]
+        
+        topology = self.read_cpu_topology()
+        for cluster in topology:
+            print(Fore.CYAN + f"CPU cluster {cluster['cpus']} max {cluster['max_freq'] / 1000:.0f} MHz")
+        if len(topology) == 1:
+            return [{"cpus": None, "threads": None}]
+        return [{"cpus": cluster["cpus"], "threads": len(cluster["cpus"])} for cluster in topology]
+
+    async def read_instance_output(self, instance):
+        """Parse the output of one miner instance until it exits"""
+        process = instance["process"]
+        while process.stdout is not None:
+            try:
+                output = await process.stdout.readline()
+            except ValueError:
+                # Overlong line, the rest of it is discarded
+                continue
+            if not output:
                 break
-            if output:
-                self.parse_output(output)
+            output = output.decode(errors="replace")
+            if self.recorder:
+                self.recorder.record(f"m{instance['index']}", output)
+            instance["tail"].append(output.strip())
+            self.parse_output(output, instance)
+        await process.wait()
+        
+        # One crashed instance takes the others down so all restart together
+        if (process.returncode != 0 and self.running and not self.restart_pending
+                and not any(other.get("crashed") for other in self.instances)):
+            instance["crashed"] = True
+            for other in self.instances:
+                if other is not instance and other["process"].returncode is None:
+                    try:
+                        other["process"].terminate()
+                    except ProcessLookupError:
+                        pass
+
+    async def poll_api_stats(self):
+        """Feed hashrate and share state from the miner API sockets"""
+        interval = self.config.get("api_interval", API_INTERVAL)
+        while self.running:
+            for instance in self.instances:
+                if instance["process"].returncode is None:
+                    await self.collect_api_stats(instance)
+            await asyncio.sleep(interval)
+
+    async def collect_api_stats(self, instance):
+        """Query one instance's API and apply the results"""
+        client = instance["api"]
+        try:
+            summary = await client.summary()
+            threads = await client.threads()
+        except (OSError, ConnectionError, asyncio.TimeoutError):
+            # API not up yet or instance restarting
+            return
+        
+        for record in threads:
+            hashrate = api_hashrate(record)
+            if hashrate is not None and "CPU" in record:
+                self.handle_event(MinerEvent("hashrate", hashrate, int(record["CPU"])), instance)
+        hashrate = api_hashrate(summary)
+        if hashrate is not None:
+            self.handle_event(MinerEvent("hashrate", hashrate), instance)
+        
+        # API counters are cumulative per process, apply only the increase. The summary's DIFF
+        # is the network difficulty whenever cpuminer knows it, never use it as the share target;
+        # handle_event takes that from stratum (proxy or "difficulty set" lines) when available.
+        seen = instance["api_shares"]
+        for key, field in (("accepted", "ACC"), ("rejected", "REJ")):
+            try:
+                count = int(summary.get(field, seen[key]))
+            except ValueError:
+                continue
+            for _ in range(max(0, count - seen[key])):
+                self.handle_event(MinerEvent("share", key == "accepted"))
+            seen[key] = count
         
-        if self.miner_process.returncode != 0 and not self.benchmark_mode:
-            print(Fore.RED + "Miner process crashed. Restarting in 10 seconds...")
-            time.sleep(10)
-            self.start_mining()
+        try:
+            if float(summary.get("TEMP", 0)) > 0:
+                self.handle_event(MinerEvent("temperature", float(summary["TEMP"])))
+        except ValueError:
+            pass
+
+    async def start_proxy(self):
+        """Start the local stratum proxy for the current pool, return its URL"""
+        listen_port = self.config.get("proxy_port", PROXY_PORT)
+        if self.proxy and self.proxy.upstream_url != self.current_pool["url"]:
+            # Keep the local port so running miners reconnect to the new upstream
+            listen_port = self.proxy.listen_port
+            await self.stop_proxy()
+        if not self.proxy:
+            self.proxy = StratumProxy(
+                self.current_pool["url"],
+                f"{self.wallet_address}.{self.worker_name}",
+                listen_port=listen_port
+            )
+            self.proxy.on_ack = self.on_proxy_ack
+            self.proxy.on_check = self.on_share_check
+            self.proxy.on_log = self.log
+            self.proxy.recorder = self.recorder
+            await self.proxy.start()
+            self.log(f"Stratum proxy listening on {self.proxy.url}", Fore.CYAN, important=True)
+        return self.proxy.url
+
+    async def stop_proxy(self):
+        """Stop the local stratum proxy if it is running"""
+        if self.proxy:
+            await self.proxy.stop()
+            self.proxy = None
 
-    def parse_output(self, output):
+    def parse_output(self, output, instance=None):
         """Parse miner output and update stats"""
         output = output.strip()
+        if not output:
+            return
         
-        # Update hashrate
-        if "kH/s" in output:
-            try:
-                self.hashrate = float(output.split()[2])
-            except:
-                pass
+        start_time = time.thread_time()
+        event = parse_line(output)
+        if event is not None:
+            self.handle_event(event, instance)
+        self.parser_stats["lines"] += 1
+        self.parser_stats["cpu"] += time.thread_time() - start_time
         
-        # Update shares
-        if "ACCEPTED" in output:
-            self.shares["accepted"] += 1
-            print(Fore.GREEN + output)
-        elif "REJECTED" in output:
-            self.shares["rejected"] += 1
-            print(Fore.RED + output)
-        elif "yay!!!" in output:
-            print(Fore.MAGENTA + Style.BRIGHT + ">>> BLOCK FOUND! <<<")
-            print(Fore.MAGENTA + output)
-        elif "stratum" in output.lower():
-            print(Fore.CYAN + output)
+        kind = event.kind if event is not None else None
+        if kind == "share":
+            self.log(output, Fore.GREEN if event.value else Fore.RED, important=True)
+        elif kind == "block":
+            self.log(">>> BLOCK FOUND! <<<", Fore.MAGENTA + Style.BRIGHT, important=True)
+            self.log(output, Fore.MAGENTA, important=True)
+        elif kind in ("reconnect", "job") or "stratum" in output.lower():
+            self.log(output, Fore.CYAN)
+        elif "error" in output.lower():
+            self.log(output, Fore.RED, important=True)
         else:
-            print(output)
+            self.log(output)
+
+    def handle_event(self, event, instance=None):
+        """Apply a parsed miner event to the mining state"""
+        kind = event.kind
+        if kind == "hashrate":
+            target = instance if instance is not None else self.rates
+            if event.thread is None:
+                target["hashrate"] = event.value
+                target["total_reported"] = True
+            else:
+                target["threads"][event.thread] = event.value
+                if not target.get("total_reported"):
+                    target["hashrate"] = sum(target["threads"].values())
+            if instance is None:
+                self.hashrate = self.rates["hashrate"]
+            else:
+                self.hashrate = sum(i["hashrate"] for i in self.instances)
+            if not self.generation_hash and self.generation_started:
+                self.generation_hash = True
+                self.tracer.complete("first_hash", self.generation_started, generation=self.restarts)
+            if not self.startup_reported and self.launch_time and not self.benchmark_mode:
+                self.startup["first_hash"] = (time.perf_counter() - self.launch_time) * 1000
+                self.report_startup()
+        elif kind == "share":
+            diff = event.diff if event.diff is not None else self.last_submit_diff
+            if event.value:
+                self.shares["accepted"] += 1
+                if not self.first_share_seen and self.mining_started:
+                    self.first_share_seen = True
+                    self.first_share_time.observe(time.time() - self.mining_started)
+                if not self.generation_share and self.generation_started:
+                    self.generation_share = True
+                    self.tracer.complete("first_share", self.generation_started, generation=self.restarts)
+            else:
+                self.shares["rejected"] += 1
+            if not (self.proxy and self.proxy.on_ack):
+                if event.latency is not None:
+                    self.share_latency.observe(event.latency / 1000)
+                if self.current_pool:
+                    self.pool_health_of(self.current_pool).record_share(event.value, event.stale, event.latency)
+            self.share_log.append((time.time(), event.value, diff, event.latency))
+            # Only the target difficulty counts; the diff on the share line is often what was achieved
+            target = self.proxy.share_difficulty if self.proxy and self.proxy.share_difficulty else self.share_difficulty
+            self.estimator.record_share(event.value, event.stale, target)
+        elif kind == "difficulty":
+            self.share_difficulty = event.value
+        elif kind == "submit":
+            self.last_submit_diff = event.diff
+        elif kind == "job":
+            self.jobs += 1
+        elif kind == "reconnect":
+            self.reconnects += 1
+        elif kind == "temperature":
+            self.temperature = event.value
+
+    async def start_metrics_server(self):
+        """Serve Prometheus metrics on metrics_port from the event loop"""
+        if self.metrics_server:
+            return
+        host = self.config.get("metrics_host", METRICS_HOST)
+        port = self.config["metrics_port"]
+        try:
+            self.metrics_server = await asyncio.start_server(self.handle_metrics_request, host, port)
+        except OSError as e:
+            print(Fore.RED + f"Could not start metrics endpoint on {host}:{port}: {str(e)}")
+            return
+        port = self.metrics_server.sockets[0].getsockname()[1]
+        print(Fore.CYAN + f"Metrics endpoint: http://{host}:{port}/metrics")
+
+    async def stop_metrics_server(self):
+        if self.metrics_server:
+            self.metrics_server.close()
+            await self.metrics_server.wait_closed()
+            self.metrics_server = None
+
+    async def handle_metrics_request(self, reader, writer):
+        """Answer one HTTP GET for /metrics"""
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 5)
+            path = request.split(b" ", 2)[1].split(b"?")[0] if request.count(b" ") >= 2 else b""
+            if path == b"/metrics":
+                status, body = "200 OK", self.render_metrics().encode()
+            else:
+                status, body = "404 Not Found", b"Not Found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def render_metrics(self):
+        """Current state in the Prometheus text exposition format"""
+        worker = {"worker": self.worker_name}
+        pool = self.current_pool or {}
+        lines = []
+        lines += render_metric("termux_miner_shares_total", "counter", "Shares by result", [
+            (dict(worker, result="accepted"), self.shares["accepted"]),
+            (dict(worker, result="rejected"), self.shares["rejected"])
+        ])
+        lines += render_metric("termux_miner_restarts_total", "counter", "Miner process restarts",
+                               [(worker, self.restarts)])
+        lines += render_metric("termux_miner_reconnects_total", "counter", "Stratum reconnects",
+                               [(worker, self.reconnects + (self.proxy.stats["reconnects"] if self.proxy else 0))])
+        lines += render_metric("termux_miner_hashrate_hs", "gauge", "Total hashrate in H/s",
+                               [(worker, self.hashrate)])
+        
+        thread_samples = []
+        sources = self.instances if self.instances else [self.rates]
+        for index, source in enumerate(sources):
+            for thread, hashrate in list(source["threads"].items()):
+                thread_samples.append((dict(worker, instance=index, thread=thread), hashrate))
+        lines += render_metric("termux_miner_thread_hashrate_hs", "gauge", "Per-thread hashrate in H/s",
+                               thread_samples)
+        lines += render_metric("termux_miner_temperature_celsius", "gauge", "CPU temperature",
+                               [(worker, self.temperature)])
+        lines += render_metric("termux_miner_pool_latency_ms", "gauge", "Probed pool connect latency",
+                               [(dict(worker, pool=p["name"]), p.get("latency")) for p in self.pool_ranking])
+        yields = self.pool_yields()
+        lines += render_metric("termux_miner_pool_effective_yield", "gauge",
+                               "Expected fraction of hashing paid out per pool",
+                               [(dict(worker, pool=name), value) for name, value in yields.items()])
+        effective_samples = []
+        for label, seconds in ESTIMATOR_WINDOWS:
+            estimate = self.estimator.estimate(seconds)
+            if estimate:
+                for bound in ("hashrate", "low", "high"):
+                    effective_samples.append((dict(worker, window=label, bound=bound), estimate[bound]))
+        lines += render_metric("termux_miner_effective_hashrate_hs", "gauge",
+                               "Hashrate from accepted share difficulty with confidence bounds "
+                               "(needs the proxy with telemetry=api)", effective_samples)
+        efficiency = self.efficiency or {}
+        lines += render_metric("termux_miner_hashes_per_cpu_second", "gauge", "Hashes per second of miner CPU time",
+                               [(worker, efficiency.get("hashes_per_cpu_second"))])
+        lines += render_metric("termux_miner_cpu_percent", "gauge", "CPU use in % of one core", [
+            (dict(worker, process="miner"), efficiency.get("miner_cpu")),
+            (dict(worker, process="controller"), efficiency.get("controller_cpu"))
+        ])
+        lines += render_metric("termux_miner_cpu_contention_percent", "gauge",
+                               "CPU busy time of other processes in % of all cores",
+                               [(worker, efficiency.get("contention"))])
+        lines += render_metric("termux_miner_cpu_frequency_mhz", "gauge", "Average clock of the mining CPUs",
+                               [(worker, efficiency.get("frequency_mhz"))])
+        lines += render_metric("termux_miner_estimated_btc_per_day", "gauge", "Expected earnings",
+                               [(worker, self.estimated_earnings)])
+        lines += render_metric("termux_miner_startup_seconds", "gauge", "Startup phase durations",
+                               [(dict(worker, phase=phase), ms / 1000) for phase, ms in self.startup.items()])
+        if self.proxy:
+            lines += render_metric("termux_miner_share_checks_total", "counter", "Local shares verified by the proxy", [
+                (dict(worker, result="valid"), self.proxy.stats["checked"] - self.proxy.stats["invalid"]),
+                (dict(worker, result="invalid"), self.proxy.stats["invalid"])
+            ])
+        lines += render_metric("termux_miner_pool_info", "gauge", "Active pool",
+                               [(dict(worker, pool=pool.get("name", ""), url=pool.get("url", "")), 1)] if pool else [])
+        lines += self.share_latency.render("termux_miner_share_latency_seconds",
+                                           "Share submit to ack latency", worker)
+        lines += self.first_share_time.render("termux_miner_time_to_first_share_seconds",
+                                              "Time from miner launch to first accepted share", worker)
+        return "\n".join(lines) + "\n"
+
+    def parser_cost(self):
+        """Parser CPU time in milliseconds per thousand lines"""
+        if not self.parser_stats["lines"]:
+            return 0.0
+        return self.parser_stats["cpu"] * 1000 / self.parser_stats["lines"] * 1000
+
+    async def replay_session(self, path, speed=1.0, live=True):
+        """Feed a capture through the controller as if the miner were running, return measurements
+
+        speed 0 replays as fast as possible. With live set the dashboard and
+        stats monitor run too, so their cost is part of the measurement.
+        """
+        self.running = True
+        self.mining_started = time.time()
+        self.estimator.start(self.mining_started)
+        self.current_pool = self.current_pool or REPLAY_POOL
+        self.instances = []
+        instances = {}
+        # A detached proxy parses the recorded pool messages like a live upstream, and stands in
+        # for the session proxy so recorded difficulty reaches the share handling and estimator
+        proxy = StratumProxy(self.current_pool["url"], "replay")
+        session_proxy, self.proxy = self.proxy, proxy
+        background = []
+        latencies = []
+        if live:
+            self.dashboard = Dashboard(interval=self.config.get("dashboard_interval", DASHBOARD_INTERVAL))
+            self.dashboard.start()
+            background.append(asyncio.ensure_future(self.monitor_stats()))
+            background.append(asyncio.ensure_future(self.dashboard_loop()))
+        
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        try:
+            for offset, source, text in read_capture(path):
+                if speed:
+                    scheduled = wall_start + offset / speed
+                    delay = scheduled - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                else:
+                    scheduled = time.perf_counter()
+                    if len(latencies) % REPLAY_YIELD_LINES == 0:
+                        await asyncio.sleep(0)  # let the background tasks run
+                if source[0] == "m":
+                    instance = instances.get(source)
+                    if instance is None:
+                        instance = {"process": None, "cpus": None, "hashrate": 0, "threads": {}, "api": None,
+                                    "tail": deque(maxlen=CRASH_TAIL_LINES)}
+                        instances[source] = instance
+                        self.instances.append(instance)
+                    instance["tail"].append(text)
+                    self.parse_output(text, instance)
+                elif source == "p>":
+                    msg = json.loads(text)
+                    if msg.get("method"):
+                        proxy.handle_upstream_method(msg)
+                latencies.append(time.perf_counter() - scheduled)
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            self.running = False
+            self.proxy = session_proxy
+            for task in background:
+                task.cancel()
+            await asyncio.gather(*background, return_exceptions=True)
+            if self.dashboard:
+                self.dashboard.stop()
+                self.dashboard = None
+        
+        return {
+            "lines": len(latencies),
+            "seconds": wall,
+            "lines_per_second": len(latencies) / wall if wall else 0.0,
+            "latency_p50_us": percentile(latencies, 50) * 1e6 if latencies else None,
+            "latency_p99_us": percentile(latencies, 99) * 1e6 if latencies else None,
+            "controller_cpu": cpu / wall * 100 if wall else 0.0
+        }
+
+    def replay_subprocess(self, path, speed=1.0):
+        """Run a capture through the real supervisor as a fake miner process, return measurements"""
+        self.current_pool = self.current_pool or REPLAY_POOL
+        self.running = True
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        asyncio.run(self.mining_session(replay_binary(path, speed)))
+        wall = time.perf_counter() - wall_start
+        lines = self.parser_stats["lines"]
+        return {
+            "lines": lines,
+            "seconds": wall,
+            "lines_per_second": lines / wall if wall else 0.0,
+            "latency_p50_us": None,
+            "latency_p99_us": None,
+            "controller_cpu": (time.process_time() - cpu_start) / wall * 100 if wall else 0.0
+        }
+
+    def run_controller_benchmark(self, workloads=REPLAY_WORKLOADS, duration=REPLAY_BENCH_DURATION):
+        """Replay synthetic miner output at rising line rates and measure the controller's overhead"""
+        import tempfile
+        print(Fore.MAGENTA + "=== Controller Benchmark ===")
+        home = os.getcwd()
+        results = []
+        # Stats and logs of the replayed sessions must not end up in the real history
+        with tempfile.TemporaryDirectory() as workdir:
+            os.chdir(workdir)
+            try:
+                for name, rate in workloads:
+                    path = os.path.join(workdir, f"{name}.gz")
+                    synthetic_capture(path, rate, duration)
+                    runs = [
+                        ("max speed", lambda: asyncio.run(self.replay_controller().replay_session(path, 0, False))),
+                        ("real time", lambda: asyncio.run(self.replay_controller().replay_session(path, 1.0))),
+                        ("subprocess", lambda: self.replay_controller().replay_subprocess(path, 1.0))
+                    ]
+                    for mode, run in runs:
+                        result = dict(run(), workload=name, rate=rate, mode=mode)
+                        results.append(result)
+            finally:
+                os.chdir(home)
+        
+        print(Fore.MAGENTA + Style.BRIGHT + "=== Controller Benchmark Results ===")
+        print(Fore.CYAN + f"{'workload':<10}{'mode':<12}{'lines/s':>10}{'p50 us':>9}{'p99 us':>9}{'CPU %':>8}")
+        for result in results:
+            p50 = f"{result['latency_p50_us']:.0f}" if result["latency_p50_us"] is not None else "-"
+            p99 = f"{result['latency_p99_us']:.0f}" if result["latency_p99_us"] is not None else "-"
+            print(Fore.GREEN + f"{result['workload']:<10}{result['mode']:<12}{result['lines_per_second']:>10.0f}"
+                               f"{p50:>9}{p99:>9}{result['controller_cpu']:>8.1f}")
+        with open(CONTROLLER_BENCH_FILE, "a") as f:
+            f.write(json.dumps({"timestamp": datetime.now().isoformat(), "python": sys.version.split()[0],
+                                "results": results}) + "\n")
+        print(Fore.GREEN + f"Results appended to {CONTROLLER_BENCH_FILE}")
+        return results
 
-    def monitor_stats(self):
+    def replay_controller(self):
+        """A fresh controller for one replay run, without pool switching or the governor"""
+        controller = TermuxMiner()
+        controller.tracer.enabled = False
+        controller.config = {"pool_switching": False, "governor": False,
+                             "dashboard_interval": self.config.get("dashboard_interval", DASHBOARD_INTERVAL)}
+        controller.current_pool = REPLAY_POOL
+        return controller
+
+    def open_stats_store(self):
+        """Open the stats history once per controller"""
+        if self.stats_store is None:
+            self.stats_store = StatsStore()
+        return self.stats_store
+
+    async def monitor_stats(self):
         """Monitor and save mining statistics"""
-        start_time = time.time()
+        store = self.open_stats_store()
+        last_update = 0
         
         while self.running:
             try:
-                # Calculate uptime
-                uptime = time.time() - start_time
-                hours, remainder = divmod(uptime, 3600)
-                minutes, seconds = divmod(remainder, 60)
-                
-                # Calculate rejection rate
-                total_shares = self.shares["accepted"] + self.shares["rejected"]
-                rejection_rate = (self.shares["rejected"] / total_shares * 100) if total_shares > 0 else 0
-                
-                # Calculate estimated earnings (very rough estimate)
-                # Note: This is just for display, actual earnings depend on many factors
-                btc_per_day = 0
-                if self.hashrate > 0:
-                    # Very simplified estimation (not accurate for real mining)
-                    btc_per_day = (self.hashrate / 1000000) * 0.0001  # Placeholder formula
-                
-                # Prepare stats
-                stats = {
-                    "timestamp": datetime.now().isoformat(),
-                    "uptime": f"{int(hours)}h {int(minutes)}m {int(seconds)}s",
-                    "hashrate": self.hashrate,
-                    "shares": self.shares.copy(),
-                    "rejection_rate": rejection_rate,
-                    "estimated_earnings": btc_per_day,
-                    "pool": self.current_pool["name"]
-                }
-                
-                # Save stats to file
-                with open(STATS_FILE, "w") as f:
-                    json.dump(stats, f, indent=2)
-                
-                # Display stats
-                os.system('clear')  # Clear screen for better display
-                print(Fore.MAGENTA + Style.BRIGHT + "=== Mining Statistics ===")
-                print(Fore.CYAN + f"Pool: {self.current_pool['name']} ({self.current_pool['url']})")
-                print(Fore.CYAN + f"Fee: {self.current_pool['fee']}%")
-                print(Fore.YELLOW + f"Uptime: {stats['uptime']}")
-                print(Fore.GREEN + f"Hashrate: {self.hashrate:.2f} kH/s")
-                print(Fore.BLUE + f"Shares: {self.shares['accepted']} accepted, {self.shares['rejected']} rejected")
-                print(Fore.RED + f"Rejection rate: {rejection_rate:.2f}%")
-                print(Fore.MAGENTA + f"Estimated earnings: {btc_per_day:.8f} BTC/day")
-                print(Fore.YELLOW + "\n[Live output] (Press CTRL+C to stop)")
-                
-                time.sleep(UPDATE_INTERVAL)
-                
+                now = time.time()
+                self.sample_efficiency(now)
+                store.add(now, self.hashrate, self.shares["accepted"], self.shares["rejected"], self.temperature,
+                          self.efficiency)
+                # Scanning the ring is too costly for every dashboard frame
+                self.hour_window = store.query(3600, now)
+                self.estimator.record_hashrate(self.hashrate, now)
+                if now - last_update >= UPDATE_INTERVAL:
+                    last_update = now
+                    self.update_stats(now - self.mining_started)
+                    store.flush()
             except Exception as e:
-                print(Fore.RED + f"Error in stats monitor: {str(e)}")
-                time.sleep(10)
+                self.log(f"Error in stats monitor: {str(e)}", Fore.RED, important=True)
+            await asyncio.sleep(STATS_SAMPLE_INTERVAL)
+
+    def sample_efficiency(self, now):
+        """Update self.efficiency from the CPU time of the running miners and the controller"""
+        running = [i for i in self.instances if i["process"] and i["process"].returncode is None]
+        cpus = None
+        if running and all(i["cpus"] for i in running):
+            cpus = sorted({cpu for i in running for cpu in i["cpus"]})
+        efficiency = self.accounting.sample([i["process"].pid for i in running], self.hashrate, cpus, now)
+        self.efficiency = efficiency if running else None
+        return self.efficiency
+
+    def efficiency_line(self):
+        """CPU accounting summary for the dashboard"""
+        efficiency = self.efficiency
+        if not efficiency:
+            return "Efficiency: measuring..."
+        parts = [f"Miner CPU: {efficiency['miner_cpu']:.0f}%"]
+        if efficiency["hashes_per_cpu_second"]:
+            parts.insert(0, f"Efficiency: {format_hashrate(efficiency['hashes_per_cpu_second'])[:-2]} per CPU-s")
+        if efficiency["controller_share"] is not None:
+            parts.append(f"Controller share: {efficiency['controller_share']:.2f}%")
+        if efficiency["contention"] is not None:
+            parts.append(f"Others: {efficiency['contention']:.0f}%")
+        if efficiency["frequency_mhz"]:
+            parts.append(f"Clock: {efficiency['frequency_mhz'] / 1000:.2f} GHz")
+        return "   ".join(parts)
+
+    def update_stats(self, uptime):
+        """Write the stats snapshot to STATS_FILE"""
+        # Calculate uptime
+        hours, remainder = divmod(uptime, 3600)
+        minutes, seconds = divmod(remainder, 60)
+        
+        # Calculate rejection rate
+        total_shares = self.shares["accepted"] + self.shares["rejected"]
+        rejection_rate = (self.shares["rejected"] / total_shares * 100) if total_shares > 0 else 0
+        
+        now = time.time()
+        earnings = self.earnings(now)
+        effective = {}
+        for label, window in ESTIMATOR_WINDOWS:
+            estimate = self.estimator.estimate(window, now)
+            if estimate:
+                effective[label] = {key: round(value, 4) if isinstance(value, float) else value
+                                    for key, value in estimate.items()}
+        
+        # Prepare stats
+        stats = {
+            "timestamp": datetime.now().isoformat(),
+            "uptime": f"{int(hours)}h {int(minutes)}m {int(seconds)}s",
+            "hashrate": self.hashrate,
+            "shares": self.shares.copy(),
+            "rejection_rate": rejection_rate,
+            "estimated_earnings": earnings["btc_per_day"],
+            "earnings": earnings,
+            "effective_hashrate": effective,
+            "efficiency": {key: round(value, 2) if value is not None else None
+                           for key, value in (self.efficiency or {}).items()},
+            "pool": self.current_pool["name"]
+        }
+        
+        # Save stats to file, atomically so a crash never leaves half a file
+        tmp_file = STATS_FILE + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(stats, f, indent=2)
+        os.replace(tmp_file, STATS_FILE)
+        self.estimated_earnings = earnings["btc_per_day"]
+
+    def earnings(self, now=None):
+        """Expected earnings from the effective hashrate, or the reported one until enough shares"""
+        estimate = self.estimator.best(now)
+        if estimate:
+            hashrate, basis = estimate["hashrate"], f"effective {estimate['label']}"
+        else:
+            hashrate, basis = self.hashrate, "reported"
+        fee = self.current_pool["fee"] if self.current_pool else 0.0
+        result = {
+            "hashrate": hashrate,
+            "basis": basis,
+            "btc_per_day": btc_per_day(hashrate, self.config.get("network_difficulty", NETWORK_DIFFICULTY),
+                                       self.config.get("block_reward", BLOCK_REWARD), fee)
+        }
+        if self.config.get("btc_price"):
+            result["fiat_per_day"] = result["btc_per_day"] * self.config["btc_price"]
+        return result
+
+    def effective_line(self, now):
+        """Effective against reported hashrate for the dashboard"""
+        estimate = self.estimator.best(now) or self.estimator.estimate(ESTIMATOR_WINDOWS[0][1], now)
+        if not estimate or not estimate["shares"]:
+            return "Effective: waiting for shares" + ("" if self.share_difficulty or self.proxy else
+                                                      " with a known difficulty")
+        label = estimate.get("label") or ESTIMATOR_WINDOWS[0][0]
+        line = (f"Effective: {format_hashrate(estimate['hashrate'])} "
+                f"({format_hashrate(estimate['low'])}-{format_hashrate(estimate['high'])}, "
+                f"{estimate['shares']} shares/{label})")
+        if estimate["reported"]:
+            losses = [f"rej {estimate['reject_loss'] * 100:.1f}%", f"stale {estimate['stale_loss'] * 100:.1f}%",
+                      f"other {estimate['unaccounted_loss'] * 100:.1f}%"]
+            line += " loss " + " ".join(losses) + (" !" if estimate["significant"] else "")
+        return line
 
     def show_stats(self):
         """Display saved statistics"""
@@ -479,14 +4974,51 @@ index abc123..def456 100644
         for key, value in stats.items():
             if key == "shares":
                 print(Fore.BLUE + f"Shares: {value['accepted']} accepted, {value['rejected']} rejected")
+            elif key == "earnings":
+                fiat = f", {value['fiat_per_day']:.4f} per day" if "fiat_per_day" in value else ""
+                print(Fore.MAGENTA + f"Earnings basis: {value['basis']} {format_hashrate(value['hashrate'])}{fiat}")
+            elif key == "effective_hashrate":
+                for label, estimate in value.items():
+                    reported = format_hashrate(estimate["reported"]) if estimate["reported"] else "n/a"
+                    print(Fore.GREEN + f"Effective {label}: {format_hashrate(estimate['hashrate'])} "
+                                       f"({format_hashrate(estimate['low'])}-{format_hashrate(estimate['high'])}, "
+                                       f"{estimate['shares']} shares), reported {reported}")
             else:
                 print(Fore.CYAN + f"{key.replace('_', ' ').title()}: {value}")
+        
+        if not os.path.isdir(STATS_DIR):
+            return
+        store = self.open_stats_store()
+        print(Fore.MAGENTA + Style.BRIGHT + "=== History ===")
+        for label, seconds in STATS_WINDOWS:
+            window = store.query(seconds)
+            if not window:
+                continue
+            temperature = f", max {window['temperature_max']:.0f}°C" if window["temperature_max"] else ""
+            print(Fore.CYAN + f"{label:>4}: avg {format_hashrate(window['hashrate_avg'])}, "
+                  f"p50 {format_hashrate(window['hashrate_p50'])}, p90 {format_hashrate(window['hashrate_p90'])}, "
+                  f"{window['accepted']} accepted, {window['shares_per_hour']:.2f} shares/h{temperature}")
+            efficiency = []
+            if window["hashes_per_cpu_second"]:
+                efficiency.append(f"{format_hashrate(window['hashes_per_cpu_second'])[:-2]} per CPU-s")
+            if window["controller_share"] is not None:
+                efficiency.append(f"controller {window['controller_share']:.2f}%")
+            if window["contention"] is not None:
+                efficiency.append(f"others {window['contention']:.0f}%")
+            if window["frequency_mhz"]:
+                efficiency.append(f"{window['frequency_mhz'] / 1000:.2f} GHz")
+            if efficiency:
+                print(Fore.CYAN + "      " + ", ".join(efficiency))
 
     def cleanup(self):
         """Clean up before exit"""
         self.running = False
-        if self.miner_process:
-            self.miner_process.terminate()
+        for instance in self.instances:
+            if instance["process"].returncode is None:
+                try:
+                    instance["process"].terminate()
+                except (ProcessLookupError, RuntimeError):
+                    pass
         print(Fore.YELLOW + "\nMiner stopped. Cleaning up...")
 
     def show_menu(self):
@@ -512,7 +5044,7 @@ index abc123..def456 100644
                 except KeyboardInterrupt:
                     self.cleanup()
             elif choice == "2":
-                self.run_benchmark()
+                self.benchmark_menu()
                 input(Fore.YELLOW + "Press Enter to continue...")
             elif choice == "3":
                 self.show_stats()
@@ -520,7 +5052,7 @@ index abc123..def456 100644
             elif choice == "4":
                 self.setup_config()
             elif choice == "5":
-                self.update_miner()
+                self.build_menu()
             elif choice == "6":
                 self.cleanup()
                 sys.exit(0)
@@ -530,39 +5062,595 @@ index abc123..def456 100644
 
     def update_miner(self):
         """Update the miner software"""
-        print(Fore.YELLOW + "Updating miner...")
+        with self.tracer.span("update"):
+            print(Fore.YELLOW + "Updating miner...")
+            
+            try:
+                key = self.build_miner()
+                self.activate_build(key)
+                print(Fore.GREEN + "Miner updated successfully!")
+            except (subprocess.CalledProcessError, OSError) as e:
+                print(Fore.RED + f"Update failed: {str(e)}")
+                print(Fore.YELLOW + "Trying simpler build...")
+                try:
+                    subprocess.run(["make", "clean"], check=True, cwd=MINER_DIR)
+                    subprocess.run(["./configure"], check=True, cwd=MINER_DIR)
+                    subprocess.run(["make", "-j", str(os.cpu_count() or 2)], check=True, cwd=MINER_DIR)
+                    # Plain configure has different flags, drop the stamp
+                    if os.path.exists(os.path.join(MINER_DIR, BUILD_STAMP)):
+                        os.remove(os.path.join(MINER_DIR, BUILD_STAMP))
+                    self.set_config_value("active_build", None)
+                    print(Fore.GREEN + "Miner updated with simpler configuration!")
+                except (subprocess.CalledProcessError, OSError) as e:
+                    print(Fore.RED + f"Simpler build also failed: {str(e)}")
+
+    def switch_build(self):
+        """Pick one of the cached binaries to mine with"""
+        builds = self.list_cached_builds()
+        if not builds:
+            print(Fore.RED + "No cached builds yet.")
+            return
         
-        if not os.path.exists(MINER_DIR):
-            print(Fore.RED + "Miner directory not found. Building fresh...")
-            self.clone_and_build()
+        active = self.config.get("active_build")
+        for index, meta in enumerate(builds, 1):
+            marker = "*" if meta["key"] == active else " "
+            print(Fore.CYAN + f"{marker}[{index}] {meta['key']} {meta['label']} commit {meta['commit'][:10]} "
+                  f"CFLAGS '{meta['cflags']}' built {meta['built'][:16]}")
+        choice = input(Fore.CYAN + "Select a build: ").strip()
+        if choice.isdigit() and 1 <= int(choice) <= len(builds):
+            self.activate_build(builds[int(choice) - 1]["key"])
+        else:
+            print(Fore.RED + "Invalid choice.")
+
+    def build_menu(self):
+        """Update the miner or switch between cached builds"""
+        print(Fore.CYAN + """
+            [1] Update and rebuild (incremental)
+            [2] Switch cached build
+            [3] Build optimized variants (generic, native, LTO, PGO) and pick the fastest
+            [4] Re-benchmark cached variants
+            """)
+        choice = input(Fore.CYAN + "Select an option: ").strip()
+        if choice == "1":
+            self.update_miner()
+        elif choice == "2":
+            self.switch_build()
+        elif choice == "3":
+            self.build_variants()
+        elif choice == "4":
+            self.measure_build_variants()
+        else:
+            print(Fore.RED + "Invalid choice.")
+
+def profile_version(profile):
+    """Short content hash identifying a pushed tuning profile"""
+    return hashlib.sha256(json.dumps(profile, sort_keys=True).encode()).hexdigest()[:12]
+
+
+class FleetReporter(asyncio.DatagramProtocol):
+    """Push compact stats reports to a fleet collector over UDP
+
+    Reports carry cumulative counters per session, so a lost or repeated
+    datagram never skews the collector's totals. Without an ack the
+    interval backs off exponentially.
+    """
+
+    def __init__(self, address, snapshot, on_profile=None, interval=FLEET_REPORT_INTERVAL):
+        self.address = address
+        self.snapshot = snapshot  # returns the report fields
+        self.on_profile = on_profile  # called with (profile, version) pushed by the collector
+        self.interval = interval
+        self.session = os.urandom(4).hex()
+        self.seq = 0
+        self.transport = None
+        self.acked = None
+        self.sent = 0
+        self.acks = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            msg = json.loads(data)
+        except ValueError:
+            return
+        if msg.get("ack") == self.seq and self.acked:
+            self.acked.set()
+        if msg.get("pf") and self.on_profile:
+            self.on_profile(msg["pf"], msg.get("pv"))
+
+    def error_received(self, exc):
+        # ICMP port unreachable while the collector is down; the backoff handles it
+        pass
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        await loop.create_datagram_endpoint(lambda: self, remote_addr=self.address)
+        delay = self.interval
+        try:
+            while True:
+                self.seq += 1
+                report = dict(self.snapshot(), v=1, sid=self.session, seq=self.seq)
+                self.acked = asyncio.Event()
+                self.transport.sendto(json.dumps(report, separators=(",", ":")).encode())
+                self.sent += 1
+                try:
+                    await asyncio.wait_for(self.acked.wait(), FLEET_ACK_TIMEOUT)
+                    self.acks += 1
+                    delay = self.interval
+                except asyncio.TimeoutError:
+                    delay = min(delay * 2, FLEET_BACKOFF_MAX)
+                # Jitter keeps a fleet started together from reporting in lockstep
+                await asyncio.sleep(delay * random.uniform(0.8, 1.2))
+        finally:
+            self.transport.close()
+
+
+class FleetCollector(asyncio.DatagramProtocol):
+    """Aggregate reports from many miners and push tuning profiles back"""
+
+    def __init__(self, profiles=None):
+        self.workers = {}  # worker name -> state
+        self.fixed_profiles = profiles or {}  # cpu model -> profile set by the operator
+        self.learned_profiles = {}  # cpu model -> best profile reported by a device
+        self.transport = None
+        self.received = 0
+        self.invalid = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            report = json.loads(data)
+            worker = str(report["w"])
+        except (ValueError, KeyError, TypeError):
+            self.invalid += 1
             return
+        self.received += 1
+        self.update(worker, report, time.time())
+        
+        reply = {"ack": report.get("seq")}
+        profile = self.profile_for(report.get("m"))
+        if profile:
+            version = profile_version(profile)
+            if report.get("pv") != version:
+                reply.update(pf=profile, pv=version)
+        self.transport.sendto(json.dumps(reply, separators=(",", ":")).encode(), addr)
+
+    def update(self, worker, report, now):
+        """Fold one report into the worker's totals"""
+        state = self.workers.setdefault(worker, {
+            "session": None, "seq": 0, "carry": {"accepted": 0, "rejected": 0},
+            "session_shares": {"accepted": 0, "rejected": 0},
+            "finished": deque(maxlen=FLEET_SESSION_HISTORY)
+        })
+        session = report.get("sid")
+        if session in state["finished"]:
+            return  # late datagram from a session already carried over
+        if session != state["session"]:
+            # Restarted miner: keep what the old session contributed
+            if "last_seen" in state:
+                state["finished"].append(state["session"])
+            for key in ("accepted", "rejected"):
+                state["carry"][key] += state["session_shares"][key]
+            state.update(session=session, seq=0, session_shares={"accepted": 0, "rejected": 0})
+        seq = report.get("seq", 0)
+        if seq <= state["seq"]:
+            return  # duplicate or reordered datagram
+        state["seq"] = seq
+        state["session_shares"] = {"accepted": int(report.get("a", 0)), "rejected": int(report.get("r", 0))}
+        state.update(model=report.get("m"), hashrate=float(report.get("h") or 0),
+                     temperature=report.get("T"), pool=report.get("p"), last_seen=now)
+        
+        profile = report.get("pf")
+        model = report.get("m")
+        if profile and profile.get("hashrate") and model:
+            best = self.learned_profiles.get(model)
+            if best is None or profile["hashrate"] > best["hashrate"]:
+                self.learned_profiles[model] = {key: profile.get(key)
+                                                for key in ("threads", "cpus", "priority", "hashrate")}
+
+    def profile_for(self, model):
+        return self.fixed_profiles.get(model) or self.learned_profiles.get(model)
+
+    def summary(self, now=None):
+        """Per-worker totals, fleet totals and hashrate outliers per CPU model"""
+        now = now or time.time()
+        workers = []
+        by_model = {}
+        for name, state in self.workers.items():
+            if "last_seen" not in state:
+                continue
+            online = now - state["last_seen"] <= FLEET_STALE_AFTER
+            entry = {
+                "worker": name,
+                "model": state["model"],
+                "online": online,
+                "hashrate": state["hashrate"] if online else 0.0,
+                "accepted": state["carry"]["accepted"] + state["session_shares"]["accepted"],
+                "rejected": state["carry"]["rejected"] + state["session_shares"]["rejected"],
+                "temperature": state["temperature"],
+                "pool": state["pool"],
+                "last_seen": state["last_seen"],
+                "outlier": False
+            }
+            workers.append(entry)
+            if online:
+                by_model.setdefault(state["model"], []).append(entry)
+        
+        models = {}
+        for model, entries in by_model.items():
+            median = statistics.median(entry["hashrate"] for entry in entries)
+            models[model] = {"workers": len(entries), "median_hashrate": median}
+            if len(entries) < FLEET_MIN_GROUP:
+                continue
+            for entry in entries:
+                if entry["hashrate"] < median * FLEET_OUTLIER_RATIO:
+                    entry["outlier"] = True
+        
+        workers.sort(key=lambda entry: entry["worker"])
+        return {
+            "timestamp": datetime.now().isoformat(),
+            "workers_online": sum(1 for entry in workers if entry["online"]),
+            "workers_total": len(workers),
+            "hashrate": sum(entry["hashrate"] for entry in workers),
+            "accepted": sum(entry["accepted"] for entry in workers),
+            "rejected": sum(entry["rejected"] for entry in workers),
+            "models": models,
+            "outliers": [entry["worker"] for entry in workers if entry["outlier"]],
+            "workers": workers
+        }
+
+
+async def run_collector(port=FLEET_PORT, host=FLEET_HOST, profiles_file=FLEET_PROFILES_FILE):
+    """Serve the fleet collector and write fleet_status.json until interrupted"""
+    profiles = {}
+    if os.path.exists(profiles_file):
+        with open(profiles_file, "r") as f:
+            profiles = json.load(f)
+        print(Fore.CYAN + f"Pushing {len(profiles)} operator profiles from {profiles_file}")
+    collector = FleetCollector(profiles)
+    transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+        lambda: collector, local_addr=(host, port))
+    print(Fore.GREEN + f"Fleet collector listening on udp://{host}:{port}")
+    try:
+        while True:
+            await asyncio.sleep(FLEET_SUMMARY_INTERVAL)
+            summary = collector.summary()
+            tmp_file = FLEET_STATUS_FILE + ".tmp"
+            with open(tmp_file, "w") as f:
+                json.dump(summary, f, indent=2)
+            os.replace(tmp_file, FLEET_STATUS_FILE)
+            print(Fore.CYAN + f"{summary['workers_online']}/{summary['workers_total']} workers, "
+                  f"{format_hashrate(summary['hashrate'])}, {summary['accepted']} accepted, "
+                  f"{summary['rejected']} rejected")
+            for name in summary["outliers"]:
+                entry = next(entry for entry in summary["workers"] if entry["worker"] == name)
+                median = summary["models"][entry["model"]]["median_hashrate"]
+                print(Fore.RED + f"  outlier {name}: {format_hashrate(entry['hashrate'])} vs median "
+                                 f"{format_hashrate(median)} for {entry['model']}")
+    finally:
+        transport.close()
+
+
+async def simulate_fleet(address, workers=100, interval=5, slow_fraction=0.05):
+    """Simulated devices reporting to a collector, for testing without phones"""
+    models = ["Qualcomm SM8250 x8", "MT6785 x8", "Exynos 9611 x8"]
+    base_rates = {models[0]: 4e6, models[1]: 2.5e6, models[2]: 1.8e6}
+    reporters = []
+    for index in range(workers):
+        model = models[index % len(models)]
+        rate = base_rates[model] * random.uniform(0.9, 1.1)
+        if random.random() < slow_fraction:
+            rate *= 0.4  # throttled or misconfigured device
+        device = {"w": f"sim{index:04d}", "m": model, "h": rate, "a": 0, "r": 0, "T": 55.0, "p": "SlushPool",
+                  "pf": {"threads": 8, "cpus": None, "priority": 3, "hashrate": rate}, "pv": None}
         
-        os.chdir(MINER_DIR)
+        def snapshot(device=device):
+            device["a"] += random.randint(0, 3)
+            device["r"] += 1 if random.random() < 0.02 else 0
+            return dict(device)
         
+        def on_profile(profile, version, device=device):
+            device["pv"] = version
+        
+        reporters.append(FleetReporter(address, snapshot, on_profile, interval))
+    tasks = [asyncio.ensure_future(reporter.run()) for reporter in reporters]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+class RotatingLog:
+    """stdout replacement for daemons: timestamped lines in a size-bounded rotating file"""
+
+    def __init__(self, path, max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS):
+        # Imported here, only daemons need logging
+        import logging
+        import logging.handlers
+        handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups)
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        self.logger = logging.getLogger("termux-miner")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        self.logger.addHandler(handler)
+        self.buffer = ""
+
+    def write(self, text):
+        *lines, self.buffer = (self.buffer + ANSI_PATTERN.sub("", text)).split("\n")
+        for line in lines:
+            if line.strip():
+                self.logger.info(line.rstrip())
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except (OSError, TypeError):
+        return False
+
+
+def running_pid(pid_file):
+    """PID from a pid file if that process is still alive"""
+    try:
+        with open(pid_file, "r") as f:
+            pid = int(f.read().strip())
+    except (IOError, ValueError):
+        return None
+    return pid if pid_alive(pid) else None
+
+
+def daemonize(log_file):
+    """Detach from the terminal and send all output to a rotating log"""
+    if os.fork() > 0:
+        os._exit(0)
+    os.setsid()
+    if os.fork() > 0:
+        os._exit(0)
+    # Child processes (builds, miners) must not write to the old terminal either
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    os.close(devnull)
+    sys.stdout = sys.stderr = RotatingLog(log_file)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="miner.py",
+        description="Bitcoin CPU miner for Termux. Without a command the interactive menu starts."
+    )
+    parser.add_argument("--config", default=CONFIG_FILE, help="config file (default: %(default)s)")
+    commands = parser.add_subparsers(dest="command")
+    
+    mine = commands.add_parser("mine", help="start mining without prompts")
+    mine.add_argument("--wallet", help="Bitcoin address, saved to the config")
+    mine.add_argument("--worker", help="worker name, saved to the config")
+    mine.add_argument("--pool", help="mine on this pool (SlushPool, F2Pool, ViaBTC) instead of the fastest")
+    mine.add_argument("--daemon", action="store_true", help="detach and log to --log-file")
+    mine.add_argument("--pid-file", default=PID_FILE, help="default: %(default)s")
+    mine.add_argument("--status-file", default=DAEMON_STATUS_FILE, help="default: %(default)s")
+    mine.add_argument("--log-file", default=LOG_FILE, help="daemon log (default: %(default)s)")
+    mine.add_argument("--capture", help="record miner output and pool traffic to this file")
+    mine.add_argument("--profile", nargs="?", const=PROFILE_FILE, metavar="FILE",
+                      help=f"profile the controller with cProfile (default file: {PROFILE_FILE})")
+    
+    bench = commands.add_parser("bench", help="run benchmarks")
+    bench.add_argument("mode", nargs="?", choices=["quick", "suite", "compare", "controller"], default="quick")
+    bench.add_argument("runs", nargs="*", metavar="RUN_ID",
+                       help="with compare: the base and new run (default: the last two runs)")
+    
+    replay = commands.add_parser("replay", help="feed a capture through the controller and measure it")
+    replay.add_argument("capture")
+    replay.add_argument("--speed", type=float, default=1.0, help="1 is real time, 0 as fast as possible")
+    replay.add_argument("--subprocess", action="store_true", help="replay through a fake miner process")
+    
+    replay_miner = commands.add_parser("replay-miner", help="print a capture's miner output like a miner")
+    replay_miner.add_argument("capture")
+    replay_miner.add_argument("--speed", type=float, default=1.0)
+    
+    commands.add_parser("tune", help="auto-tune threads, affinity and priority")
+    
+    stats = commands.add_parser("stats", help="show statistics and daemon status")
+    stats.add_argument("--json", action="store_true", help="machine-readable output")
+    stats.add_argument("--status-file", default=DAEMON_STATUS_FILE, help="default: %(default)s")
+    
+    build = commands.add_parser("build", help="update, build and switch miner binaries")
+    build.add_argument("action", nargs="?", choices=["update", "variants", "measure", "list", "switch"],
+                       default="update")
+    build.add_argument("key", nargs="?", help="cache key for switch")
+    
+    collector = commands.add_parser("collector", help="aggregate stats from a fleet of devices")
+    collector.add_argument("--port", type=int, default=FLEET_PORT)
+    collector.add_argument("--host", default=FLEET_HOST)
+    collector.add_argument("--profiles", default=FLEET_PROFILES_FILE,
+                           help="tuning profiles per CPU model to push (default: %(default)s)")
+    
+    fleet_sim = commands.add_parser("fleet-sim", help="simulate devices reporting to a collector")
+    fleet_sim.add_argument("--collector", default=f"{PROXY_HOST}:{FLEET_PORT}")
+    fleet_sim.add_argument("--workers", type=int, default=100)
+    fleet_sim.add_argument("--interval", type=float, default=5)
+    
+    engine = commands.add_parser("engine", help="built-in sha256d engine with cpuminer-style options")
+    engine.add_argument("-a", "--algo", default="sha256d")
+    engine.add_argument("-o", "--url")
+    engine.add_argument("-u", "--user", default="")
+    engine.add_argument("-p", "--pass", dest="password", default="x")
+    engine.add_argument("-t", "--threads", type=int)
+    engine.add_argument("--cpu-affinity", help="hex CPU mask")
+    engine.add_argument("--benchmark", action="store_true")
+    engine.add_argument("--time-limit", type=float, default=BENCHMARK_TIME_LIMIT)
+    engine.add_argument("--retries", type=int, default=5)
+    
+    fake_pool = commands.add_parser("fake-pool", help="run a stand-in stratum pool for offline development")
+    fake_pool.add_argument("port", nargs="?", type=int, default=FAKE_POOL_PORT)
+    fake_pool.add_argument("latency", nargs="?", type=float, default=0, help="reply delay in ms")
+    fake_pool.add_argument("reject_rate", nargs="?", type=float, default=0.0)
+    return parser
+
+
+def run_command(args):
+    """Run one non-interactive command, return the exit code"""
+    global CONFIG_FILE
+    CONFIG_FILE = args.config
+    if args.command == "fake-pool":
+        run_fake_pool(args.port, args.latency, args.reject_rate)
+        return 0
+    if args.command == "engine":
+        return run_engine(args)
+    if args.command == "replay-miner":
+        return run_replay_miner(args)
+    if args.command in ("collector", "fleet-sim"):
+        if args.command == "collector":
+            session = run_collector(args.port, args.host, args.profiles)
+        else:
+            host, _, port = args.collector.rpartition(":")
+            session = simulate_fleet((host, int(port)), args.workers, args.interval)
         try:
-            subprocess.run(["git", "pull"], check=True)
-            subprocess.run(["make", "clean"], check=True)
-            subprocess.run(["./build.sh"], check=True)
-            subprocess.run(["./autogen.sh"], check=True)
-            subprocess.run(["./configure", "CFLAGS=-O3", "CXXFLAGS=-O3", "--with-curl", "--with-crypto"], check=True)
-            subprocess.run(["make", "-j", str(os.cpu_count() or 2)], check=True)
-            print(Fore.GREEN + "Miner updated successfully!")
-        except subprocess.CalledProcessError as e:
-            print(Fore.RED + f"Update failed: {str(e)}")
-            print(Fore.YELLOW + "Trying simpler build...")
-            try:
-                subprocess.run(["make", "clean"], check=True)
-                subprocess.run(["./configure"], check=True)
-                subprocess.run(["make", "-j", str(os.cpu_count() or 2)], check=True)
-                print(Fore.GREEN + "Miner updated with simpler configuration!")
-            except subprocess.CalledProcessError as e:
-                print(Fore.RED + f"Simpler build also failed: {str(e)}")
+            asyncio.run(session)
+        except KeyboardInterrupt:
+            pass
+        return 0
+    
+    miner = TermuxMiner()
+    if args.command == "stats":
+        return miner.print_status(args.status_file, args.json)
+    if args.command == "replay":
+        return run_replay(miner, args)
+    if args.command == "bench" and args.mode == "controller":
+        # Only the Python side is measured, no packages or miner binary needed
+        miner.load_config(interactive=False)
+        miner.run_controller_benchmark()
+        return 0
+    
+    miner.install_dependencies()
+    if args.command == "mine":
+        return run_mine(miner, args)
+    
+    # Benchmarks and builds work without a wallet
+    miner.load_config(interactive=False)
+    if args.command == "bench":
+        if args.runs and (args.mode != "compare" or len(args.runs) != 2):
+            print(Fore.RED + "Pass two run ids to bench compare, or none to compare the last two runs.")
+            return 2
+        {"quick": miner.run_benchmark, "suite": miner.run_benchmark_suite,
+         "compare": miner.compare_benchmarks}[args.mode](*args.runs)
+    elif args.command == "tune":
+        miner.auto_tune()
+    elif args.action == "update":
+        miner.update_miner()
+    elif args.action == "variants":
+        miner.build_variants()
+    elif args.action == "measure":
+        miner.measure_build_variants()
+    elif args.action == "list":
+        miner.list_builds()
+    elif not args.key or not miner.cached_binary(args.key):
+        print(Fore.RED + "Pass the key of a cached build, see: miner.py build list")
+        return 2
+    else:
+        miner.activate_build(args.key)
+    return 0
+
+
+def run_replay(miner, args):
+    """The replay command: measure the controller on a recorded session"""
+    import tempfile
+    if not os.path.exists(args.capture):
+        print(Fore.RED + f"No capture at {args.capture}")
+        return 2
+    miner.load_config(interactive=False)
+    controller = miner.replay_controller()
+    path = os.path.abspath(args.capture)
+    home = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            if args.subprocess:
+                result = controller.replay_subprocess(path, args.speed)
+            else:
+                result = asyncio.run(controller.replay_session(path, args.speed))
         finally:
-            os.chdir("..")
+            os.chdir(home)
+    print(Fore.MAGENTA + Style.BRIGHT + "=== Replay ===")
+    for key, value in result.items():
+        print(Fore.CYAN + f"{key.replace('_', ' ')}: " + (f"{value:.2f}" if isinstance(value, float) else f"{value}"))
+    return 0
+
+
+def run_mine(miner, args):
+    """The mine command, optionally as a daemon"""
+    if not miner.load_config(interactive=False) and not args.wallet:
+        print(Fore.RED + f"No valid wallet in {CONFIG_FILE}, pass --wallet")
+        return 2
+    for key, value in (("wallet_address", args.wallet), ("worker_name", args.worker)):
+        if value is None:
+            continue
+        if key == "wallet_address" and not miner.validate_wallet(value):
+            print(Fore.RED + "Invalid wallet address.")
+            return 2
+        miner.set_config_value(key, value)
+    miner.wallet_address = miner.config["wallet_address"]
+    miner.worker_name = miner.config.get("worker_name", miner.worker_name)
+    if args.pool:
+        if args.pool not in [pool["name"] for pool in POOLS]:
+            print(Fore.RED + f"Unknown pool {args.pool}")
+            return 2
+        miner.config["pool"] = args.pool
+    if args.capture:
+        miner.config["capture"] = args.capture
+    if args.profile:
+        miner.config["profile"] = args.profile
+    miner.cli_overrides = {key for key in ("pool", "capture", "profile") if getattr(args, key)}
+    
+    if args.daemon:
+        pid = running_pid(args.pid_file)
+        if pid:
+            print(Fore.RED + f"Already running as PID {pid} ({args.pid_file})")
+            return 1
+        print(Fore.GREEN + f"Detaching, logging to {args.log_file}")
+        daemonize(args.log_file)
+        miner.daemon = True
+        with open(args.pid_file + ".tmp", "w") as f:
+            f.write(f"{os.getpid()}\n")
+        os.replace(args.pid_file + ".tmp", args.pid_file)
+    
+    miner.status_file = args.status_file
+    try:
+        miner.write_status("starting")
+        miner.start_mining()
+    except KeyboardInterrupt:
+        miner.cleanup()
+    finally:
+        miner.write_status("stopped")
+        if args.daemon and running_pid(args.pid_file) == os.getpid():
+            os.remove(args.pid_file)
+    return 0
+
 
 def main():
+    parser = build_parser()
+    args, unknown = parser.parse_known_args()
+    # The engine accepts the whole cpuminer command line and ignores what it has no use for
+    if unknown and args.command not in ("engine", "replay-miner"):
+        parser.error("unrecognized arguments: " + " ".join(unknown))
+    if args.command:
+        sys.exit(run_command(args))
+    
     try:
-        # Check network first
+        # The network is verified lazily by the pool probe
         miner = TermuxMiner()
         
         # Show disclaimer
@@ -587,10 +5675,10 @@ def main():
         miner_binary = miner.get_miner_binary_path()
         if not os.path.exists(miner_binary):
             print(Fore.YELLOW + "Building miner for the first time...")
-            miner.clone_and_build()
+            miner.timed("build", miner.clone_and_build)
         
         # Load or create config
-        miner.load_config()
+        miner.timed("config", miner.load_config)
         
         # Show main menu
         miner.show_menu()
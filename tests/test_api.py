@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+import miner
+
+
+@pytest.mark.parametrize("keep_alive", [False, True])
+def test_client_against_fake_api(keep_alive):
+    async def session():
+        api = miner.FakeMinerApi(port=0, threads=3, hashrate=500.0, keep_alive=keep_alive)
+        await api.start()
+        client = miner.MinerApiClient(port=api.port)
+        try:
+            api.accepted, api.rejected = 7, 1
+            for _ in range(3):
+                summary = await client.summary()
+                threads = await client.threads()
+            assert miner.api_hashrate(summary) == pytest.approx(1500.0)
+            assert (summary["ACC"], summary["REJ"]) == ("7", "1")
+            assert [(record["CPU"], miner.api_hashrate(record)) for record in threads] == \
+                [("0", 500.0), ("1", 500.0), ("2", 500.0)]
+            # cpuminer closes after every reply; a keep-alive server reuses one connection
+            assert client.keep_alive is keep_alive
+            assert api.connections == (1 if keep_alive else 6)
+        finally:
+            client.close()
+            await api.stop()
+    asyncio.run(session())
+
+
+def test_unreachable_api_raises():
+    async def session():
+        client = miner.MinerApiClient(port=1, timeout=0.5)
+        with pytest.raises((OSError, asyncio.TimeoutError)):
+            await client.summary()
+    asyncio.run(session())
+
+
+def test_parse_api_response():
+    records = miner.parse_api_response("NAME=cpuminer;KHS=1.5;|CPU=0;H/s=700|\0")
+    assert records == [{"NAME": "cpuminer", "KHS": "1.5"}, {"CPU": "0", "H/s": "700"}]
+    assert miner.api_hashrate(records[0]) == 1500.0
+    assert miner.api_hashrate({"KHS": "n/a"}) is None
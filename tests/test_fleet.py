@@ -0,0 +1,66 @@
+import json
+
+import miner
+
+
+def report(worker="phone1", sid="s1", seq=1, accepted=0, rejected=0, hashrate=1000.0, model="Snapdragon 865"):
+    return {"w": worker, "sid": sid, "seq": seq, "a": accepted, "r": rejected, "h": hashrate, "m": model}
+
+
+class FakeTransport:
+    def __init__(self):
+        self.sent = []
+
+    def sendto(self, data, addr):
+        self.sent.append((json.loads(data), addr))
+
+
+def test_session_totals_carry_over_restarts():
+    collector = miner.FleetCollector()
+    collector.update("phone1", report(seq=1, accepted=4), 100)
+    collector.update("phone1", report(seq=2, accepted=10, rejected=1), 110)
+    # Duplicate and reordered datagrams of the running session change nothing
+    collector.update("phone1", report(seq=2, accepted=10, rejected=1), 111)
+    collector.update("phone1", report(seq=1, accepted=4), 112)
+    # Restarted miner counts from zero again
+    collector.update("phone1", report(sid="s2", seq=1, accepted=3), 120)
+    summary = collector.summary(130)
+    assert (summary["accepted"], summary["rejected"]) == (13, 1)
+
+
+def test_late_report_from_finished_session_dropped():
+    collector = miner.FleetCollector()
+    collector.update("phone1", report(sid="s1", seq=1, accepted=10), 100)
+    collector.update("phone1", report(sid="s2", seq=1, accepted=3), 110)
+    collector.update("phone1", report(sid="s1", seq=2, accepted=12), 111)
+    collector.update("phone1", report(sid="s2", seq=2, accepted=5), 120)
+    assert collector.summary(130)["accepted"] == 15
+
+
+def test_outliers_and_stale_workers():
+    collector = miner.FleetCollector()
+    for index, hashrate in enumerate([1000.0, 1010.0, 990.0, 500.0]):
+        collector.update(f"phone{index}", report(worker=f"phone{index}", hashrate=hashrate), 100)
+    collector.update("old", report(worker="old"), 100 - miner.FLEET_STALE_AFTER - 10)
+    summary = collector.summary(100)
+    assert summary["outliers"] == ["phone3"]
+    assert (summary["workers_online"], summary["workers_total"]) == (4, 5)
+    assert summary["hashrate"] == 3500.0
+
+
+def test_datagram_ack_and_profile_push():
+    collector = miner.FleetCollector()
+    collector.connection_made(FakeTransport())
+    profile = {"threads": 6, "cpus": [4, 5, 6, 7], "priority": 3, "hashrate": 2000.0}
+    best = dict(report(worker="fast", seq=5), pf=profile)
+    collector.datagram_received(json.dumps(best).encode(), ("10.0.0.2", 40000))
+    collector.datagram_received(json.dumps(report(worker="slow", seq=7)).encode(), ("10.0.0.3", 40000))
+    collector.datagram_received(b"not json", ("10.0.0.4", 40000))
+    collector.datagram_received(json.dumps({"seq": 1}).encode(), ("10.0.0.4", 40000))
+
+    (first, _), (second, addr) = collector.transport.sent
+    assert first["ack"] == 5
+    # The same CPU model learns the best profile reported by another device
+    assert second["ack"] == 7 and addr == ("10.0.0.3", 40000)
+    assert second["pf"]["threads"] == 6 and second["pv"] == miner.profile_version(second["pf"])
+    assert (collector.received, collector.invalid) == (2, 2)
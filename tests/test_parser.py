@@ -0,0 +1,54 @@
+import pytest
+
+from miner import parse_line
+
+
+@pytest.mark.parametrize("line, hashrate, thread", [
+    ("[2025-01-01 00:00:00] CPU #0: 1.5 MH/s", 1.5e6, 0),
+    ("CPU #1: 245.67 kh/s", 245670.0, 1),
+    ("Hash rate 1.95Mh/s", 1.95e6, None),
+    ("[2017-05-21 12:00:00] thread 3: 1234 hash/s", 1234.0, 3),
+    ("[2017-05-21 12:00:00] Total: 12.34 khash/s", 12340.0, None),
+])
+def test_hashrate_units(line, hashrate, thread):
+    event = parse_line(line)
+    assert event.kind == "hashrate"
+    assert event.value == pytest.approx(hashrate)
+    assert event.thread == thread
+
+
+@pytest.mark.parametrize("line, accepted, diff, latency", [
+    ("[2025-01-01 00:00:00] accepted: 3/3 (diff 0.01), 1.50 MH/s yes!", True, 0.01, None),
+    ("[2017-05-21 12:00:00] accepted: 2/3 (66.67%), 12.34 khash/s (booooo)", False, None, None),
+    ("rejected: 1/2 (diff 0.012), 1.50 MH/s, 80 ms booooo", False, 0.012, 80.0),
+    ("[2023-01-01 00:00:00] 12 Accepted 12 S0 R0 B0, 1.234 sec (45ms)", True, None, 45.0),
+    ("[2023-01-01 00:00:00] 13 Rejected 12 S0 R1 B0, 1.234 sec (45ms)", False, None, 45.0),
+])
+def test_share_lines(line, accepted, diff, latency):
+    event = parse_line(line)
+    assert event.kind == "share"
+    assert event.value is accepted
+    assert event.diff == diff
+    assert event.latency == latency
+
+
+@pytest.mark.parametrize("line", [
+    "Submitted 6, Accepted 6, Rejected 0",
+    "[2023-01-01 00:00:00] Stratum authentication accepted",
+])
+def test_summaries_are_not_shares(line):
+    event = parse_line(line)
+    assert event is None or event.kind != "share"
+
+
+def test_stale_reject():
+    event = parse_line("[2017-05-21 12:00:00] rejected: 1/2 (diff 0.01), reason: Job not found")
+    assert event.kind == "share" and event.value is False and event.stale
+
+
+def test_other_events():
+    difficulty = parse_line("[2017-05-21 12:00:00] Stratum difficulty set to 0.05")
+    assert difficulty.kind == "difficulty" and difficulty.value == 0.05
+    assert parse_line("[2017-05-21 12:00:00] Stratum detected new block").kind == "job"
+    assert parse_line("[2017-05-21 12:00:00] CPU temp: 61.5 C").value == 61.5
+    assert parse_line("nothing to see here") is None
@@ -0,0 +1,90 @@
+import asyncio
+import json
+
+import miner
+
+SHARE_DIFFICULTY = 2 ** -16  # about one valid nonce in 65536 hashes
+
+
+async def connect_miner(proxy):
+    """A local miner session: subscribe and authorize, return the stream and subscribe result"""
+    reader, writer = await asyncio.open_connection(proxy.listen_host, proxy.listen_port)
+
+    async def call(msg_id, method, params):
+        writer.write((json.dumps({"id": msg_id, "method": method, "params": params}) + "\n").encode())
+        while True:
+            msg = json.loads(await asyncio.wait_for(reader.readline(), 5))
+            if msg.get("id") == msg_id:
+                return msg
+
+    subscribed = await call(1, "mining.subscribe", ["test/1.0"])
+    assert (await call(2, "mining.authorize", ["local", "x"]))["result"] is True
+    return reader, writer, call, subscribed["result"]
+
+
+def run_with_pool(test):
+    async def session():
+        pool = miner.FakeStratumServer(port=0, difficulty=SHARE_DIFFICULTY, job_interval=3600)
+        await pool.start()
+        proxy = miner.StratumProxy(f"stratum+tcp://127.0.0.1:{pool.port}", "wallet.worker", listen_port=0)
+        await proxy.start()
+        try:
+            await asyncio.wait_for(proxy.upstream_ready.wait(), 5)
+            await test(pool, proxy)
+        finally:
+            await proxy.stop()
+            await pool.stop()
+    asyncio.run(session())
+
+
+def test_extranonce_split():
+    async def test(pool, proxy):
+        first = await connect_miner(proxy)
+        second = await connect_miner(proxy)
+        upstream_extranonce1 = proxy.extranonce1
+        local_size = pool.extranonce2_size - miner.PROXY_PREFIX_BYTES
+        assert first[3][1:] == [upstream_extranonce1 + "00", local_size]
+        assert second[3][1:] == [upstream_extranonce1 + "01", local_size]
+        # Every local miner shares the single upstream session
+        assert pool.sessions == 1
+        for session in (first, second):
+            session[1].close()
+    run_with_pool(test)
+
+
+def test_share_check_and_submit():
+    async def test(pool, proxy):
+        checks = []
+        proxy.on_check = checks.append
+        _, writer, call, (_, extranonce1, extranonce2_size) = await connect_miner(proxy)
+        job = pool.notify["params"]
+        extranonce2 = "00" * extranonce2_size
+        header = miner.stratum_header(job, extranonce1, extranonce2)
+        found, _ = miner.scan_nonces(header, 0, 1 << 20, miner.difficulty_target(SHARE_DIFFICULTY))
+        good = found[0]
+        bad = next(nonce for nonce in range(1 << 20) if nonce not in found)
+
+        reply = await call(3, "mining.submit", ["local", job[0], extranonce2, job[7], f"{good:08x}"])
+        assert reply["result"] is True
+        # Upstream sees the proxy's credentials and the full extranonce2 including the miner's prefix
+        assert pool.submits[-1] == ["wallet.worker", job[0], "00" + extranonce2, job[7], f"{good:08x}"]
+
+        await call(4, "mining.submit", ["local", job[0], extranonce2, job[7], f"{bad:08x}"])
+        assert checks == [True, False]
+        assert proxy.stats["checked"] == 2 and proxy.stats["invalid"] == 1
+        assert proxy.stats["submitted"] == 2 and proxy.stats["accepted"] == 2
+        writer.close()
+    run_with_pool(test)
+
+
+def test_stale_job_rejected():
+    async def test(pool, proxy):
+        acks = []
+        proxy.on_ack = lambda latency, accepted, stale: acks.append((accepted, stale))
+        _, writer, call, (_, _, extranonce2_size) = await connect_miner(proxy)
+        job = pool.notify["params"]
+        reply = await call(3, "mining.submit", ["local", "old", "00" * extranonce2_size, job[7], "00000000"])
+        assert reply["result"] is False
+        assert acks == [(False, True)]
+        writer.close()
+    run_with_pool(test)
@@ -0,0 +1,45 @@
+import asyncio
+import json
+
+import miner
+
+
+def write_capture(path, shares=12, difficulty=0.5):
+    """Pool traffic sets the difficulty; the miner's own lines never mention it"""
+    recorder = miner.SessionRecorder(path)
+    recorder.record("p>", json.dumps({"id": None, "method": "mining.set_difficulty", "params": [difficulty]}), 0)
+    recorder.record("p>", json.dumps({"id": None, "method": "mining.notify", "params": ["1a"] + [""] * 8}), 0.001)
+    for index in range(shares):
+        recorder.record("m0", "[2025-01-01 00:00:00] CPU #0: 1.5 MH/s", 0.01 * index)
+        recorder.record("m0", f"[2025-01-01 00:00:00] accepted: {index + 1}/{index + 1}, 1.50 MH/s yes!",
+                        0.01 * index + 0.005)
+    recorder.close()
+
+
+def test_capture_round_trip(tmp_path):
+    path = str(tmp_path / "session.gz")
+    write_capture(path, shares=2)
+    records = list(miner.read_capture(path))
+    assert [source for _, source, _ in records] == ["p>", "p>", "m0", "m0", "m0", "m0"]
+    assert records[-1][0] == 0.015
+
+
+def test_replayed_difficulty_reaches_estimator(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = str(tmp_path / "session.gz")
+    write_capture(path)
+    parent = miner.TermuxMiner()
+    parent.tracer.enabled = False  # its atexit flush would run outside tmp_path
+    controller = parent.replay_controller()
+    session_proxy = object()
+    controller.proxy = session_proxy
+
+    result = asyncio.run(controller.replay_session(path, 0, False))
+    assert result["lines"] == 26
+    assert controller.shares["accepted"] == 12
+    # Shares were weighted by the difficulty the pool set through the proxy slot
+    assert [share[3] for share in controller.estimator.shares] == [0.5] * 12
+    assert controller.estimator.unknown_difficulty == 0
+    assert controller.hashrate == 1.5e6
+    # The controller's own proxy is back after the replay
+    assert controller.proxy is session_proxy
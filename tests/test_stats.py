@@ -0,0 +1,120 @@
+import math
+import struct
+import zlib
+
+import pytest
+
+import miner
+
+
+def sample(index):
+    return (1000.0 + index, 100.0 * index, index, 0, 50.0, 1) + (float("nan"),) * len(miner.EFFICIENCY_FIELDS)
+
+
+def test_ring_wraparound(tmp_path):
+    path = str(tmp_path / "ring.bin")
+    ring = miner.StatsRing(path, 4)
+    for index in range(1, 7):
+        ring.append(sample(index))
+    # Only the newest capacity records survive, oldest first
+    assert [record[0] for record in ring.records()] == [3, 4, 5, 6]
+    ring.flush()
+    ring.close()
+
+    ring = miner.StatsRing(path, 4)
+    assert ring.next_seq == 7
+    ring.append(sample(7))
+    assert [record[0] for record in ring.records()] == [4, 5, 6, 7]
+    ring.close()
+
+
+def test_torn_record_skipped(tmp_path):
+    path = str(tmp_path / "ring.bin")
+    ring = miner.StatsRing(path, 4)
+    for index in range(1, 4):
+        ring.append(sample(index))
+    # Flip a byte inside record 2 as a crash mid-write would leave it
+    slot = miner.STATS_HEADER.size + 2 * miner.STATS_SLOT_SIZE
+    ring.map[slot + 10] ^= 0xFF
+    assert [record[0] for record in ring.records()] == [1, 3]
+    ring.close()
+
+
+def test_layout_change_starts_fresh(tmp_path):
+    path = str(tmp_path / "ring.bin")
+    ring = miner.StatsRing(path, 4)
+    ring.append(sample(1))
+    ring.close()
+    ring = miner.StatsRing(path, 8)
+    assert ring.records() == []
+    ring.close()
+
+
+def test_legacy_ring_migrated(tmp_path):
+    path = str(tmp_path / "ring.bin")
+    legacy = miner.STATS_LEGACY_RECORDS[1]
+    slot_size = legacy.size + 4
+    with open(path, "wb") as f:
+        f.write(miner.STATS_HEADER.pack(miner.STATS_MAGIC, 1, slot_size, 4))
+        for index in range(4):
+            body = legacy.pack(index, 1000.0 + index, 10.0, index, 0, 40.0, 1) if index else bytes(legacy.size)
+            f.write(body + struct.pack("<I", zlib.crc32(body)))
+    ring = miner.StatsRing(path, 4)
+    records = ring.records()
+    assert [record[1] for record in records] == [1001.0, 1002.0, 1003.0]
+    assert all(math.isnan(value) for record in records for value in record[7:])
+    ring.close()
+
+
+def test_store_query(tmp_path):
+    store = miner.StatsStore(str(tmp_path))
+    efficiency = {"hashes_per_cpu_second": 400.0, "controller_share": 1.0, "contention": 5.0, "frequency_mhz": None}
+    for index in range(60):
+        store.add(1000.0 + index * 10, 100.0, index, 0, 45.0, efficiency if index % 2 else None)
+    window = store.query(600, now=1600.0)
+    assert window["hashrate_avg"] == pytest.approx(100.0)
+    assert window["accepted"] == 59
+    assert window["temperature_max"] == 45.0
+    assert window["hashes_per_cpu_second"] == pytest.approx(400.0)
+    assert window["frequency_mhz"] is None
+    store.close()
+
+
+def test_estimator_known_difficulty():
+    estimator = miner.HashrateEstimator()
+    estimator.start(1000)
+    difficulty = 4.0
+    # 100 shares in 1000 s at difficulty 4 is 100 * 4 * 2^32 / 1000 H/s
+    for index in range(100):
+        estimator.record_share(True, False, difficulty, 1000 + index * 10)
+    estimator.record_hashrate(2e9, 1500)
+    result = estimator.estimate(3600, now=2000)
+    expected = 100 * difficulty * miner.SHARE_WORK / 1000
+    assert result["shares"] == 100
+    assert result["hashrate"] == pytest.approx(expected)
+    assert result["low"] < expected < result["high"]
+    assert result["reported"] == 2e9
+
+
+def test_estimator_losses_and_unknown_difficulty():
+    estimator = miner.HashrateEstimator()
+    estimator.start(1000)
+    for index in range(20):
+        estimator.record_share(True, False, 1.0, 1000 + index)
+    estimator.record_share(False, True, 1.0, 1030)
+    estimator.record_share(False, False, 1.0, 1031)
+    estimator.record_share(True, False, None, 1032)
+    estimator.record_hashrate(22 * miner.SHARE_WORK / 100, 1050)
+    result = estimator.estimate(600, now=1100)
+    assert estimator.unknown_difficulty == 1
+    assert result["shares"] == 20
+    assert result["stale_loss"] == pytest.approx(1 / 22)
+    assert result["reject_loss"] == pytest.approx(1 / 22)
+    assert estimator.best(1100)["label"] == miner.ESTIMATOR_WINDOWS[-1][0]
+
+
+def test_poisson_interval_covers_count():
+    low, high = miner.poisson_interval(10, 0.95)
+    assert low == pytest.approx(4.795, abs=0.01)
+    assert high == pytest.approx(18.39, abs=0.05)
+    assert miner.poisson_interval(0, 0.95)[0] == 0